@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 """The main application module for the API.
 """
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response, status as http_status
 from fastapi.middleware.cors import CORSMiddleware
 
 # import views routers
@@ -10,7 +13,34 @@ from app.v1.views import auth
 from app.v1.views import resumes
 from app.v1.views import users
 
-app = FastAPI(title="Resumai API", version="0.1.0", root_path="/api/v1")
+from models import changeStreams, dbEngine, resumeWriteBuffer, userCache
+from models.indexes import keep_syncing_indexes
+from utils import speculator, usageLedger  # type: ignore
+from utils.workers import shutdown_process_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the background services with the application, and stop them on shutdown"""
+    if not await dbEngine.connect():
+        print("The database is not reachable, the readiness check will fail until it is")
+    # retried in the background until the database is reachable and holds no duplicates
+    indexes = asyncio.create_task(keep_syncing_indexes())
+    usageLedger.start(dbEngine)
+    await userCache.start(dbEngine)
+    changeStreams.start()
+    yield
+    indexes.cancel()
+    speculator.clear()
+    await resumeWriteBuffer.close()
+    await changeStreams.stop()
+    await userCache.stop()
+    await usageLedger.stop()
+    shutdown_process_pool()
+    dbEngine.close()
+
+
+app = FastAPI(title="Resumai API", version="0.1.0", root_path="/api/v1", lifespan=lifespan)
 
 # include the routers on the main api app
 app.include_router(assistant.router)
@@ -35,3 +65,11 @@ app.add_middleware(
 @app.get("/status", tags=["status"])
 def status() -> dict:
     return {"status": "ok"}
+
+@app.get("/status/ready", tags=["status"])
+async def ready(response: Response) -> dict:
+    """Report if the API is ready to serve the requests, that's when the database is reachable"""
+    if not await dbEngine.ping():
+        response.status_code = http_status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "unavailable", "database": "unreachable"}
+    return {"status": "ready", "database": "ok"}
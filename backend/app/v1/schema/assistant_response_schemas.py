@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 """Holds all the schemas used in the Ai assistant operations and endpoints"""
+from enum import Enum
 from pydantic import BaseModel
 
 from app.v1.schema.resume_schemas import ResumeData
@@ -23,3 +24,42 @@ class EnhanceOut(BaseModel):
     """
     resume_data: ResumeData
     scoring_insights: ScoringInsight
+
+
+class ArtifactType(str, Enum):
+    """The artifacts that can be generated together for the same resume and job
+
+    Options:
+    --------
+    * ENHANCED_RESUME
+    * COVER_LETTER
+    * INTERVIEW_QUESTIONS
+    """
+    ENHANCED_RESUME = "enhanced_resume"
+    COVER_LETTER = "cover_letter"
+    INTERVIEW_QUESTIONS = "interview_questions"
+
+
+class ArtifactOut(BaseModel):
+    """The artifact out dataclass that represent one generated artifact, streamed
+    as one line of the combined generation response
+
+    Parameters:
+    -----------
+    * artifact: ArtifactType, the artifact type
+    * content: EnhanceOut | str | list[str], the artifact content
+    """
+    artifact: ArtifactType
+    content: EnhanceOut | str | list[str]
+
+
+class PrefetchOut(BaseModel):
+    """The prefetch out dataclass that represent the handle of a background prefetch
+
+    Parameters:
+    -----------
+    * handle: str, the handle to pass to the enhance request
+    * expires_in: int, the seconds before the prefetch is dropped
+    """
+    handle: str
+    expires_in: int
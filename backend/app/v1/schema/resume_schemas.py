@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Holds all the schemas used in the user's resumes operations and endpoints"""
-from pydantic import BaseModel
+from typing import Any
+from pydantic import BaseModel, ConfigDict, Field
 from dataclasses import field
 from enum import Enum
 
@@ -83,3 +84,61 @@ class ResumeUpdate(BaseModel):
     templateId: str | None = None
     updated_at: str | None = None
     data: ResumeData | None = None
+
+
+class ImportProgress(BaseModel):
+    """The bulk import progress schema, streamed as one json line per imported file,
+    followed by a summary line
+    * file: `Optional`: the archive file name
+    * status: the file status [imported, error] or done for the summary line
+    * resume_id: `Optional`: the created resume id
+    * error: `Optional`: the reason the file was not imported
+    * imported: `Optional`: the number of imported resumes, in the summary line
+    * failed: `Optional`: the number of failed files, in the summary line
+    """
+    file: str | None = None
+    status: str
+    resume_id: str | None = None
+    error: str | None = None
+    imported: int | None = None
+    failed: int | None = None
+
+
+class ResumeSummary(BaseModel):
+    """The resume summary schema, the metadata listed in the user's resumes dashboard
+    * id
+    * templateId
+    * jobTitle: `Optional`
+    * created_at
+    * updated_at
+    """
+    id: str
+    templateId: str
+    jobTitle: str | None = None
+    created_at: str
+    updated_at: str
+
+
+class ResumePage(BaseModel):
+    """The resumes listing page schema, the most recently updated resumes first
+    * items: the resumes summaries of the page
+    * next_cursor: `Optional`: the cursor of the next page, None on the last page
+    """
+    items: list[ResumeSummary]
+    next_cursor: str | None = None
+
+
+class PatchOperation(BaseModel):
+    """The RFC 6902 JSON Patch operation schema, the paths are JSON pointers into the resume
+    like `/data/experiences/0/summary` or `/templateId`
+    * op: the operation [add, remove, replace, test]
+    * path: the target JSON pointer
+    * value: `Optional`: the value of the add, replace and test operations
+    * from: `Optional`: the source JSON pointer of the move and copy operations, not supported
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    op: str
+    path: str
+    value: Any = None
+    from_: str | None = Field(default=None, alias='from')
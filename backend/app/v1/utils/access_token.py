@@ -71,7 +71,8 @@ async def verify_token(token: Annotated[str, Depends(oauth2_schema)]) -> TokenDa
     return TokenData(id=id, scoop=scoop)
 
 async def get_current_user(token_data: Annotated[TokenData, Depends(verify_token)]) -> User:
-    """Retrieve the user from database based on the access token data
+    """Retrieve the user profile from the users cache or the database based on the access
+    token data, the user's resumes are not loaded, the endpoints that need them call `user.load_resumes`
     
     Parameters:
     -----------
@@ -79,7 +80,7 @@ async def get_current_user(token_data: Annotated[TokenData, Depends(verify_token
     
     Returns: User: the user object
     """
-    user: User|None = await User.find_one({"_id": token_data.id})  # type: ignore
+    user: User|None = await User.get_profile(token_data.id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired")
     return user
@@ -1,14 +1,34 @@
 #!/usr/bin/env python3
 """Assistant views module for the API."""
+import json
 from typing import Annotated
 from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 
 # import assistant
 from app.v1.schema.resume_schemas import ResumeData
 from app.v1.utils.access_token import get_current_user
-from app.v1.schema.assistant_response_schemas import EnhanceOut, ScoringInsight
+from app.v1.schema.assistant_response_schemas import ArtifactOut, ArtifactType, EnhanceOut, PrefetchOut, ScoringInsight
 from models.user import User
-from utils import AIAssistant, jobCrawler  # type: ignore
+from utils import AIAssistant, jobCrawler, speculator, usageLedger  # type: ignore
+
+
+async def check_ai_quota(user: Annotated[User, Depends(get_current_user)]) -> User:
+    """Reject the request if the user exceeded the daily AI usage quota,
+    the check is served from the in-memory usage ledger
+
+    Parameters:
+    -----------
+    * user: User: the current logged in user
+
+    Returns: User: the current logged in user
+    """
+    if not usageLedger.within_quota(user.id):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Daily AI usage quota exceeded"
+        )
+    return user
 
 
 router = APIRouter(
@@ -20,29 +40,103 @@ router = APIRouter(
 @router.post('/')
 async def enhance_resume(
     resume: Annotated[ResumeData, Body()],
+    user: Annotated[User, Depends(check_ai_quota)],
     job_description: Annotated[str | None, Body()] = None,
     job_url: Annotated[str | None, Body()] = None,
+    prefetch_handle: Annotated[str | None, Body()] = None,
     ) -> EnhanceOut:
     """Enhance the resume using teh AI assistance, either for specific job description or general enhancement
-    The job description can be provided as a text or as a URL to a job post
+    The job description can be provided as a text, as a URL to a job post, or as the handle of a prefetch
     
     Parameters:
     * **resume**: ResumeData: the resume data to enhance
     * **job_description**: str | None: the job description to enhance the resume for, default to None
     * **job_url**: str | None: the URL to the job post, default to None
+    * **prefetch_handle**: str | None: the handle returned by the `prefetch` endpoint, default to None
     
     Returns: EnhanceOut: the enhanced `resume data` and `scoring insights`
     """
     # resume_dict = resume.model_dump(exclude_defaults=True, exclude_none=True, exclude_unset=True)
     resume_dict = resume
-    if job_description:
-        enhanced_resume = await AIAssistant.enhance_resume(resume_dict, job_description.strip())
+    if prefetch_handle:
+        try:
+            job_description, enhanced_resume = await speculator.attach(prefetch_handle, user.id, resume)
+        except KeyError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prefetch not found or expired")
+        if not enhanced_resume:
+            # the resume changed since the prefetch, only the job description is reused
+            enhanced_resume = await AIAssistant.enhance_resume(resume_dict, job_description, user_id=user.id)
+    elif job_description:
+        enhanced_resume = await AIAssistant.enhance_resume(resume_dict, job_description.strip(), user_id=user.id)
     elif job_url:
         job_description = jobCrawler.get_description(job_url)
-        enhanced_resume = await AIAssistant.enhance_resume(resume_dict, job_description)
+        enhanced_resume = await AIAssistant.enhance_resume(resume_dict, job_description, user_id=user.id)
     else:
-        enhanced_resume = await AIAssistant.enhance_resume(resume_dict)
+        enhanced_resume = await AIAssistant.enhance_resume(resume_dict, user_id=user.id)
+
+    return _to_enhance_out(enhanced_resume)
+
+@router.post('/prefetch', status_code=status.HTTP_202_ACCEPTED)
+async def prefetch(
+    job_url: Annotated[str, Body()],
+    user: Annotated[User, Depends(check_ai_quota)],
+    resume: Annotated[ResumeData | None, Body()] = None,
+    ) -> PrefetchOut:
+    """Start crawling the job post in the background, and speculatively enhancing the resume
+    if it's provided, the returned handle is later passed to the enhance endpoint as `prefetch_handle`
+
+    Parameters:
+    * **job_url**: str: the URL to the job post
+    * **resume**: ResumeData | None: the resume to speculatively enhance, default to None
+
+    Returns: PrefetchOut: the prefetch `handle` and the seconds it `expires_in`
+    """
+    handle = speculator.start(user.id, job_url, resume)
+    return PrefetchOut(handle=handle, expires_in=int(speculator.ttl))
+
+@router.post('/bundle')
+async def generate_artifacts(
+    resume: Annotated[ResumeData, Body()],
+    user: Annotated[User, Depends(check_ai_quota)],
+    job_description: Annotated[str | None, Body()] = None,
+    job_url: Annotated[str | None, Body()] = None,
+    artifacts: Annotated[list[ArtifactType], Body()] = list(ArtifactType),
+    ) -> StreamingResponse:
+    """Generate the enhanced resume, a tailored cover letter and the likely interview questions
+    for the same job in one AI round trip, each artifact is streamed as soon as it is ready
+    as one json line in the requested order
+
+    Parameters:
+    * **resume**: ResumeData: the resume data to generate the artifacts for
+    * **job_description**: str | None: the job description to tailor the artifacts for, default to None
+    * **job_url**: str | None: the URL to the job post, default to None
+    * **artifacts**: list[ArtifactType]: the artifacts to generate, default to all of them
+
+    Returns: StreamingResponse: `ndjson` stream of ArtifactOut, one line per artifact, a failed
+    generation ends the stream with an `{"error": ...}` line
+    """
+    if job_description:
+        job_description = job_description.strip()
+    elif job_url:
+        job_description = jobCrawler.get_description(job_url)
+
+    async def stream():
+        try:
+            async for artifact, content in AIAssistant.generate_artifacts(
+                    resume, job_description or '', [artifact.value for artifact in artifacts], user_id=user.id):
+                if artifact == ArtifactType.ENHANCED_RESUME:
+                    content = _to_enhance_out(content)
+                yield ArtifactOut(artifact=artifact, content=content).model_dump_json() + '\n'
+        except Exception as e:
+            # the response status is already sent, the client is told the stream is incomplete
+            print(e)
+            yield json.dumps({'error': 'The artifacts generation failed'}) + '\n'
+
+    return StreamingResponse(stream(), media_type='application/x-ndjson')
+
 
+def _to_enhance_out(enhanced_resume: dict) -> EnhanceOut:
+    """Convert the assistant enhanced resume result to the EnhanceOut schema"""
     return EnhanceOut(
         resume_data=enhanced_resume['resume_data'],
         scoring_insights=ScoringInsight(
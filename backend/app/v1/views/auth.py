@@ -32,7 +32,8 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> T
     email = form_data.username
     password = form_data.password
     remember_me = form_data.scopes[0] if form_data.scopes else None
-    user: User| None = await User.find_one({"email": email})  # type: ignore
+    # only the profile is checked, the user's resumes are not loaded
+    user: User| None = await User.find_profile({"email": email})
     if not user or not user.check_password(password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
     duration = 0 if remember_me else 1440 # 1 day
@@ -1,19 +1,57 @@
 #!/usr/bin/env python3
 """Users Resumes views model"""
+import asyncio
+import os
 from datetime import datetime
+from tempfile import NamedTemporaryFile
 from typing import Annotated
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, File, Form, Header, HTTPException, Query, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import ValidationError
 
 # import schemas
 from app.v1.schema.auth_schemas import Token
-from app.v1.schema.resume_schemas import ResumeCreate, ResumeUpdate
+from app.v1.schema.resume_schemas import (
+    ImportProgress,
+    PatchOperation,
+    ResumeCreate,
+    ResumeData,
+    ResumePage,
+    ResumeSummary,
+    ResumeUpdate,
+)
 
 # import dependencies
 from app.v1.utils.access_token import get_current_user
 
 # import database models
+from models import resumeWriteBuffer
+from models.json_patch import JSONPatchConflict, JSONPatchError
 from models.user import User
-from models.resume import Resume
+from models.resume import (
+    Resume,
+    Title,
+    Experience,
+    Project,
+    Education,
+    Achievement,
+    Certificate,
+    Language,
+)
+
+# import utilities
+from utils.archive_extractor import MAX_ARCHIVE_BYTES, ArchiveExtractionError, extract_resume, list_resumes
+from utils import renderCache  # type: ignore
+from utils.pdf_extractor import MAX_PDF_BYTES, PDFExtractionError, extract_resume_draft
+from utils.pdf_renderer import render_key, render_resume_pdf
+from utils.workers import pool_size, run_in_process
+
+# the number of resumes written to the database at once by the bulk import
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 50))
+# the default and the maximum number of resumes of a listing page
+DEFAULT_PAGE_SIZE = int(os.getenv('RESUMES_PAGE_SIZE', 20))
+MAX_PAGE_SIZE = 100
 
 router = APIRouter(
     prefix='/resumes',
@@ -21,15 +59,27 @@ router = APIRouter(
 )
 
 @router.get('/')
-async def get_all_resumes(user: Annotated[User, Depends(get_current_user)]) -> list[Resume]:
-    """Get all the Resumes for the current logged in user
+async def get_all_resumes(
+    user: Annotated[User, Depends(get_current_user)],
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: Annotated[str | None, Query()] = None,
+    ) -> ResumePage:
+    """Get a page of the Resumes summaries for the current logged in user, the most
+    recently updated first, the full resume is fetched by its id
     
     Parameters:
     * **user**: User: the current logged in user
+    * **limit**: int: the maximum number of resumes of the page
+    * **cursor**: str: the `next_cursor` of the previous page, omitted for the first page
     
-    Returns: list[Resume]: return a list of all the resumes
+    Returns: ResumePage: the resumes summaries, and the cursor of the next page
     """
-    return user.resumes
+    try:
+        summaries, next_cursor = await user.list_resumes(limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    items = [ResumeSummary(id=summary.pop('_id'), **summary) for summary in summaries]
+    return ResumePage(items=items, next_cursor=next_cursor)
 
 @router.get('/{resume_id}')
 async def get_resume(resume_id: str, user: Annotated[User, Depends(get_current_user)]) -> Resume:
@@ -42,15 +92,44 @@ async def get_resume(resume_id: str, user: Annotated[User, Depends(get_current_u
     
     Returns: Resume: the object contains all the `resume fields`
     """
-    try:
-        resume = [resume_object for resume_object in user.resumes if resume_object.id == resume_id][0]
-    except IndexError:
+    resume = await user.get_resume(resume_id)
+    if resume is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Resume not found"
         )
     return resume
 
+@router.get('/{resume_id}/pdf', response_class=Response)
+async def get_resume_pdf(
+    resume_id: str,
+    user: Annotated[User, Depends(get_current_user)],
+    if_none_match: Annotated[str | None, Header()] = None,
+    ):
+    """Render the user Resume with id equal to resume_id as a PDF document, the rendered
+    documents are cached by their content, so an unchanged resume is only rendered once
+    
+    Parameters:
+    -----------
+    * **resume_id**: str: the id of the required Resume
+    * **user**: User: the current logged in user object
+    
+    Returns: Response: the `application/pdf` document, its ETag is the content hash
+    """
+    resume = await get_resume(resume_id, user)
+    resume_dict = resume.to_dict()
+    key = render_key(resume_dict['templateId'], resume_dict['data'])
+    etag = f'"{key}"'
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    document = await asyncio.to_thread(renderCache.get, key)
+    if document is None:
+        document = await run_in_process(render_resume_pdf, resume_dict['templateId'], resume_dict['data'])
+        await asyncio.to_thread(renderCache.set, key, document)
+    return Response(document, media_type='application/pdf', headers={
+        'ETag': etag, 'Content-Disposition': f'attachment; filename="resume-{resume_id}.pdf"'})
+
 @router.post('/', status_code=status.HTTP_201_CREATED)
 async def add_resume(
     resume: Annotated[ResumeCreate, Body()],
@@ -64,12 +143,7 @@ async def add_resume(
     
     Returns: str: the created resume `id`
     """
-    if not isinstance(resume, dict):
-        resume_dict = resume.model_dump()
-    else:
-        resume_dict = resume
-    templateId = resume_dict.pop('templateId')
-    resume_object = Resume(templateId=templateId, data=Resume._data_from_dict(resume_dict))
+    resume_object = Resume.from_request(resume)
     if not await user.add_resume(resume_object):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -101,19 +175,229 @@ async def delete_resume(
 
 @router.put('/{resume_id}', status_code=status.HTTP_200_OK)
 async def update_resume(resume_id: str, data: Annotated[ResumeUpdate, Body()], user: Annotated[User, Depends(get_current_user)]):
-    """Update the user Resume with ID equal to resume_id by using the data in data
+    """Update the user Resume with ID equal to resume_id by using the data in data, the
+    rapid successive updates of a resume are coalesced into one database write
     
     Parameters:
     * **resume_id**: str: the ID of the resume to update
     * **data**: dict: 
     """
     try:
-        updates = data.model_dump(exclude_defaults=True)
+        updates = Resume.updates_from_request(data)
         updates["updated_at"] = datetime.now()
-        result = await user.edit_resume(resume_id, updates)
+        result = await resumeWriteBuffer.stage(user, resume_id, updates)
         assert result
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+
+@router.patch('/{resume_id}', status_code=status.HTTP_200_OK)
+async def patch_resume(
+    resume_id: str,
+    operations: Annotated[list[PatchOperation], Body()],
+    user: Annotated[User, Depends(get_current_user)]
+    ):
+    """Update the user Resume with ID equal to resume_id with JSON Patch (RFC 6902) operations,
+    only the patched paths are written, like one experience summary or one added skill
+    
+    Parameters:
+    * **resume_id**: str: the ID of the resume to update
+    * **operations**: list[PatchOperation]: the `add`, `remove`, `replace` and `test` operations
+    """
+    try:
+        patched = await user.patch_resume(
+            resume_id, [operation.model_dump(by_alias=True, exclude_unset=True) for operation in operations]
+        )
+    except JSONPatchError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except JSONPatchConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if not patched:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resume not found")
+
+@router.post('/import/pdf', dependencies=[Depends(get_current_user)])
+async def import_pdf_resume(file: Annotated[UploadFile, File()]) -> ResumeData:
+    """Extract the resume from an uploaded PDF file, and return it as a draft to be
+    reviewed by the user before saving it
+    
+    Parameters:
+    -----------
+    * **file**: UploadFile: the resume PDF file
+    
+    Returns: ResumeData: the extracted resume `draft`, the sections that could not be extracted are empty
+    """
+    path = await _spool_upload(file, MAX_PDF_BYTES)
+    try:
+        draft = await run_in_process(extract_resume_draft, path)
+    except PDFExtractionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    finally:
+        os.remove(path)
+    return _draft_to_resume_data(draft)
+
+
+@router.post('/import/zip')
+async def import_zip_resumes(
+    file: Annotated[UploadFile, File()],
+    user: Annotated[User, Depends(get_current_user)],
+    templateId: Annotated[str, Form()] = '',
+    ) -> StreamingResponse:
+    """Import all the resumes of a ZIP archive of PDF or JSON resumes for the logged in user,
+    the progress of each file is streamed while the import is running
+    
+    Parameters:
+    -----------
+    * **file**: UploadFile: the ZIP archive
+    * **templateId**: str: the template id of the resumes that don't specify one
+    
+    Returns: StreamingResponse: `ndjson` stream of ImportProgress, one line per file and a final summary line
+    """
+    path = await _spool_upload(file, MAX_ARCHIVE_BYTES)
+    try:
+        names = list_resumes(path)
+    except ArchiveExtractionError as e:
+        os.remove(path)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    async def stream():
+        # bound the work submitted to the process pool at once
+        semaphore = asyncio.Semaphore(pool_size() * 2)
+
+        async def extract(name: str) -> tuple[str, dict | Exception]:
+            async with semaphore:
+                try:
+                    return name, await run_in_process(extract_resume, path, name)
+                except Exception as e:
+                    return name, e
+
+        batch: list[tuple[str, Resume]] = []
+        imported = failed = 0
+
+        async def write_batch():
+            nonlocal imported, failed
+            written = await user.add_resumes([resume for _, resume in batch])
+            for name, resume in batch:
+                if written:
+                    imported += 1
+                    yield ImportProgress(file=name, status='imported', resume_id=resume.id)
+                else:
+                    failed += 1
+                    yield ImportProgress(file=name, status='error', error='An Error occurred please try again later')
+            batch.clear()
+
+        tasks = [asyncio.ensure_future(extract(name)) for name in names]
+        try:
+            for task in asyncio.as_completed(tasks):
+                name, document = await task
+                try:
+                    if isinstance(document, Exception):
+                        raise document
+                    batch.append((name, _document_to_resume(document, templateId, name.lower().endswith('.pdf'))))
+                except Exception as e:
+                    failed += 1
+                    yield _progress_line(ImportProgress(file=name, status='error', error=_error_message(e)))
+                    continue
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    async for progress in write_batch():
+                        yield _progress_line(progress)
+            if batch:
+                async for progress in write_batch():
+                    yield _progress_line(progress)
+            yield _progress_line(ImportProgress(status='done', imported=imported, failed=failed))
+        finally:
+            for task in tasks:
+                task.cancel()
+            _remove_file(path)
+
+    # the background task removes the archive when the stream is never started
+    return StreamingResponse(stream(), media_type='application/x-ndjson',
+                             background=BackgroundTask(_remove_file, path))
+
+
+def _document_to_resume(document: dict, template_id: str, is_draft: bool) -> Resume:
+    """Validate the extracted resume document and build the resume object, the JSON resumes
+    can be either in the create request format or in the stored resume format"""
+    if is_draft:
+        document = _draft_to_resume_data(document).model_dump(exclude_none=True)
+    elif isinstance(document.get('data'), dict):
+        document = {**document['data'], 'templateId': document.get('templateId')}
+    document = {'education': [], 'projects': [], **document}
+    document['templateId'] = document.get('templateId') or template_id
+    return Resume.from_request(ResumeCreate.model_validate(document))
+
+
+def _error_message(error: Exception) -> str:
+    """Format the import error of a file, the unexpected errors are not shown to the user"""
+    if isinstance(error, ValidationError):
+        return '; '.join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors())
+    if isinstance(error, ArchiveExtractionError):
+        return str(error)
+    print(error)
+    return 'The file could not be imported'
+
+
+def _remove_file(path: str):
+    """Remove the temporary file, if it was not removed yet"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _progress_line(progress: ImportProgress) -> str:
+    """Serialize the import progress as one ndjson line"""
+    return progress.model_dump_json(exclude_none=True) + '\n'
+
+
+async def _spool_upload(upload: UploadFile, max_bytes: int, chunk_size: int = 1024 * 1024) -> str:
+    """Write the uploaded file to a temporary file chunk by chunk, rejecting it once it
+    exceeds max_bytes, and return the temporary file path"""
+    size = 0
+    with NamedTemporaryFile(delete=False, suffix=os.path.splitext(upload.filename or '')[1]) as spooled:
+        while chunk := await upload.read(chunk_size):
+            size += len(chunk)
+            if size > max_bytes:
+                spooled.close()
+                os.remove(spooled.name)
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"The file is larger than {max_bytes} bytes"
+                )
+            spooled.write(chunk)
+    return spooled.name
+
+
+# the resume sections entries models, used to validate the extracted drafts
+_SECTION_MODELS = {
+    'projects': Project,
+    'experiences': Experience,
+    'education': Education,
+    'achievements': Achievement,
+    'certificates': Certificate,
+    'languages': Language,
+}
+
+
+def _draft_to_resume_data(draft: dict) -> ResumeData:
+    """Validate the extracted resume draft, the entries that are not valid are dropped
+    instead of failing the whole draft"""
+    fields = {}
+    if draft.get('title'):
+        try:
+            fields['title'] = Title.model_validate(draft['title'])
+        except ValidationError:
+            pass
+    for section, model in _SECTION_MODELS.items():
+        entries = []
+        for entry in draft.get(section) or []:
+            try:
+                entries.append(model.model_validate(entry))
+            except ValidationError:
+                continue
+        if entries:
+            fields[section] = entries
+    fields['summary'] = draft.get('summary')
+    fields['skills'] = draft.get('skills')
+    return ResumeData(**fields)
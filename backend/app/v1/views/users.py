@@ -2,6 +2,7 @@
 """User views module for the API."""
 from typing import Annotated
 from fastapi import APIRouter, Body, Depends, HTTPException, status
+from pymongo.errors import DuplicateKeyError
 
 # import schemas
 from app.v1.schema.user_schemas import UserCreate, UserOut
@@ -11,6 +12,7 @@ from app.v1.schema.auth_schemas import Token
 from app.v1.utils.access_token import create_access_token, get_current_user
 
 # User database model
+from models.indexes import syncedCollections
 from models.user import User
 
 router = APIRouter(
@@ -34,10 +36,19 @@ async def create_user(user: Annotated[UserCreate, Body()]) -> Token:
     
     Returns: Token: the `access token`
     """
-    if await User.find_one({"email":user.email}):
+    # the unique email index rejects the already registered emails once it's created
+    if 'users' not in syncedCollections and await User.find_one({"email": user.email}):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists")
     new_user = User(**user.model_dump())
-    await new_user.save()
+    try:
+        saved = await new_user.save()
+    except DuplicateKeyError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists")
+    if not saved:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='An Error occurred please try again later'
+        )
     access_token = await create_access_token(new_user.id)
     return Token(access_token=access_token, token_type="bearer")
 
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of the models attributes access cost and the per instance memory of the
+`User` and `Resume` models
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_model_attributes [--number N] [--instances N]
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+from timeit import timeit
+
+from models.resume import Resume
+from models.user import User
+
+# an already hashed password, so building the users does not run bcrypt
+HASHED_PASSWORD = '$2b$12$' + 'x' * 53
+RESUME_DATA = {
+    'title': {'name': 'John Doe', 'jobTitle': 'Engineer', 'links': []}, 'summary': 'summary',
+    'projects': [], 'experiences': [], 'education': [], 'skills': [], 'languages': [],
+}
+
+
+def make_user() -> User:
+    return User(first_name='John', last_name='Doe', email='john@doe.com', password=HASHED_PASSWORD)
+
+
+def make_resume() -> Resume:
+    return Resume(templateId='classic', data=Resume._data_from_dict(RESUME_DATA))
+
+
+def access_cost(model: object, attributes: list[str], number: int) -> None:
+    """Print the cost of reading and writing each attribute, in nanoseconds"""
+    for name in attributes:
+        read = timeit(f'model.{name}', globals={'model': model}, number=number) / number
+        value = getattr(model, name)
+        written = timeit(f'model.{name} = value', globals={'model': model, 'value': value},
+                         number=number) / number
+        print(f'  {name:<12} read {read * 1e9:8.1f}ns   write {written * 1e9:8.1f}ns')
+
+
+def instance_memory(factory, count: int) -> float:
+    """The memory allocated by building each instance in bytes, its own field values included"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [factory() for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del instances
+    return size / count
+
+
+def shallow_size(model: object) -> int:
+    """The size of the instance itself in bytes, with its attributes dict if it has one"""
+    return sys.getsizeof(model) + (sys.getsizeof(vars(model)) if hasattr(model, '__dict__') else 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=1_000_000, help='the accesses per attribute')
+    parser.add_argument('--instances', type=int, default=10_000, help='the instances of the memory measure')
+    args = parser.parse_args()
+
+    user, resume = make_user(), make_resume()
+    persisted = make_user()
+    persisted.mark_persisted()
+    print('User')
+    access_cost(user, ['first_name', 'email', 'created_at', 'id'], args.number)
+    print('User, loaded from the database (tracked writes)')
+    access_cost(persisted, ['first_name', 'updated_at'], args.number)
+    print('Resume')
+    access_cost(resume, ['templateId', 'updated_at', 'id'], args.number)
+
+    builds = args.number // 10
+    for label, factory, instance in (('User', make_user, user), ('Resume', make_resume, resume)):
+        print(f'{label:<8}build {timeit(factory, number=builds) / builds * 1e6:8.2f}us'
+              f'   {instance_memory(factory, args.instances):8.1f} bytes/instance'
+              f'   {shallow_size(instance)} bytes shallow')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Throughput benchmark of the resume PDF import on a corpus of sample PDFs
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_pdf_extractor CORPUS_DIR [--generate N] [--workers W]
+
+`--generate N` fills CORPUS_DIR with N synthetic resumes first (requires reportlab)
+"""
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from utils.pdf_extractor import extract_resume_draft, iter_pages
+
+
+def generate_corpus(directory: str, count: int) -> None:
+    """Write count synthetic resume PDFs of 1 to 3 pages into directory"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    os.makedirs(directory, exist_ok=True)
+    for index in range(count):
+        pdf = canvas.Canvas(os.path.join(directory, f'resume_{index}.pdf'), pagesize=A4)
+        lines = [f'Candidate {index}', 'Software Engineer', f'linkedin.com/in/candidate{index}',
+                 'Summary', 'A software engineer with a strong grasp of backend development.',
+                 'Experience']
+        for job in range(8 * (index % 3 + 1)):
+            lines += [f'Software Engineer at Company {job}, Cairo', f'Jan {2000 + job} - Dec {2001 + job}']
+            lines += [f'• Delivered project {job}.{bullet} with a measurable impact' for bullet in range(4)]
+        lines += ['Education', 'Bachelor of Science, MIT, Cambridge MA', '2012 - 2016',
+                  'Skills', 'Python, JavaScript, MongoDB, Docker, Kubernetes',
+                  'Languages', 'English (Native), Arabic - Proficient']
+        y = 800
+        for line in lines:
+            if y < 50:
+                pdf.showPage()
+                y = 800
+            pdf.drawString(50, y, line)
+            y -= 16
+        pdf.save()
+
+
+def count_pages(path: str) -> int:
+    """Count the pages of the PDF"""
+    with open(path, 'rb') as file:
+        return sum(1 for _ in iter_pages(file, max_pages=1000))
+
+
+async def run_pool(paths: list[str], workers: int) -> float:
+    """Extract all the PDFs concurrently in a warmed up process pool, and return the elapsed time"""
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        await asyncio.gather(*(loop.run_in_executor(pool, os.getpid) for _ in range(workers)))
+        started = perf_counter()
+        await asyncio.gather(*(loop.run_in_executor(pool, extract_resume_draft, path) for path in paths))
+        return perf_counter() - started
+
+
+def report(label: str, files: int, pages: int, elapsed: float) -> None:
+    print(f'{label:<24} {elapsed:8.3f}s {files / elapsed:10.1f} files/s {pages / elapsed:10.1f} pages/s')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', help='the directory holding the sample PDFs')
+    parser.add_argument('--generate', type=int, default=0, help='generate N synthetic resumes first')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='the process pool size')
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_corpus(args.corpus, args.generate)
+    paths = sorted(os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+                   if name.lower().endswith('.pdf'))
+    if not paths:
+        parser.error(f'no PDF files found in {args.corpus}')
+    pages = sum(count_pages(path) for path in paths)
+    print(f'{len(paths)} files, {pages} pages')
+
+    started = perf_counter()
+    for path in paths:
+        extract_resume_draft(path, max_bytes=1 << 40, max_pages=1000)
+    report('sequential', len(paths), pages, perf_counter() - started)
+
+    report(f'process pool ({args.workers})', len(paths), pages, asyncio.run(run_pool(paths, args.workers)))
+
+
+if __name__ == '__main__':
+    main()
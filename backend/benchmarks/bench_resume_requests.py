@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Benchmark of the resume create and update requests CPU, from the validated request to the
+stored document, against the former dump and rebuild path
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_resume_requests [--entries N ...] [--number N]
+
+`--entries N` is the number of experiences, projects and education entries of the resume
+"""
+import argparse
+from timeit import timeit
+
+from app.v1.schema.resume_schemas import ResumeCreate, ResumeUpdate
+from models.compression import pack
+from models.resume import Resume
+
+
+def make_fields(entries: int) -> dict:
+    """The resume data fields of a create request with entries of each section"""
+    text = 'Delivered the search ranking rewrite, cutting the latency by a third. ' * 6
+    return {
+        'title': {'name': 'John Doe', 'jobTitle': 'Engineer',
+                  'links': [{'type': 'GitHub', 'linkUrl': 'https://github.com/john'}] * 3},
+        'summary': text,
+        'projects': [{'title': f'Project {i}', 'description': text} for i in range(entries)],
+        'experiences': [{'companyName': f'Company {i}', 'roleTitle': 'Engineer', 'location': 'Cairo',
+                         'summary': text, 'startingDate': '2020-01-01T00:00:00'} for i in range(entries)],
+        'education': [{'schoolName': 'MIT', 'degreeTitle': 'BSc', 'location': 'Cambridge',
+                       'startingDate': '2012-09-01T00:00:00', 'endingDate': '2016-06-01T00:00:00'}
+                      for _ in range(entries)],
+        'achievements': [{'title': 'Award', 'description': text}] * entries,
+        'skills': [f'skill {i}' for i in range(entries * 4)],
+        'languages': [{'name': 'Arabic', 'proficient': 'native'}],
+    }
+
+
+def rebuilt_create(request: ResumeCreate) -> dict:
+    """The former create path, the request is dumped and its sections rebuilt by `from_dict`"""
+    resume_dict = request.model_dump()
+    template_id = resume_dict.pop('templateId')
+    return Resume(templateId=template_id, data=Resume._data_from_dict(resume_dict)).to_document()
+
+
+def direct_create(request: ResumeCreate) -> dict:
+    return Resume.from_request(request).to_document()
+
+
+def dumped_update(request: ResumeUpdate) -> dict:
+    """The former update path, the dumped data fields are packed by `_resume_updates`"""
+    updates = request.model_dump(exclude_defaults=True)
+    return {key: pack(value, key) for key, value in updates.get('data', {}).items()}
+
+
+def direct_update(request: ResumeUpdate) -> dict:
+    return Resume.updates_from_request(request)
+
+
+def report(label: str, function, number: int) -> float:
+    elapsed = timeit(function, number=number) / number
+    print(f'  {label:<24} {elapsed * 1e6:10.1f}us')
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, nargs='+', default=[5, 50, 200], help='the resume sizes')
+    parser.add_argument('--number', type=int, default=200, help='the requests per measure')
+    args = parser.parse_args()
+
+    for entries in args.entries:
+        fields = make_fields(entries)
+        create = ResumeCreate.model_validate({'templateId': 'classic', **fields})
+        update = ResumeUpdate.model_validate({'data': fields})
+        print(f'{entries} entries')
+        before = report('create, dump and rebuild', lambda: rebuilt_create(create), args.number)
+        after = report('create, from request', lambda: direct_create(create), args.number)
+        print(f'  create speedup {before / after:.1f}x')
+        before = report('update, dump', lambda: dumped_update(update), args.number)
+        after = report('update, from request', lambda: direct_update(update), args.number)
+        print(f'  update speedup {before / after:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
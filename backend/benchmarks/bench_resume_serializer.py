@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Benchmark of the resume data serializer against the former recursive `Resume._data_to_dict`
+on large resumes
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_resume_serializer [--entries N] [--number N]
+
+`--entries N` is the number of experiences, projects and education entries of the resume
+"""
+import argparse
+from datetime import datetime
+from enum import Enum
+from timeit import timeit
+from uuid import UUID
+
+from pydantic_core import Url
+
+from models.compression import pack
+from models.resume import Resume
+from models.serializer import serialize
+
+
+def recursive_data_to_dict(obj):
+    """The former `Resume._data_to_dict`, the reference of the benchmark"""
+    if isinstance(obj, (str, int, float, bool)):
+        return obj
+    elif isinstance(obj, datetime):
+        return obj.strftime("%Y-%m-%d")
+    elif isinstance(obj, (UUID, Url)):
+        return str(obj)
+    elif isinstance(obj, Enum):
+        return obj.value
+    elif isinstance(obj, list):
+        return [recursive_data_to_dict(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {k: recursive_data_to_dict(v) for k, v in obj.items()}
+    elif hasattr(obj, '__dict__'):
+        return {k: recursive_data_to_dict(v) for k, v in obj.__dict__.items()}
+
+
+def make_resume(entries: int) -> Resume:
+    """Build a resume with entries experiences, projects and education entries"""
+    text = 'Delivered the search ranking rewrite, cutting the latency by a third. ' * 6
+    return Resume(templateId='classic', data=Resume._data_from_dict({
+        'title': {'name': 'John Doe', 'jobTitle': 'Engineer',
+                  'links': [{'type': 'GitHub', 'linkUrl': 'https://github.com/john'}] * 3},
+        'summary': text,
+        'projects': [{'title': f'Project {i}', 'description': text} for i in range(entries)],
+        'experiences': [{'companyName': f'Company {i}', 'roleTitle': 'Engineer', 'location': 'Cairo',
+                         'summary': text, 'startingDate': datetime(2000 + i % 20, 1, 1), 'endingDate': 'present'}
+                        for i in range(entries)],
+        'education': [{'schoolName': 'MIT', 'degreeTitle': 'BSc', 'location': 'Cambridge',
+                       'startingDate': datetime(2012, 9, 1), 'endingDate': datetime(2016, 6, 1)}
+                      for _ in range(entries)],
+        'achievements': [{'title': 'Award', 'description': text}] * entries,
+        'skills': [f'skill {i}' for i in range(entries * 4)],
+        'languages': [{'name': 'Arabic', 'proficient': 'native'}, {'name': 'English', 'proficient': 'proficient'}],
+    }))
+
+
+def report(label: str, function, number: int) -> float:
+    elapsed = timeit(function, number=number) / number
+    print(f'  {label:<32} {elapsed * 1e6:10.1f}us')
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, nargs='+', default=[5, 50, 200], help='the resume sizes')
+    parser.add_argument('--number', type=int, default=200, help='the serializations per measure')
+    args = parser.parse_args()
+
+    for entries in args.entries:
+        data = make_resume(entries).data
+        assert serialize(data) == recursive_data_to_dict(data)
+        print(f'{entries} entries')
+        before = report('recursive', lambda: recursive_data_to_dict(data), args.number)
+        after = report('serializer', lambda: serialize(data), args.number)
+        report('recursive + pack (zlib)', lambda: pack(recursive_data_to_dict(data), codec='zlib'), args.number)
+        report('serializer (zlib)', lambda: serialize(data, 'zlib'), args.number)
+        print(f'  speedup {before / after:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,18 @@
 from utils.db_engine import DBEngine
 
 dbEngine = DBEngine()
+
+from models.write_behind import ResumeWriteBuffer
+
+resumeWriteBuffer = ResumeWriteBuffer()
+
+from models.user_cache import UserCache
+
+userCache = UserCache()
+
+from utils.change_streams import ChangeStreamConsumer, MongoTokenStore, MotorChangeSource
+
+changeStreams = ChangeStreamConsumer(MotorChangeSource(dbEngine), MongoTokenStore(dbEngine))
+# the users written by the other workers and the scripts are dropped from the profiles cache
+changeStreams.register('users', lambda event: userCache.invalidate(event['documentKey']['_id'], publish=False))
+changeStreams.on_reset(userCache.clear)
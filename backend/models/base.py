@@ -1,50 +1,111 @@
 #!/usr/bin/env python3
 """ A module that holds the database base model abstarction
 """
-from dataclasses import dataclass, field
+import os
+from dataclasses import dataclass, fields
 from datetime import datetime
-from typing import Any
+from typing import Any, ClassVar
 from uuid import uuid4, UUID
+from pymongo import IndexModel
 from models import dbEngine
+from models.compression import pack
+
+_MISSING = object()
+# how the ids of all the models are stored, `string` the 36 characters form, or `binary` the
+# 16 bytes UUID binary subtype 4, the stored string ids are converted by `models.migrate_ids`
+ID_STORAGE = os.getenv('ID_STORAGE', 'string')
+
+
+def timestamp(value: datetime | str) -> str:
+    """Format the stored timestamp as the models serialize them, so the timestamps written
+    as datetime objects sort consistently with the string ones"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%dT%H:%M:%S')
+    return str(value)
+
 
-@dataclass
 class Base:
-    """The base database models abstraction
+    """The base database models abstraction, the models are slotted dataclasses built by
+    the `model` decorator, so the fields are read straight from their slots
     """
-    # id: UUID = field(default_factory=uuid4)
-    # created_at: datetime = field(default_factory=datetime.now)
-    # updated_at: datetime = field(default_factory=datetime.now)
+    # True once the document is loaded from or saved to the database, then the changes of
+    # the tracked fields are recorded in `_dirty`, created on the first change. They are
+    # plain slots, not dataclass fields, so they are not part of the serialized models
+    __slots__ = ('_persisted', '_dirty')
+    # the indexes of the model collection, created on the application startup
+    indexes: ClassVar[list[IndexModel]] = []
+    # the fields whose changes are not written by `save`, they have their own update methods
+    untracked: ClassVar[tuple[str, ...]] = ()
+    # the fields holding a timestamp, the datetime values are formatted once when assigned
+    timestamps: ClassVar[tuple[str, ...]] = ('created_at', 'updated_at')
+    # the database policies of the model operations, by the operation name, like `insert`,
+    # `update`, `delete`, `find` or `edit_resume`, see `DBEngine.default_policies`
+    policies: ClassVar[dict[str, str]] = {}
 
+    def __new__(cls, *args: Any, **kwargs: Any) -> 'Base':
+        model = super().__new__(cls)
+        model._persisted = False
+        model._dirty = None
+        return model
 
-    def __getattribute__(self, name: str) -> Any:
-        """get the attribute of the model, to handle UUID or Datetime convertion to string
-        """
-        if name == 'id':
-            return str(self._id)
-        if name in ['created_at', 'updated_at'] and isinstance(self.__dict__.get(name, None), datetime):
-            return self.__dict__[name].strftime('%Y-%m-%dT%H:%M:%S')
-        return super().__getattribute__(name)
-
-    def __setattr__(self, name: str, value: Any) -> None:
-        """set the attribute of the model, to handle string convertion to UUID or Datetime
-        """
-        if name == 'id' and isinstance(value, str):
-            self._id = UUID(value)
-        if name in ['created_at', 'updated_at'] and isinstance(value, str):
-            self.__dict__[name] = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
-        super().__setattr__(name, value)
+    @property
+    def id(self) -> str:
+        """The id of the model as a string"""
+        return str(self._id)  # type: ignore
+
+    @id.setter
+    def id(self, value: str | UUID) -> None:
+        self._id = UUID(value) if isinstance(value, str) else value
+
+    @property
+    def dirty_fields(self) -> set[str]:
+        """The fields changed since the document was loaded or saved"""
+        return set(self._dirty or ())
+
+    def mark_persisted(self) -> None:
+        """Mark the model as stored in the database with no pending changes"""
+        self._persisted = True
+        self._dirty = None
 
     async def save(self) -> str | None:
-        """Save the model object to the database
+        """Save the model object to the database, a new document is inserted, and only the
+        changed fields of an existing one are set, with no database round trip if nothing changed
 
         Returns:
         --------
         * str: the id of the saved document or None if the save failed
         """
         collection = f"{self.__class__.__name__.lower()}s"
-        model_doc = self.to_dict()
-        result = await dbEngine.save(collection, model_doc)
-        return result
+        if not self._persisted:
+            result = await dbEngine.save(collection, self.to_dict(), self._policy('insert'))
+            if result:
+                self.mark_persisted()
+            return result
+        dirty = self._dirty
+        if not dirty:
+            return self.id
+        # only the changed fields are serialized
+        changes = self.stored_fields(dirty)
+        updated = await dbEngine.update(collection, self.stored_id(self.id), changes, self._policy('update'))
+        await self._changed()
+        if not updated:
+            return None
+        self._dirty = None
+        return self.id
+
+    def stored_fields(self, names: set[str]) -> dict:
+        """The stored form of the named fields, the models storing a field in another form
+        than its value override it
+
+        Parameters:
+        -----------
+        * names: set[str]: the names of the tracked fields
+
+        Returns:
+        --------
+        * dict: the fields names mapped to their stored values
+        """
+        return {name: getattr(self, name) for name in names}
 
     async def delete(self) -> bool:
         """Delete the model from the database
@@ -54,7 +115,8 @@ class Base:
         * bool: True if the delete operation was successful, False otherwise
         """
         collection = f"{self.__class__.__name__.lower()}s"
-        result = await dbEngine.delete(collection, self.id)
+        result = await dbEngine.delete(collection, self.stored_id(self.id), self._policy('delete'))
+        await self._changed()
         return result
 
     async def update(self, data: dict) -> bool:
@@ -71,7 +133,8 @@ class Base:
         collection = f"{self.__class__.__name__.lower()}s"
         filtered_data = {k: v for k, v in data.items()
                          if k not in ['id', 'created_at']}
-        result = await dbEngine.update(collection, self.id, filtered_data)
+        result = await dbEngine.update(collection, self.stored_id(self.id), filtered_data, self._policy('update'))
+        await self._changed()
         return result
     
     async def update_resumes(self, op: str, resume: object) -> bool:
@@ -80,28 +143,37 @@ class Base:
         Parameters:
         -----------
         * op: str: the operation to perform on the resumes list
-        * resume: Resume object: the resume object to push/delete into/from the user's resumes
+        * resume: Resume object: the resume object to push/delete into/from the user's resumes,
+                  or a list of resume objects to push all at once
 
         Returns:
         --------
         * bool: True if the update operation was successful, False otherwise
         """
-        collection = f"{self.__class__.__name__.lower()}s"
+        collection = dbEngine.collection(f"{self.__class__.__name__.lower()}s", self._policy('update_resumes'))
         try:
-            if op == 'push':
-                return await dbEngine.db[collection].update_one(
-                    {'_id': self.id},
-                    {'$push': {'resumes': resume.to_dict()}}  # type: ignore
+            if op == 'push' and isinstance(resume, list):
+                result = await collection.update_one(
+                    {'_id': self.stored_id(self.id)},
+                    {'$push': {'resumes': {'$each': [item.to_document() for item in resume]}}}
+                )
+            elif op == 'push':
+                result = await collection.update_one(
+                    {'_id': self.stored_id(self.id)},
+                    {'$push': {'resumes': resume.to_document()}}  # type: ignore
                 )
             elif op == 'pop':
-                return await dbEngine.db[collection].update_one(
-                    {'_id': self.id},
-                    {'$pull': {'resumes': {'_id': resume.id}}}  # type: ignore
+                result = await collection.update_one(
+                    {'_id': self.stored_id(self.id)},
+                    {'$pull': {'resumes': {'_id': self.stored_id(resume.id)}}}  # type: ignore
                 )
+            else:
+                return False
         except Exception as e:
             # print(e)
             return False
-        return False
+        await self._changed()
+        return result
     
     async def edit_resume(self, resume_id:str, updates:dict):
         """Update the user resume with the id resume_id by setting the fields in the update_data
@@ -113,45 +185,140 @@ class Base:
         * update_data: dict: dictionary contains the data fields to update
         
         """
-        collection = f"{self.__class__.__name__.lower()}s"
-        update_objects = {"$set": {}}  # the update object to be passed to the update_one method
-
-        update_data = updates.pop('data', None)  # if the updates contains the resume data field
-        if update_data:
-            update_objects["$set"].update(
-                # then for each field in the data field, update the field in the database
-                {f"resumes.$.data.{key}": val for key, val in update_data.items()}
-            )
-
-        # add the rest of the fields to the update object if they are allowed to be updated 
-        update_objects["$set"].update(
-            {f"resumes.$.{key}": val for key, val in updates.items() if key in ['updated_at', 'templateId']}
-        )
+        collection = dbEngine.collection(f"{self.__class__.__name__.lower()}s", self._policy('edit_resume'))
+        # the update object to be passed to the update_one method
+        update_objects = {"$set": {f"resumes.$.{key}": val for key, val in self._resume_updates(updates).items()}}
         # print(update_objects)
         try:
-            result = await dbEngine.db[collection].update_one(
-                {"_id": self.id, "resumes._id": resume_id},
+            result = await collection.update_one(
+                {"_id": self.stored_id(self.id), "resumes._id": self.stored_id(resume_id)},
                 update=update_objects,
             )
         except Exception as e:
             # print(e)
             return False
+        await self._changed()
         return result.modified_count > 0
 
     @classmethod
-    async def find_one(cls, query: dict) -> object | None:
+    def stored_id(cls, value: str | UUID) -> str | UUID:
+        """Convert the id to its stored form, the models and the API keep using the string
+        ids. A string that is not a UUID is kept as is, so it matches no binary id
+
+        Parameters:
+        -----------
+        * value: str | UUID: the id
+
+        Returns:
+        --------
+        * str | UUID: the id string, or the UUID encoded as binary by the database client
+        """
+        if ID_STORAGE != 'binary':
+            return str(value)
+        if isinstance(value, UUID):
+            return value
+        try:
+            return UUID(value)
+        except (TypeError, ValueError):
+            return value
+
+    @classmethod
+    def _policy(cls, operation: str) -> str | None:
+        """The database policy name of the model operation, None for the client defaults"""
+        return cls.policies.get(operation)
+
+    async def _changed(self) -> None:
+        """Called after the model document was written, the models caching their documents
+        override it to invalidate the cached copies"""
+
+    @staticmethod
+    def _resume_updates(updates: dict) -> dict:
+        """Build the resume fields to set from the resume updates, relative to the resume document
+
+        Parameters:
+        -----------
+        * updates: dict: the resume updates, the `data` fields and the allowed top level fields
+
+        Returns:
+        --------
+        * dict: the dotted field paths mapped to their new values
+        """
+        updates = dict(updates)
+        fields = {}
+        update_data = updates.pop('data', None)  # if the updates contains the resume data field
+        if update_data:
+            # then for each field in the data field, update the field in the database
+            fields.update({f"data.{key}": pack(val, key) for key, val in update_data.items()})
+        # add the rest of the fields to the update object if they are allowed to be updated
+        fields.update({key: val for key, val in updates.items() if key in ['updated_at', 'templateId']})
+        if 'updated_at' in fields:
+            fields['updated_at'] = timestamp(fields['updated_at'])
+        return fields
+
+    @classmethod
+    async def find_one(cls, query: dict, projection: dict | None = None) -> object | None:
         """Find one document in the database
 
         Parameters:
         -----------
         * query: dict: the query to search for
+        * projection: dict | None: the fields to include or exclude, defaults to the whole document
 
         Returns:
         --------
         * Any: the document found or None if not found
         """
         collection = f"{cls.__name__.lower()}s"
-        result = await dbEngine.find_one(collection, query)
+        result = await dbEngine.find_one(collection, query, projection, cls._policy('find'))
         if result:
-            return cls.from_dict(result)  # type: ignore
+            model = cls.from_dict(result)  # type: ignore
+            model.mark_persisted()
+            return model
         return None
+
+
+def model(cls: type) -> type:
+    """Build the model class as a slotted dataclass, where each tracked field is read from its
+    slot by a C level property getter, and assigned by a setter recording the changes of the
+    persisted models, the timestamps are formatted once when assigned. The properties defined
+    for the fields, like the `User.password` setter, are kept and tracked the same way
+
+    Parameters:
+    -----------
+    * cls: type: the model class, a subclass of Base
+
+    Returns:
+    --------
+    * type: the slotted dataclass of the model
+    """
+    properties = {name: value for name, value in vars(cls).items() if isinstance(value, property)}
+    cls = dataclass(slots=True)(cls)
+    for item in fields(cls):
+        tracked, is_timestamp = item.name not in cls.untracked, item.name in cls.timestamps
+        # the private fields and the untracked plain fields are left as plain slots
+        if item.name.startswith('_') or not (tracked or is_timestamp or item.name in properties):
+            continue
+        slot = properties.get(item.name) or vars(cls)[item.name]
+        setattr(cls, item.name, _field(item.name, slot, tracked, is_timestamp))
+    return cls
+
+
+def _field(name: str, slot: Any, tracked: bool, is_timestamp: bool) -> property:
+    """Build the property of a model field stored by the slot descriptor"""
+    get, assign = slot.__get__, slot.__set__
+
+    def set_field(model: Base, value: Any) -> None:
+        if is_timestamp and isinstance(value, datetime):
+            value = value.strftime('%Y-%m-%dT%H:%M:%S')
+        if tracked and model._persisted:
+            try:
+                previous = get(model)
+            except AttributeError:
+                previous = _MISSING
+            if previous is _MISSING or previous != value:
+                if model._dirty is None:
+                    model._dirty = set()
+                model._dirty.add(name)
+        assign(model, value)
+
+    return property(get, set_field, doc=f"The {name} field of the model")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+""" A module that compresses the bulky free text fields of the stored resumes, the fields are
+compressed when written to the database and expanded by `Resume.from_dict`, so the models
+and the API only see the text
+"""
+import os
+import zlib
+from typing import Any
+
+from bson import Binary
+
+try:
+    import zstandard
+except ImportError:  # optional, the zstd codec is not available
+    zstandard = None
+
+# the user defined binary subtype of the compressed fields, the first byte is the codec
+SUBTYPE = 0x80
+CODECS = {'zlib': 1, 'zstd': 2}
+# the free text fields that are compressed, by their name in the resume data
+COMPRESSED_FIELDS = frozenset(('summary', 'description'))
+
+# the codec of the written fields, `zlib` or `zstd`, empty to store the text as is
+CODEC = os.getenv('RESUME_COMPRESSION', '')
+# the shorter texts are not worth compressing
+MIN_SIZE = int(os.getenv('RESUME_COMPRESSION_MIN_SIZE', 512))
+
+if CODEC and CODEC not in CODECS:
+    raise ValueError(f"Unknown RESUME_COMPRESSION codec: {CODEC}")
+if CODEC == 'zstd' and zstandard is None:
+    print("The zstandard package is not installed, the resumes fields are compressed with zlib")
+    CODEC = 'zlib'
+
+
+def pack(value: Any, name: str | None = None, codec: str | None = None) -> Any:
+    """Compress the long free text fields of the resume data
+
+    Parameters:
+    -----------
+    * value: Any: the resume data dict, or a field value
+    * name: str | None: the field name of the value, if it's a field value
+    * codec: str | None: the codec to compress with, defaults to the RESUME_COMPRESSION env variable
+
+    Returns: Any: the value with the long free text fields compressed
+    """
+    codec = CODEC if codec is None else codec
+    if not codec:
+        return value
+    if isinstance(value, str):
+        if name not in COMPRESSED_FIELDS or len(value) < MIN_SIZE:
+            return value
+        return _compress(value, codec)
+    if isinstance(value, dict):
+        return {key: pack(item, key, codec) for key, item in value.items()}
+    if isinstance(value, list):
+        return [pack(item, None, codec) for item in value]
+    return value
+
+
+def stored_forms(value: Any, name: str | None = None) -> list:
+    """The forms the value can be stored in, the documents written with the compression
+    turned off or with another codec keep their form
+
+    Parameters:
+    -----------
+    * value: Any: the resume data dict, or a field value
+    * name: str | None: the field name of the value, if it's a field value
+
+    Returns: list: the distinct forms of the value, the plain value first
+    """
+    forms = [value]
+    for codec in CODECS:
+        if codec == 'zstd' and zstandard is None:
+            continue
+        packed = pack(value, name, codec)
+        if packed not in forms:
+            forms.append(packed)
+    return forms
+
+
+def unpack(value: Any) -> Any:
+    """Expand the compressed fields of the stored resume data, the plain fields are kept
+
+    Parameters:
+    -----------
+    * value: Any: the stored resume data dict, or a field value
+
+    Returns: Any: the value with the text of the compressed fields
+    """
+    if isinstance(value, bytes) and getattr(value, 'subtype', None) == SUBTYPE:
+        return _expand(value)
+    if isinstance(value, dict):
+        return {key: unpack(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [unpack(item) for item in value]
+    return value
+
+
+def _compress(text: str, codec: str) -> Binary:
+    """Compress the text, the codec id is the first byte"""
+    data = text.encode()
+    if codec == 'zstd':
+        compressed = zstandard.ZstdCompressor().compress(data)  # type: ignore
+    else:
+        compressed = zlib.compress(data, 6)
+    return Binary(bytes([CODECS[codec]]) + compressed, SUBTYPE)
+
+
+def _expand(value: bytes) -> str:
+    """Expand the compressed text, raises ValueError if its codec is not available"""
+    codec, data = value[0], value[1:]
+    if codec == CODECS['zlib']:
+        return zlib.decompress(data).decode()
+    if codec == CODECS['zstd'] and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data).decode()
+    raise ValueError(f"The compressed resume field codec {codec} is not available")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+""" A module that holds the database indexes management of the models
+"""
+import asyncio
+import os
+
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from models import dbEngine
+from models.resume import Resume
+from models.user import User
+
+
+# the models whose declared indexes are synced on the application startup
+MODELS = [User, Resume]
+
+# the collections whose declared indexes are all created, the unique constraints of the other
+# collections are not enforced by the database yet
+syncedCollections: set[str] = set()
+
+
+async def sync_indexes() -> dict[str, list[str]]:
+    """Create the missing indexes declared by the models, the existing indexes are left untouched.
+    The duplicate documents preventing a unique index creation are reported before the error is raised
+
+    Returns:
+    --------
+    * dict: the indexes names per collection
+    """
+    synced = {}
+    for model in MODELS:
+        collection = f"{model.__name__.lower()}s"
+        try:
+            synced[collection] = await dbEngine.ensure_indexes(collection, model.indexes)
+        except DuplicateKeyError:
+            for index in model.indexes:
+                if index.document.get('unique'):
+                    await report_duplicates(collection, index)
+            raise
+        syncedCollections.add(collection)
+    return synced
+
+
+async def keep_syncing_indexes(retry_interval: float | None = None) -> None:
+    """Sync the indexes, retrying until they are all created, the failures are printed and
+    don't stop the application
+
+    Parameters:
+    -----------
+    * retry_interval: float | None: the seconds between two attempts, defaults to the
+                      INDEXES_RETRY_INTERVAL env variable or 30
+    """
+    retry_interval = retry_interval or float(os.getenv('INDEXES_RETRY_INTERVAL', 30))
+    while True:
+        try:
+            await sync_indexes()
+            return
+        except Exception as e:
+            print(e)
+        await asyncio.sleep(retry_interval)
+
+
+async def report_duplicates(collection: str, index: IndexModel, limit: int = 20) -> list[dict]:
+    """Print the documents sharing the same keys of a unique index
+
+    Parameters:
+    -----------
+    * collection: str: the indexed collection
+    * index: IndexModel: the unique index
+    * limit: int: the maximum number of duplicate keys reported
+
+    Returns:
+    --------
+    * list[dict]: the duplicate keys, each with its documents `ids`
+    """
+    keys = list(index.document['key'])
+    # the whole collection is scanned for a printed report, it's served by a secondary
+    duplicates = await dbEngine.collection(collection, 'analytics').aggregate([
+        {"$group": {"_id": {key.replace('.', '_'): f"${key}" for key in keys},
+                    "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]).to_list(limit)
+    for duplicate in duplicates:
+        print(f"The {index.document['name']} index of {collection} can not be created, "
+              f"{duplicate['_id']} is shared by the documents {duplicate['ids']}")
+    return duplicates
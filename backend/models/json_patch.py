@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+""" A module that translates the RFC 6902 JSON Patch operations of a resume into the
+targeted MongoDB updates, so an edit writes only the changed paths
+"""
+import types
+import typing
+from dataclasses import dataclass, field
+from typing import Any, Union
+from uuid import uuid4
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from models.compression import pack, stored_forms
+from models.resume import ResumeData
+from models.serializer import serialize
+
+# the top level resume fields that can be patched, mapped to their types
+PATCHABLE_FIELDS: dict[str, Any] = {
+    'templateId': str,
+    'data': ResumeData,
+}
+SUPPORTED_OPERATIONS = ('add', 'remove', 'replace', 'test')
+
+
+class JSONPatchError(ValueError):
+    """Raised when a patch operation is not valid or not supported"""
+
+
+class JSONPatchConflict(Exception):
+    """Raised when a patch `test` operation, a target existence check, or the write of a
+    value its target can't hold fails"""
+
+
+@dataclass
+class PatchStep:
+    """One MongoDB update of the translated patch, applied only if the resume matches
+    the conditions
+
+    Parameters:
+    -----------
+    * conditions: dict, the resume fields filter, relative to the resume document
+    * update: dict, the update operators, relative to the resume document
+    * optional: bool, the step is skipped when the resume doesn't match the conditions
+    """
+    conditions: dict = field(default_factory=dict)
+    update: dict[str, dict] = field(default_factory=dict)
+    optional: bool = False
+
+    def paths(self) -> list[str]:
+        """The paths updated by the step"""
+        return [path for fields in self.update.values() for path in fields]
+
+    def conflicts(self, path: str) -> bool:
+        """Check if updating path in the same step conflicts with the step updates"""
+        return any(_related(path, updated) for updated in self.paths())
+
+
+def translate(operations: list[dict]) -> list[PatchStep]:
+    """Translate the patch operations into ordered update steps, the consecutive operations
+    on unrelated paths are merged into the same step
+
+    Parameters:
+    -----------
+    * operations: list[dict]: the RFC 6902 operations, with the `op`, `path` and `value` members
+
+    Returns: list[PatchStep]: the update steps to apply in order
+    Raises: JSONPatchError if an operation is not valid or not supported
+    """
+    steps = [PatchStep()]
+    # the removed array elements are set to the marker then pulled out, it's unique to the patch
+    removed = f"removed:{uuid4()}"
+    initialised: set[str] = set()
+    for operation in operations:
+        op = operation.get('op')
+        if op not in SUPPORTED_OPERATIONS:
+            raise JSONPatchError(f"Unsupported patch operation: {op}")
+        tokens = _parse_pointer(operation.get('path'))
+        annotation = _resolve(tokens)
+        path = '.'.join(tokens)
+        index = tokens[-1] if _is_index(tokens[-1]) else None
+        if op == 'test':
+            if steps[-1].update:
+                # the test applies to the resume as left by the previous operations
+                steps.append(PatchStep())
+            # the resume may hold the value compressed with any codec, or as it is
+            forms = stored_forms(_document(annotation, operation.get('value'), operation['path']), tokens[-1])
+            steps[-1].conditions[path] = forms[0] if len(forms) == 1 else {'$in': forms}
+            continue
+        if op == 'remove':
+            _check_index(index, allow_end=False)
+            step = _step_for(steps, path)
+            step.conditions.setdefault(path, {'$exists': True})
+            if index is None:
+                # the resume is read back with every member of the schema, a removed optional member
+                # is stored as null and a required one can't be removed
+                if not _nullable(annotation):
+                    raise JSONPatchError(f"The resume field {operation['path']} is required and can't be removed")
+                step.update.setdefault('$set', {})[path] = None
+            else:
+                # the array element is set to the marker, then the marker is pulled out of the array
+                array = '.'.join(tokens[:-1])
+                step.update.setdefault('$set', {})[path] = removed
+                steps.append(PatchStep())
+                steps[-1].update['$pull'] = {array: removed}
+            continue
+        if 'value' not in operation:
+            raise JSONPatchError(f"The {op} operation at {operation.get('path')} has no value")
+        value = pack(_document(annotation, operation['value'], operation['path']), tokens[-1])
+        if op == 'add' and index is not None:
+            _check_index(index, allow_end=True)
+            array = '.'.join(tokens[:-1])
+            if array not in initialised and _nullable(_resolve(tokens[:-1])):
+                _initialise(steps, array)
+                initialised.add(array)
+            push: dict = {'$each': [value]}
+            if index != '-':
+                push['$position'] = int(index)
+            _step_for(steps, array).update.setdefault('$push', {})[array] = push
+            continue
+        if op == 'replace':
+            _check_index(index, allow_end=False)
+        step = _step_for(steps, path)
+        if op == 'replace':
+            step.conditions.setdefault(path, {'$exists': True})
+        step.update.setdefault('$set', {})[path] = value
+    return [step for step in steps if step.update or step.conditions]
+
+
+def _initialise(steps: list[PatchStep], array: str) -> None:
+    """Add the step setting the null array to an empty one, `$push` fails on null. When the
+    last step only has test conditions, the step is applied before it with the same conditions"""
+    if steps[-1].update:
+        steps += [PatchStep(conditions={array: None}, update={'$set': {array: []}}, optional=True), PatchStep()]
+    else:
+        steps.insert(len(steps) - 1, PatchStep(conditions={**steps[-1].conditions, array: None},
+                                               update={'$set': {array: []}}, optional=True))
+
+
+def _nullable(annotation: Any) -> bool:
+    """Check if the annotation accepts None"""
+    return typing.get_origin(annotation) in (Union, types.UnionType) and type(None) in typing.get_args(annotation)
+
+
+def _step_for(steps: list[PatchStep], path: str) -> PatchStep:
+    """Get the step to update path in, a new step is started if it conflicts with the last one"""
+    if steps[-1].conflicts(path) or any(_related(path, condition) for condition in steps[-1].conditions):
+        if steps[-1].update:
+            steps.append(PatchStep())
+    return steps[-1]
+
+
+def _parse_pointer(pointer: Any) -> list[str]:
+    """Parse the JSON pointer into its reference tokens"""
+    if not isinstance(pointer, str) or not pointer.startswith('/'):
+        raise JSONPatchError(f"Invalid patch path: {pointer}")
+    tokens = [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+    if any(not token or '.' in token or token.startswith('$') for token in tokens):
+        raise JSONPatchError(f"Invalid patch path: {pointer}")
+    return tokens
+
+
+def _resolve(tokens: list[str]) -> Any:
+    """Resolve the type of the value at the path, raises JSONPatchError if the path doesn't
+    exist in the resume schema"""
+    annotation: Any = PATCHABLE_FIELDS.get(tokens[0])
+    if annotation is None:
+        raise JSONPatchError(f"The resume has no field /{tokens[0]}")
+    for position, token in enumerate(tokens[1:], start=1):
+        container = _container(annotation)
+        if container is list:
+            if not _is_index(token):
+                raise JSONPatchError(f"Invalid array index {token} at /{'/'.join(tokens[:position])}")
+            if token == '-' and position != len(tokens) - 1:
+                raise JSONPatchError("The end of array index `-` can only be the last path token")
+            annotation = typing.get_args(_strip_none(annotation))[0]
+        elif container is not None:
+            field_types = _field_types(container)
+            if token not in field_types:
+                raise JSONPatchError(f"The resume has no field /{'/'.join(tokens[:position + 1])}")
+            annotation = field_types[token]
+        else:
+            raise JSONPatchError(f"The resume field /{'/'.join(tokens[:position])} has no members")
+    return annotation
+
+
+def _strip_none(annotation: Any) -> Any:
+    """Remove None from an optional annotation"""
+    if typing.get_origin(annotation) in (Union, types.UnionType):
+        members = [member for member in typing.get_args(annotation) if member is not type(None)]
+        # the containers of a union like `list[Link] | None` are walked into
+        containers = [member for member in members if _container(member) is not None]
+        if containers:
+            return containers[0]
+        return Union[tuple(members)] if len(members) > 1 else members[0]
+    return annotation
+
+
+def _container(annotation: Any) -> Any:
+    """The kind of the container type, list, a model class, or None for the scalars"""
+    annotation = annotation if typing.get_origin(annotation) not in (Union, types.UnionType) \
+        else _strip_none(annotation)
+    if typing.get_origin(annotation) is list:
+        return list
+    if isinstance(annotation, type) and (issubclass(annotation, BaseModel) or annotation is ResumeData):
+        return annotation
+    return None
+
+
+def _field_types(model: type) -> dict[str, Any]:
+    """The fields types of a pydantic model or the ResumeData dataclass"""
+    if issubclass(model, BaseModel):
+        return {name: info.annotation for name, info in model.model_fields.items()}
+    return typing.get_type_hints(model)
+
+
+def _is_index(token: str) -> bool:
+    """Check if the token is an array index"""
+    return token == '-' or token.isdigit()
+
+
+def _check_index(index: str | None, allow_end: bool) -> None:
+    """Check the array index is valid for the operation"""
+    if index == '-' and not allow_end:
+        raise JSONPatchError("The end of array index `-` can only be used to add")
+
+
+def _related(path: str, other: str) -> bool:
+    """Check if one of the paths is the other or one of its parents"""
+    return path == other or path.startswith(f"{other}.") or other.startswith(f"{path}.")
+
+
+def _document(annotation: Any, value: Any, pointer: str) -> Any:
+    """Validate the value against the field type and convert it to its stored form"""
+    try:
+        validated = TypeAdapter(annotation).validate_python(value)
+    except ValidationError as e:
+        raise JSONPatchError('; '.join(
+            f"{'/'.join([pointer, *map(str, item['loc'])])}: {item['msg']}" for item in e.errors()
+        ))
+    return serialize(validated)
+
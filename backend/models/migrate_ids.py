@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+""" An offline migration of the string ids to the 16 bytes binary UUIDs, it runs with the
+application stopped, then the application is started with ID_STORAGE=binary. An interrupted
+run is completed by the next one
+
+usage: python -m models.migrate_ids [--batch-size N]
+"""
+import argparse
+import asyncio
+from uuid import UUID
+
+from pymongo import DeleteOne, InsertOne, ReplaceOne, UpdateOne
+
+from models import dbEngine
+from utils.db_engine import DUPLICATE_KEY, sized_write
+
+# the users being migrated are kept aside here, the users unique email index forbids
+# the string and the binary copies of a user in the users collection at once
+BACKUP = "users_id_migration"
+
+
+def binary_id(value):
+    """Convert a string UUID id to its binary form, the other ids are kept as is"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return UUID(value)
+    except ValueError:
+        return value
+
+
+def _binary_user(user: dict) -> dict:
+    """Convert the ids of the user and of its embedded resumes"""
+    user = {**user, "_id": binary_id(user["_id"])}
+    if "resumes" in user:
+        user["resumes"] = [{**resume, "_id": binary_id(resume["_id"])} for resume in user["resumes"]]
+    return user
+
+
+async def _restore(users: list[dict]) -> None:
+    """Write the binary copies of the backed up users, then drop their backups"""
+    if not users:
+        return
+    written = await dbEngine.bulk_write(
+        "users", [sized_write(ReplaceOne, {"_id": binary_id(user["_id"])}, _binary_user(user), upsert=True) for user in users]
+    )
+    for error in written.errors:
+        print(f"user {users[error['index']]['_id']}: {error['message']}, kept in {BACKUP}")
+    restored = [user["_id"] for index, user in enumerate(users) if index not in written.failed]
+    await dbEngine.db[BACKUP].delete_many({"_id": {"$in": restored}})
+
+
+async def migrate_users(batch_size: int = 100) -> int:
+    """Convert the users ids and their embedded resumes ids, batch by batch. Each batch is
+    backed up, removed, then written back with the binary ids
+
+    Parameters:
+    -----------
+    * batch_size: int: the number of users converted at once
+
+    Returns:
+    --------
+    * int: the number of the converted users
+    """
+    # the users of an interrupted run
+    await _restore(await dbEngine.db[BACKUP].find().to_list(None))
+    converted = 0
+    batch: list[dict] = []
+    users = dbEngine.db["users"].find({"_id": {"$type": "string"}}).batch_size(batch_size)
+    async for user in users:
+        batch.append(user)
+        if len(batch) < batch_size:
+            continue
+        converted += await _convert_users(batch)
+        batch = []
+    return converted + await _convert_users(batch)
+
+
+async def _convert_users(users: list[dict]) -> int:
+    """Convert one batch of users"""
+    if not users:
+        return 0
+    backed_up = await dbEngine.insert_many(BACKUP, users)
+    # a user already backed up by an interrupted run is a duplicate
+    failed = {error["index"] for error in backed_up.errors if error["code"] != DUPLICATE_KEY}
+    users = [user for index, user in enumerate(users) if index not in failed]
+    await dbEngine.db["users"].delete_many({"_id": {"$in": [user["_id"] for user in users]}})
+    await _restore(users)
+    return len(users)
+
+
+async def migrate_resumes(batch_size: int = 100) -> int:
+    """Convert the ids and the owners ids of the resumes collection, batch by batch. The
+    resumes with a string id are copied then removed, the others have their owner id updated
+
+    Parameters:
+    -----------
+    * batch_size: int: the number of resumes converted at once
+
+    Returns:
+    --------
+    * int: the number of the converted resumes
+    """
+    converted = 0
+    batch: list[dict] = []
+    resumes = dbEngine.db["resumes"].find(
+        {"$or": [{"_id": {"$type": "string"}}, {"user_id": {"$type": "string"}}]}
+    ).batch_size(batch_size)
+    async for resume in resumes:
+        batch.append(resume)
+        if len(batch) < batch_size:
+            continue
+        converted += await _convert_resumes(batch)
+        batch = []
+    return converted + await _convert_resumes(batch)
+
+
+async def _convert_resumes(resumes: list[dict]) -> int:
+    """Convert one batch of resumes"""
+    if not resumes:
+        return 0
+    operations = [
+        sized_write(InsertOne, {**resume, "_id": binary_id(resume["_id"]), "user_id": binary_id(resume["user_id"])})
+        if isinstance(resume["_id"], str) else
+        sized_write(UpdateOne, {"_id": resume["_id"]}, {"$set": {"user_id": binary_id(resume["user_id"])}})
+        for resume in resumes
+    ]
+    written = await dbEngine.bulk_write("resumes", operations)
+    # a duplicate key means the copy was written by an interrupted run
+    failed = {error["index"] for error in written.errors if error["code"] != DUPLICATE_KEY}
+    if failed:
+        print(f"{len(failed)} resumes could not be converted, {written.errors[0]['message']}")
+    copied = [sized_write(DeleteOne, {"_id": resume["_id"]}) for index, resume in enumerate(resumes)
+              if index not in failed and isinstance(resume["_id"], str) and binary_id(resume["_id"]) != resume["_id"]]
+    if copied:
+        await dbEngine.bulk_write("resumes", copied)
+    return len(resumes) - len(failed)
+
+
+async def migrate(batch_size: int = 100) -> dict:
+    """Convert the string ids of the users and the resumes to the binary UUIDs
+
+    Parameters:
+    -----------
+    * batch_size: int: the number of documents converted at once
+
+    Returns:
+    --------
+    * dict: the number of the converted users and resumes
+    """
+    return {"users": await migrate_users(batch_size), "resumes": await migrate_resumes(batch_size)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the string ids to the binary UUIDs")
+    parser.add_argument("--batch-size", type=int, default=100, help="the number of documents converted at once")
+    args = parser.parse_args()
+
+    async def main():
+        if not await dbEngine.connect():
+            raise SystemExit("The database is not reachable")
+        try:
+            print(await migrate(args.batch_size))
+        finally:
+            dbEngine.close()
+
+    asyncio.run(main())
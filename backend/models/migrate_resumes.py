@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+""" An online migration of the embedded user resumes to the resumes collection, it runs
+while the application serves with RESUME_STORAGE=collection, which reads the not yet
+migrated resumes from the users documents
+
+usage: python -m models.migrate_resumes [--batch-size N]
+"""
+import argparse
+import asyncio
+
+from pymongo import ReplaceOne
+
+from models import dbEngine
+from models.base import timestamp
+from models.indexes import sync_indexes
+from utils.db_engine import DUPLICATE_KEY, sized_write
+
+
+async def migrate_user(user_id: str, batch_size: int = 100) -> int:
+    """Move the embedded resumes of one user to the resumes collection, batch by batch.
+    Each resume is upserted only over an older copy, then pulled from the user document
+    only if it was not edited meanwhile, the edited ones are moved again on the next batch
+
+    Parameters:
+    -----------
+    * user_id: str: the id of the user to migrate
+    * batch_size: int: the number of resumes moved at once
+
+    Returns:
+    --------
+    * int: the number of the moved resumes
+    """
+    moved = 0
+    while True:
+        user = await dbEngine.db["users"].find_one({"_id": user_id}, {"resumes": {"$slice": batch_size}})
+        resumes = (user or {}).get("resumes") or []
+        if not resumes:
+            return moved
+        operations = [
+            sized_write(
+                ReplaceOne,
+                # a newer copy in the collection was edited after an earlier move, keep it
+                {"_id": resume["_id"], "updated_at": {"$lt": timestamp(resume["updated_at"])}},
+                {**resume, "user_id": user_id, "created_at": timestamp(resume["created_at"]),
+                 "updated_at": timestamp(resume["updated_at"])},
+                upsert=True
+            )
+            for resume in resumes
+        ]
+        written = await dbEngine.bulk_write("resumes", operations)
+        # a duplicate key means the collection has a newer copy, the embedded one is dropped
+        failed = {error["index"] for error in written.errors if error["code"] != DUPLICATE_KEY}
+        if failed:
+            print(f"user {user_id}: {len(failed)} resumes could not be moved, {written.errors[0]['message']}")
+            resumes = [resume for index, resume in enumerate(resumes) if index not in failed]
+            if not resumes:
+                return moved
+        result = await dbEngine.db["users"].update_one(
+            {"_id": user_id},
+            {"$pull": {"resumes": {"$or": [
+                {"_id": resume["_id"], "updated_at": resume["updated_at"]} for resume in resumes
+            ]}}}
+        )
+        if result.modified_count:
+            moved += len(resumes)  # an upper bound, a resume edited meanwhile is counted again
+        else:
+            # every resume of the batch was edited meanwhile, retry with the new copies
+            await asyncio.sleep(0)
+
+
+async def migrate(batch_size: int = 100) -> dict:
+    """Move the embedded resumes of all the users to the resumes collection
+
+    Parameters:
+    -----------
+    * batch_size: int: the number of resumes moved at once
+
+    Returns:
+    --------
+    * dict: the number of the migrated users and the moved resumes
+    """
+    await sync_indexes()
+    users = resumes = 0
+    async for user in dbEngine.db["users"].find({"resumes.0": {"$exists": True}}, {"_id": 1}):
+        moved = await migrate_user(user["_id"], batch_size)
+        users += 1
+        resumes += moved
+        print(f"user {user['_id']}: {moved} resumes moved")
+    return {"users": users, "resumes": resumes}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move the embedded resumes to the resumes collection")
+    parser.add_argument("--batch-size", type=int, default=100, help="the number of resumes moved at once")
+    args = parser.parse_args()
+
+    async def main():
+        if not await dbEngine.connect():
+            raise SystemExit("The database is not reachable")
+        try:
+            print(await migrate(args.batch_size))
+        finally:
+            dbEngine.close()
+
+    asyncio.run(main())
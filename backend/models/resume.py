@@ -5,12 +5,19 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import ClassVar, List, Optional
 from uuid import uuid4, UUID
 
-from pydantic_core import Url
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
-from models.base import Base
+from models.base import Base, model
+from models import compression
+from models.compression import unpack
+from models.serializer import serialize
+
+# the resume sections whose entries have the date fields, dumped as datetimes by pydantic
+DATED_SECTIONS = ('experiences', 'education')
+DATE_FIELDS = ('startingDate', 'endingDate')
 
 
 class LanguageProficiencyLevel(Enum):
@@ -72,7 +79,7 @@ class Title(BaseModel):
         return cls(
             name=data['name'],
             jobTitle=data['jobTitle'],
-            links=[Link(type=item['type'], linkUrl=item['linkUrl']) for item in data['links']]
+            links=[Link(type=item['type'], linkUrl=item['linkUrl']) for item in data.get('links') or []]
         )
 
 
@@ -313,7 +320,7 @@ class ResumeData:
     languages: list[Language] = field(default_factory=list)
 
 
-@dataclass
+@model
 class Resume(Base):
     """The resume dataclass that represent the resume document in the database containing all the fields
     
@@ -326,6 +333,10 @@ class Resume(Base):
     * updated_at: datetime, the date and time the resume was last updated
     * templateId: str, the template (html file) id of the resume
     """
+    # used by the `collection` resume storage, where each resume document has the owner user_id
+    indexes: ClassVar[list[IndexModel]] = [
+        IndexModel([('user_id', ASCENDING), ('updated_at', DESCENDING)], name='user_updated_at'),
+    ]
     data: ResumeData = field(default_factory=ResumeData)  # type: ignore
     _id: UUID = field(default_factory=uuid4)
     created_at: datetime = field(default_factory=datetime.now)
@@ -339,42 +350,45 @@ class Resume(Base):
         --------
         dict: the dictionary representation of the object instance containing the fields of the resume
         """
-        return {
-            "_id": self.id,
-            "created_at": self.created_at,
-            "updated_at": self.updated_at,
-            "templateId": str(self.templateId),
-            "data": self._data_to_dict(self.data)
-        }
+        return self._document('')
+
+    def to_document(self) -> dict:
+        """Convert the object instance to its stored document, the long free text fields
+        are compressed when the RESUME_COMPRESSION env variable is set
+
+        Returns:
+        --------
+        dict: the stored document of the resume
+        """
+        return self._document(compression.CODEC)
+
+    def stored_fields(self, names: set[str]) -> dict:
+        """The stored form of the named fields, like in `to_dict`
 
-    def _data_to_dict(self, obj):
-        """A recursive function that convert the resume data to a dictionary
-        
         Parameters:
         -----------
-        
-        * obj: any, the object to be converted to a dictionary, at start it's the resume data: ResumeData
-        
+        * names: set[str]: the names of the tracked fields
+
         Returns:
         --------
-        dict: the dictionary representation of the resume data
+        * dict: the fields names mapped to their stored values
         """
-        if isinstance(obj, (str, int, float, bool)):
-            return obj
-        elif isinstance(obj, datetime):
-            return obj.strftime("%Y-%m-%d")
-        elif isinstance(obj, (UUID, Url)):
-            return str(obj)
-        elif isinstance(obj, Enum):
-            return obj.value
-        elif isinstance(obj, list):
-            return [self._data_to_dict(item) for item in obj]
-        elif isinstance(obj, dict):
-            return {k: self._data_to_dict(v) for k, v in obj.items()}
-        elif hasattr(obj, '__dict__'):
-            return {k: self._data_to_dict(v) for k, v in obj.__dict__.items()}
-        # else:
-        #     return str(obj)
+        fields = {name: getattr(self, name) for name in names}
+        if 'data' in fields:
+            fields['data'] = serialize(self.data)
+        if 'templateId' in fields:
+            fields['templateId'] = str(self.templateId)
+        return fields
+
+    def _document(self, codec: str) -> dict:
+        """Build the resume document, the data is serialized and compressed in one pass"""
+        return {
+            "_id": self.stored_id(self.id),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "templateId": str(self.templateId),
+            "data": serialize(self.data, codec)
+        }
 
     @classmethod
     def from_dict(cls, data: dict) -> 'Resume':
@@ -390,7 +404,7 @@ class Resume(Base):
         Resume: the resume object instance
         """
         return cls(
-            data=cls._data_from_dict(data['data']),
+            data=cls._data_from_dict(unpack(data['data'])),
             _id=data['_id'],
             created_at=data['created_at'],
             updated_at=data['updated_at'],
@@ -398,6 +412,63 @@ class Resume(Base):
 
         )
     
+    @classmethod
+    def from_request(cls, request: BaseModel) -> 'Resume':
+        """Build the resume from the validated create request, its sections entries are the
+        already validated models, they are reused with no dump and rebuild
+
+        Parameters:
+        -----------
+
+        * request: BaseModel, the validated create request, with the templateId and the resume data fields
+
+        Returns:
+        --------
+        Resume: the resume object instance
+        """
+        return cls(
+            templateId=request.templateId,  # type: ignore
+            data=ResumeData(
+                title=request.title,  # type: ignore
+                summary=request.summary,  # type: ignore
+                projects=request.projects,  # type: ignore
+                experiences=request.experiences,  # type: ignore
+                education=request.education,  # type: ignore
+                achievements=request.achievements or None,  # type: ignore
+                certificates=request.certificates or None,  # type: ignore
+                skills=request.skills,  # type: ignore
+                languages=request.languages,  # type: ignore
+            )
+        )
+
+    @staticmethod
+    def updates_from_request(request: BaseModel) -> dict:
+        """Build the resume updates from the validated update request, the set fields of its
+        data are dumped with their nested defaults and the dates in their stored form
+
+        Parameters:
+        -----------
+
+        * request: BaseModel, the validated update request, with the optional templateId, updated_at and data
+
+        Returns:
+        --------
+        dict: the resume updates, with the `data` fields to set
+        """
+        updates = {key: value for key in ('templateId', 'updated_at')
+                   if (value := getattr(request, key, None)) is not None}
+        data = getattr(request, 'data', None)
+        if data is not None:
+            # the native dump, then only the dates are set to their stored `%Y-%m-%d` form
+            fields = data.model_dump()
+            for section in DATED_SECTIONS:
+                for document in fields[section] or ():
+                    for key in DATE_FIELDS:
+                        if type(value := document[key]) is datetime:
+                            document[key] = value.date().isoformat()
+            updates['data'] = {key: value for key, value in fields.items() if value is not None}
+        return updates
+
     @classmethod
     def _data_from_dict(cls, data: dict) -> 'ResumeData':
         """Convert the dictionary to a resume data object instance
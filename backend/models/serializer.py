@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+""" A module that serializes the resume data to its stored document in one pass. A serializer
+function is generated once per class from its field list, and each value type has its own
+converter, so the values are not matched against a chain of isinstance checks
+"""
+import dataclasses
+from datetime import datetime
+from enum import Enum
+from functools import cache
+from typing import Any, Callable
+from uuid import UUID
+
+from pydantic import BaseModel
+from pydantic_core import Url
+
+from models.compression import COMPRESSED_FIELDS, pack
+
+# the types stored as they are, the subclasses are matched by `Serializer._converter`
+PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def serialize(value: Any, codec: str = '') -> Any:
+    """Convert the resume data to its stored form, the dataclasses and the pydantic models
+    become dicts, the datetimes `%Y-%m-%d` strings, the UUIDs and the urls strings and the
+    enums their values
+
+    Parameters:
+    -----------
+    * value: Any: the resume data, or any of its fields values
+    * codec: str: the codec to compress the long free text fields with, empty to keep the text
+
+    Returns:
+    --------
+    * Any: the stored form of the value, raises TypeError for a type with no stored form
+    """
+    return serializer(codec).convert(value)
+
+
+@cache
+def serializer(codec: str = '') -> 'Serializer':
+    """The shared serializer of the codec"""
+    return Serializer(codec)
+
+
+class Serializer:
+    """Convert the values to their stored form, with a converter per type, the classes
+    converters are generated on their first serialized instance
+
+    Parameters:
+    -----------
+    * codec: str: the codec to compress the COMPRESSED_FIELDS with, empty to keep the text
+    """
+
+    def __init__(self, codec: str = ''):
+        self.codec = codec
+        self.converters: dict[type, Callable[[Any], Any]] = {
+            datetime: _format_date,
+            UUID: str,
+            Url: str,
+            list: self._list,
+            dict: self._dict,
+        }
+
+    def convert(self, value: Any) -> Any:
+        """Convert the value to its stored form"""
+        kind = type(value)
+        if kind in PLAIN_TYPES:
+            return value
+        converter = self.converters.get(kind)
+        if converter is None:
+            converter = self.converters[kind] = self._converter(kind)
+        return converter(value)
+
+    def _list(self, value: list) -> list:
+        convert = self.convert
+        return [item if type(item) in PLAIN_TYPES else convert(item) for item in value]
+
+    def _dict(self, value: dict) -> dict:
+        convert, codec = self.convert, self.codec
+        document = {key: item if type(item) in PLAIN_TYPES else convert(item) for key, item in value.items()}
+        if codec:
+            for key in COMPRESSED_FIELDS.intersection(document):
+                document[key] = pack(document[key], key, codec)
+        return document
+
+    def _converter(self, kind: type) -> Callable[[Any], Any]:
+        """Find the converter of a type with no registered converter"""
+        if issubclass(kind, Enum):
+            return _enum_value
+        if issubclass(kind, tuple(PLAIN_TYPES)):
+            return _same
+        if issubclass(kind, datetime):
+            return _format_date
+        if issubclass(kind, (UUID, Url)):
+            return str
+        if issubclass(kind, (list, tuple)):
+            return self._list
+        if issubclass(kind, dict):
+            return self._dict
+        if issubclass(kind, BaseModel):
+            return self._compile(kind, list(kind.model_fields))
+        if dataclasses.is_dataclass(kind):
+            return self._compile(kind, [item.name for item in dataclasses.fields(kind)])
+        raise TypeError(f"The {kind.__name__} values can not be stored in the resume document")
+
+    def _compile(self, kind: type, names: list[str]) -> Callable[[Any], Any]:
+        """Generate the function building the document of the class instances from its fields
+
+        Parameters:
+        -----------
+        * kind: type: the dataclass or the pydantic model class
+        * names: list[str]: the fields of the class, in the order of the document keys
+
+        Returns:
+        --------
+        * Callable: the function converting an instance to its document
+        """
+        lines = ["def serialize(obj):"]
+        items = []
+        for index, name in enumerate(names):
+            lines += [f"    value_{index} = obj.{name}",
+                      f"    if type(value_{index}) not in plain:",
+                      f"        value_{index} = convert(value_{index})"]
+            if self.codec and name in COMPRESSED_FIELDS:
+                lines.append(f"    value_{index} = pack(value_{index}, {name!r}, codec)")
+            items.append(f"{name!r}: value_{index}")
+        lines.append(f"    return {{{', '.join(items)}}}")
+        namespace = {'plain': PLAIN_TYPES, 'convert': self.convert, 'pack': pack, 'codec': self.codec}
+        exec('\n'.join(lines), namespace)  # the source is built from the class field names only
+        function = namespace['serialize']
+        function.__qualname__ = f"serialize_{kind.__name__}"
+        return function
+
+
+def _format_date(value: datetime) -> str:
+    # the same `%Y-%m-%d` format, isoformat is several times faster than strftime
+    return value.date().isoformat() if value.year >= 1000 else value.strftime("%Y-%m-%d")
+
+
+def _enum_value(value: Enum) -> Any:
+    return value.value
+
+
+def _same(value: Any) -> Any:
+    return value
@@ -1,19 +1,30 @@
 #!/usr/bin/env python3
 """ A module that holds the database model abstarction for the resumes document
 """
-from dataclasses import dataclass, field
+import base64
+import json
+import os
+from dataclasses import field
 from datetime import datetime
-from typing import List, Optional
+from typing import ClassVar, List, Optional
 from uuid import uuid4, UUID
 from bcrypt import hashpw, checkpw, gensalt
-from models.base import Base
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import WriteError
+from models import dbEngine, resumeWriteBuffer, userCache
+from models import json_patch
+from models.base import Base, model, timestamp
 from models.resume import Resume
 
 
-@dataclass
+@model
 class User(Base):
     """The user database model abstraction
     """
+    indexes: ClassVar[list[IndexModel]] = [
+        IndexModel([('email', ASCENDING)], unique=True, name='email_unique'),
+        IndexModel([('resumes._id', ASCENDING)], name='resumes_id'),
+    ]
     first_name: str
     last_name: str
     email: str
@@ -26,6 +37,26 @@ class User(Base):
     is_active: bool = False
     is_admin: bool = False
 
+    # where the resumes are stored, `embedded` in the user document resumes array, or
+    # `collection` in the resumes collection, where the not yet migrated embedded resumes
+    # are still read, edited and removed
+    resume_storage: ClassVar[str] = os.getenv('RESUME_STORAGE', 'embedded')
+    # the resumes are written by `update_resumes` and `edit_resume`
+    untracked: ClassVar[tuple[str, ...]] = ('resumes',)
+    # the accounts creation survives a failover, and the autosaves are acknowledged by the
+    # primary only. The listings are read from the primary, like the other reads, the owner
+    # lists the resumes just written, including the ones flushed by the listing itself
+    policies: ClassVar[dict[str, str]] = {
+        'insert': 'durable',
+        'edit_resume': 'fast',
+    }
+    # the projection of the profile fields, the resumes are loaded on demand by `load_resumes`
+    PROFILE_PROJECTION: ClassVar[dict] = {'resumes': 0}
+    # False when the user was loaded without its resumes
+    _resumes_loaded: bool = field(default=True, init=False, repr=False, compare=False)
+    # set by the password setter, with no default so it's not reset after the password
+    _hashed_password: str = field(init=False, repr=False, compare=False)
+
     @property
     def full_name(self):
         """Return the full name of the user
@@ -52,6 +83,19 @@ class User(Base):
             # raise ValueError("The password could not be hashed, or already hashed")
             self._hashed_password = password  # security risk, TODO: seek a better way to handle this
 
+    def stored_fields(self, names: set[str]) -> dict:
+        """The stored form of the named fields, the password is stored hashed
+
+        Parameters:
+        -----------
+        * names: set[str]: the names of the tracked fields
+
+        Returns:
+        --------
+        * dict: the fields names mapped to their stored values
+        """
+        return {name: self._hashed_password if name == 'password' else getattr(self, name) for name in names}
+
     def check_password(self, password: str) -> bool:
         """ validate the user enterded password
         
@@ -67,14 +111,15 @@ class User(Base):
 
 
     def to_dict(self):
-        """Convert the object instance to a dictionary ready to be save on database
+        """Convert the object instance to a dictionary ready to be save on database,
+        the resumes are omitted if they were not loaded
 
         Returns:
         --------
         dict: the dictionary representation of the object instance containing
         """
-        return {
-            "_id": self.id,
+        user_dict = {
+            "_id": self.stored_id(self.id),
             "created_at": self.created_at,
             "updated_at": self.updated_at,
             "first_name": self.first_name,
@@ -82,10 +127,13 @@ class User(Base):
             "email": self.email,
             "password": self._hashed_password,
             "profile_img": self.profile_img,
-            "resumes": [resume.to_dict() for resume in self.resumes],
+            "resumes": [resume.to_document() for resume in self.resumes],
             "is_active": self.is_active,
             "is_admin": self.is_admin
         }
+        if not self._resumes_loaded:
+            del user_dict["resumes"]
+        return user_dict
     
     @classmethod
     def from_dict(cls, user_dict: dict):
@@ -93,7 +141,8 @@ class User(Base):
         
         Parameters:
         -----------
-        * user_dict: dict: a dictionary containing the user data
+        * user_dict: dict: a dictionary containing the user data, if the resumes
+                     field was projected out the resumes are marked as not loaded
         
         Returns:
         --------
@@ -111,24 +160,358 @@ class User(Base):
             is_active=user_dict["is_active"],
             is_admin=user_dict["is_admin"]
         )
+        if "resumes" not in user_dict or cls.resume_storage == 'collection':
+            # the resumes of the resumes collection are only fetched by `load_resumes`
+            user._resumes_loaded = False
+            return user
         for resume in user_dict["resumes"]:
             user.resumes.append(Resume.from_dict(resume))
         return user
 
+    @classmethod
+    async def get_profile(cls, user_id: str) -> "User | None":
+        """Get the user with its profile fields only, the profiles are served from the users
+        cache, and the concurrent loads of the same user share one database read
+
+        Parameters:
+        -----------
+        * user_id: str: the id of the user
+
+        Returns:
+        --------
+        User | None: the user or None if not found
+        """
+        user_dict = await userCache.get(
+            user_id, lambda: dbEngine.find_one("users", {"_id": cls.stored_id(user_id)}, cls.PROFILE_PROJECTION)
+        )
+        if user_dict is None:
+            return None
+        user = cls.from_dict(user_dict)
+        user.mark_persisted()
+        return user
+
+    @classmethod
+    async def find_profile(cls, query: dict) -> "User | None":
+        """Find one user with its profile fields only, without loading its resumes
+
+        Parameters:
+        -----------
+        * query: dict: the query to search for
+
+        Returns:
+        --------
+        User | None: the user found or None if not found
+        """
+        return await cls.find_one(query, cls.PROFILE_PROJECTION)  # type: ignore
+
+    async def load_resumes(self) -> List[Resume]:
+        """Load the user's resumes from the database if they were not loaded with the user
+
+        Returns:
+        --------
+        List[Resume]: the user's resumes
+        """
+        if self._resumes_loaded:
+            return self.resumes
+        await resumeWriteBuffer.flush_user(self.id)
+        user_dict = await dbEngine.find_one("users", {"_id": self.stored_id(self.id)}, {"resumes": 1})
+        # the resumes added before the load are already part of the stored documents
+        resume_dicts = (user_dict or {}).get("resumes", [])
+        if self.resume_storage == 'collection':
+            resume_dicts = await self._merge_stored_resumes(resume_dicts)
+        self.resumes = [Resume.from_dict(resume) for resume in resume_dicts]
+        self._resumes_loaded = True
+        return self.resumes
+
+    async def _merge_stored_resumes(self, embedded: list[dict]) -> list[dict]:
+        """Merge the resumes of the resumes collection with the not yet migrated embedded
+        resumes, the most recently updated copy of a resume being migrated wins
+
+        Returns:
+        --------
+        list[dict]: the resume documents ordered by their creation
+        """
+        resumes = {resume["_id"]: resume for resume in embedded}
+        async for resume in dbEngine.db["resumes"].find({"user_id": self.stored_id(self.id)}, {"user_id": 0}):
+            current = resumes.get(resume["_id"])
+            if current is None or timestamp(resume["updated_at"]) >= timestamp(current["updated_at"]):
+                resumes[resume["_id"]] = resume
+        return sorted(resumes.values(), key=lambda resume: timestamp(resume["created_at"]))
+
+    async def update_resumes(self, op: str, resume: object) -> bool:
+        """Update the user's resumes in the database, in the `collection` storage the
+        resumes are inserted into and deleted from the resumes collection
+
+        Parameters:
+        -----------
+        * op: str: the operation to perform on the resumes list
+        * resume: Resume object: the resume object to push/delete into/from the user's resumes,
+                  or a list of resume objects to push all at once
+
+        Returns:
+        --------
+        * bool: True if the update operation was successful, False otherwise
+        """
+        if self.resume_storage != 'collection':
+            # not `super()`, its implicit class is replaced by the slotted dataclass
+            return await Base.update_resumes(self, op, resume)
+        try:
+            if op == 'push':
+                resumes = resume if isinstance(resume, list) else [resume]
+                result = await dbEngine.insert_many(
+                    "resumes", ({**item.to_document(), "user_id": self.stored_id(self.id)} for item in resumes)
+                )
+                await self._changed()
+                return result.ok
+            elif op == 'pop':
+                result = await dbEngine.db["resumes"].delete_one(
+                    {"_id": self.stored_id(resume.id), "user_id": self.stored_id(self.id)}  # type: ignore
+                )
+                if result.deleted_count:
+                    await self._changed()
+                    return True
+                # not migrated yet
+                return await Base.update_resumes(self, op, resume)
+        except Exception as e:
+            print(e)
+            return False
+        return False
+
+    async def patch_resume(self, resume_id: str, operations: list[dict]) -> bool:
+        """Apply the JSON Patch operations to the user resume with the id resume_id, each
+        group of operations on unrelated paths is applied with one targeted update. The steps
+        are applied in order and are not atomic, a failed step leaves the previous ones applied
+
+        Parameters:
+        -----------
+        * resume_id: str: the id of the resume to patch
+        * operations: list[dict]: the RFC 6902 operations
+
+        Returns:
+        --------
+        bool: False if the user has no resume with this id, True otherwise
+        Raises: JSONPatchError if an operation is not valid,
+                JSONPatchConflict if a `test` operation, a target existence check or a write fails
+        """
+        steps = json_patch.translate(operations)
+        # the buffered updates are written first, so the patch applies on top of them
+        await resumeWriteBuffer.flush_user(self.id)
+        user_id, resume_id = self.stored_id(self.id), self.stored_id(resume_id)
+        if self.resume_storage == 'collection' and await dbEngine.db["resumes"].count_documents(
+                {"_id": resume_id, "user_id": user_id}, limit=1):
+            collection, prefix = "resumes", ""
+            resume_filter = {"_id": resume_id, "user_id": user_id}
+        else:
+            collection, prefix = "users", "resumes.$."
+            resume_filter = {"_id": user_id, "resumes._id": resume_id}
+        if not steps:
+            return await dbEngine.db[collection].count_documents(resume_filter, limit=1) > 0
+        steps[-1].update.setdefault("$set", {})["updated_at"] = timestamp(datetime.now())
+        try:
+            for step in steps:
+                if prefix:
+                    query = {"_id": user_id, "resumes": {"$elemMatch": {"_id": resume_id, **step.conditions}}}
+                else:
+                    query = {**resume_filter, **step.conditions}
+                update = {operator: {f"{prefix}{path}": value for path, value in fields.items()}
+                          for operator, fields in step.update.items()}
+                try:
+                    result = await dbEngine.db[collection].update_one(query, update)
+                except WriteError as e:
+                    # the target can't hold the value, like a member added to a null field
+                    print(e)
+                    raise json_patch.JSONPatchConflict("The patch can not be applied to the resume")
+                if result.matched_count or step.optional:
+                    continue
+                if not await dbEngine.db[collection].count_documents(resume_filter, limit=1):
+                    return False
+                raise json_patch.JSONPatchConflict("The resume does not match the patch")
+        finally:
+            await self._changed()
+        return True
+
+    async def edit_resume(self, resume_id: str, updates: dict):
+        """Update the user resume with the id resume_id by setting the fields in the update_data,
+        in the `collection` storage the not yet migrated resumes are edited in place
+
+        Parameters:
+        -----------
+        * resume_id: str: the id of the resume to update
+        * update_data: dict: dictionary contains the data fields to update
+        """
+        if self.resume_storage != 'collection':
+            return await Base.edit_resume(self, resume_id, updates)
+        try:
+            result = await dbEngine.collection("resumes", self._policy('edit_resume')).update_one(
+                {"_id": self.stored_id(resume_id), "user_id": self.stored_id(self.id)},
+                {"$set": self._resume_updates(updates)}
+            )
+        except Exception as e:
+            print(e)
+            return False
+        if result.matched_count:
+            await self._changed()
+            return result.modified_count > 0
+        return await Base.edit_resume(self, resume_id, updates)
+
+    async def _changed(self) -> None:
+        """Invalidate the cached copies of the user after it was written"""
+        await userCache.invalidate(self.id)
+
     async def add_resume(self, resume: Resume):
         """Add a resume to the user's resumes
         """ 
         self.resumes.append(resume)
         return await self.update_resumes(op='push', resume=resume)
 
+    async def add_resumes(self, resumes: list[Resume]):
+        """Add a batch of resumes to the user's resumes with one database write
+        """
+        self.resumes.extend(resumes)
+        written = False
+        try:
+            written = await self.update_resumes(op='push', resume=resumes)
+        finally:
+            if not written:
+                # the batch is not kept in the user's resumes when the write failed
+                batch = {id(resume) for resume in resumes}
+                self.resumes[:] = [resume for resume in self.resumes if id(resume) not in batch]
+        return written
+
+    async def list_resumes(self, limit: int, cursor: str | None = None) -> tuple[list[dict], str | None]:
+        """List a page of the user's resumes summaries, the most recently updated first, only
+        the summary fields are projected by the database
+
+        Parameters:
+        -----------
+        * limit: int: the maximum number of resumes of the page
+        * cursor: str | None: the cursor returned with the previous page, None for the first page
+
+        Returns:
+        --------
+        (summaries, next_cursor): the summaries dicts with the `_id`, `templateId`, `jobTitle`,
+        `created_at` and `updated_at` fields, and the cursor of the next page or None
+        Raises: ValueError if the cursor is not valid
+        """
+        after = None
+        if cursor:
+            updated_at, resume_id = _decode_cursor(cursor)
+            after = (updated_at, self.stored_id(resume_id))
+        await resumeWriteBuffer.flush_user(self.id)
+        summaries = await self._embedded_summaries(limit + 1, after)
+        if self.resume_storage == 'collection':
+            query: dict = {"user_id": self.stored_id(self.id)}
+            if after:
+                query.update(_after_filter(after))
+            resumes = dbEngine.collection("resumes", self._policy('list_resumes'))
+            stored = resumes.find(query, {"templateId": 1, "jobTitle": "$data.title.jobTitle",
+                                          "created_at": 1, "updated_at": 1})
+            stored_summaries = await stored.sort(RESUMES_ORDER).limit(limit + 1).to_list(limit + 1)
+            # the resumes being migrated are listed once
+            listed = {summary["_id"] for summary in stored_summaries}
+            summaries = stored_summaries + [summary for summary in summaries if summary["_id"] not in listed]
+            summaries.sort(key=lambda summary: (summary["updated_at"], str(summary["_id"])), reverse=True)
+        # the binary ids sort like their lowercase hex strings, the API lists the string ids
+        for summary in summaries:
+            summary["_id"] = str(summary["_id"])
+        page = summaries[:limit]
+        next_cursor = _encode_cursor(page[-1]) if len(summaries) > limit else None
+        return page, next_cursor
+
+    async def _embedded_summaries(self, limit: int, after: tuple[str, str | UUID] | None) -> list[dict]:
+        """Project, sort and limit the embedded resumes summaries on the database side"""
+        pipeline: list[dict] = [
+            {"$match": {"_id": self.stored_id(self.id)}},
+            {"$unwind": "$resumes"},
+            {"$project": {
+                "_id": "$resumes._id",
+                "templateId": "$resumes.templateId",
+                "jobTitle": "$resumes.data.title.jobTitle",
+                "created_at": _timestamp_expression("$resumes.created_at"),
+                "updated_at": _timestamp_expression("$resumes.updated_at"),
+            }},
+        ]
+        if after:
+            pipeline.append({"$match": _after_filter(after)})
+        pipeline += [{"$sort": dict(RESUMES_ORDER)}, {"$limit": limit}]
+        users = dbEngine.collection("users", self._policy('list_resumes'))
+        return await users.aggregate(pipeline).to_list(limit)
+
+    async def get_resume(self, resume_id: str) -> Resume | None:
+        """Get one of the user's resumes, only the resume document is fetched from the database
+
+        Parameters:
+        -----------
+        * resume_id: str: the id of the resume
+
+        Returns:
+        --------
+        Resume | None: the resume or None if the user has no resume with this id
+        """
+        if self._resumes_loaded:
+            return next((resume for resume in self.resumes if resume.id == resume_id), None)
+        await resumeWriteBuffer.flush_user(self.id)
+        if self.resume_storage == 'collection':
+            resume_dict = await dbEngine.find_one(
+                "resumes", {"_id": self.stored_id(resume_id), "user_id": self.stored_id(self.id)}, {"user_id": 0}
+            )
+            if resume_dict:
+                return Resume.from_dict(resume_dict)
+        # the positional projection returns only the matching array element
+        user_dict = await dbEngine.find_one(
+            "users",
+            {"_id": self.stored_id(self.id), "resumes._id": self.stored_id(resume_id)},
+            {"_id": 0, "resumes": {"$elemMatch": {"_id": self.stored_id(resume_id)}}}
+        )
+        if not user_dict or not user_dict.get("resumes"):
+            return None
+        return Resume.from_dict(user_dict["resumes"][0])
+
     async def remove_resume(self, resume_id: str):
         """Remove a resume from the user's resumes
         """
-        # resume = [resume for resume in self.resumes if resume.id == resume_id] or None
-        # if resume:
-        try:
-            resume = [resume for resume in self.resumes if resume.id == resume_id][0]
-            self.resumes.remove(resume)
-            return await self.update_resumes(op='pop', resume=resume)
-        except (ValueError, IndexError):
+        resume = await self.get_resume(resume_id)
+        if resume is None:
             raise ValueError("The resume does not exist in the user's resumes")
+        if self._resumes_loaded:
+            self.resumes.remove(resume)
+        return await self.update_resumes(op='pop', resume=resume)
+
+
+# the resumes listing order, the most recently updated first
+RESUMES_ORDER = [("updated_at", DESCENDING), ("_id", DESCENDING)]
+
+
+def _timestamp_expression(field_path: str) -> dict:
+    """The aggregation expression formatting the timestamps stored as dates like the string ones"""
+    return {"$cond": [
+        {"$eq": [{"$type": field_path}, "date"]},
+        {"$dateToString": {"date": field_path, "format": "%Y-%m-%dT%H:%M:%S"}},
+        field_path,
+    ]}
+
+
+def _after_filter(after: tuple[str, str | UUID]) -> dict:
+    """The filter of the resumes listed after the cursor position"""
+    updated_at, resume_id = after
+    return {"$or": [
+        {"updated_at": {"$lt": updated_at}},
+        {"updated_at": updated_at, "_id": {"$lt": resume_id}},
+    ]}
+
+
+def _encode_cursor(summary: dict) -> str:
+    """Encode the listing position after the resume summary as an opaque cursor"""
+    position = json.dumps([summary["updated_at"], summary["_id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    """Decode the listing cursor, raises ValueError if it's not valid"""
+    try:
+        updated_at, resume_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(updated_at, str) or not isinstance(resume_id, str):
+        raise ValueError("Invalid cursor")
+    return updated_at, resume_id
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+""" A module that holds the read through cache of the users profiles documents
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+from utils.cache import TTLCache
+
+
+class UserCache:
+    """Cache the recently loaded users profiles documents per process, the concurrent loads
+    of the same user share one database read. The writes of a user invalidate its entry, and
+    when a channel is configured the invalidations are published to the other workers through
+    a capped collection, the entries are otherwise at most `ttl` seconds stale
+    """
+    def __init__(self, maxsize: int | None = None, ttl: float | None = None, channel: str | None = None) -> None:
+        """Construct the user cache object
+
+        Parameters:
+        -----------
+        * maxsize: int | None: the maximum number of cached users, defaults to
+                   the USER_CACHE_SIZE env variable or 1024
+        * ttl: float | None: the seconds a user is cached, defaults to the
+               USER_CACHE_TTL env variable or 30 seconds, 0 disables the cache
+        * channel: str | None: the capped collection the invalidations are published to,
+                   defaults to the USER_CACHE_CHANNEL env variable, disabled if empty
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv('USER_CACHE_TTL', 30))
+        self.channel = channel if channel is not None else os.getenv('USER_CACHE_CHANNEL', '')
+        self._users = TTLCache(maxsize=maxsize or int(os.getenv('USER_CACHE_SIZE', 1024)), ttl=self.ttl or 1)
+        self._loading: dict[str, asyncio.Future] = {}
+        # identifies the invalidations published by this worker
+        self._origin = uuid4().hex
+        self._db_engine = None
+        self._task: asyncio.Task | None = None
+
+    async def get(self, user_id: str, load: Callable[[], Awaitable[dict | None]]) -> dict | None:
+        """Get the cached user document, or load it, the concurrent calls for the same user
+        wait for the same load
+
+        Parameters:
+        -----------
+        * user_id: str: the id of the user
+        * load: Callable: the coroutine function reading the user document from the database
+
+        Returns: dict | None: the user document, or None if the user doesn't exist
+        """
+        if self.ttl <= 0:
+            return await load()
+        user_id = str(user_id)
+        document = self._users.get(user_id)
+        if document is not None:
+            return document
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            return await asyncio.shield(loading)
+        loading = self._loading[user_id] = asyncio.get_running_loop().create_future()
+        try:
+            document = await load()
+        except Exception as e:
+            loading.set_exception(e)
+            # retrieve the exception, the load may have no other waiter
+            loading.exception()
+            raise
+        finally:
+            if self._loading.get(user_id) is loading:
+                del self._loading[user_id]
+                # an invalidation during the load discards the loaded document
+                if document is not None:
+                    self._users.set(user_id, document)
+        if not loading.done():
+            loading.set_result(document)
+        return document
+
+    async def invalidate(self, user_id: str, publish: bool = True) -> None:
+        """Drop the cached user, called after the user was written
+
+        Parameters:
+        -----------
+        * user_id: str: the id of the user
+        * publish: bool: publish the invalidation to the other workers, defaults to True
+        """
+        user_id = str(user_id)
+        self._users.pop(user_id)
+        self._loading.pop(user_id, None)
+        if publish and self.channel and self._db_engine is not None:
+            try:
+                await self._db_engine.db[self.channel].insert_one({'user_id': user_id, 'origin': self._origin})
+            except Exception as e:
+                print(e)
+
+    def clear(self) -> None:
+        """Drop all the cached users"""
+        self._users.clear()
+        self._loading.clear()
+
+    async def start(self, db_engine) -> None:
+        """Start listening to the invalidations of the other workers, if a channel is configured
+
+        Parameters:
+        -----------
+        * db_engine: DBEngine: the database engine of the channel collection
+        """
+        self._db_engine = db_engine
+        if not self.channel or (self._task is not None and not self._task.done()):
+            return
+        try:
+            await db_engine.db.create_collection(self.channel, capped=True, size=1024 * 1024)
+        except CollectionInvalid:
+            pass  # already created by another worker
+        except Exception as e:
+            print(e)
+        self._task = asyncio.ensure_future(self._listen())
+
+    async def stop(self) -> None:
+        """Stop listening to the invalidations"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self) -> None:
+        """Tail the channel collection and invalidate the users written by the other workers"""
+        last = ObjectId.from_datetime(datetime.now(timezone.utc))
+        while True:
+            try:
+                cursor = self._db_engine.db[self.channel].find(  # type: ignore
+                    {'_id': {'$gt': last}}, cursor_type=CursorType.TAILABLE_AWAIT
+                )
+                async for message in cursor:
+                    last = message['_id']
+                    if message.get('origin') != self._origin:
+                        await self.invalidate(message['user_id'], publish=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+                # the missed invalidations may have left stale users
+                self.clear()
+            # the tailable cursor is closed when the channel has no new messages
+            await asyncio.sleep(1)
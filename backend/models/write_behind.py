@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+""" A module that holds the write behind buffer coalescing the rapid updates of the resumes
+"""
+import asyncio
+import os
+from dataclasses import dataclass, field
+
+
+@dataclass
+class PendingUpdate:
+    """The updates of one resume waiting to be written
+
+    Parameters:
+    -----------
+    * user: User, the owner of the resume, used to write the updates
+    * updates: dict, the merged updates not written yet
+    * lock: asyncio.Lock, serializes the writes of the resume so they land in order
+    * timer: asyncio.Task | None, the task writing the updates once the window ends
+    """
+    user: object
+    updates: dict = field(default_factory=dict)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    timer: asyncio.Task | None = None
+
+
+class ResumeWriteBuffer:
+    """Coalesce the successive updates of a resume into one write. The first update is
+    written through, then the updates staged during the following `delay` seconds are
+    merged and written at once when the window ends, so the stored resume is at most
+    `delay` seconds stale. The reads of a user flush the user's pending updates first.
+
+    The pending updates are held by the process, another worker would neither merge them nor
+    flush them before its reads, so every update is written through when the application
+    runs more than one worker. The worker count is read from the WEB_CONCURRENCY env variable,
+    which uvicorn and gunicorn use as their default workers count
+    """
+    def __init__(self, delay: float | None = None, workers: int | None = None) -> None:
+        """Construct the write buffer object
+
+        Parameters:
+        -----------
+        * delay: float | None: the coalescing window in seconds, defaults to the
+                 WRITE_BEHIND_DELAY env variable or 2 seconds, 0 writes every update through
+        * workers: int | None: the application workers count, defaults to the WEB_CONCURRENCY
+                   env variable or 1, the updates are written through with more than one
+        """
+        workers = workers or int(os.getenv('WEB_CONCURRENCY', 1))
+        delay = delay if delay is not None else float(os.getenv('WRITE_BEHIND_DELAY', 2))
+        self.delay = delay if workers <= 1 else 0
+        # the pending updates per user id and resume id
+        self._pending: dict[str, dict[str, PendingUpdate]] = {}
+
+    async def stage(self, user, resume_id: str, updates: dict) -> bool:
+        """Stage the resume updates, they are merged with the pending updates of the resume
+
+        Parameters:
+        -----------
+        * user: User: the owner of the resume
+        * resume_id: str: the id of the resume to update
+        * updates: dict: the resume updates, as accepted by `User.edit_resume`
+
+        Returns: bool: False if the resume could not be updated, True otherwise
+        """
+        if self.delay <= 0:
+            return await user.edit_resume(resume_id, updates)
+        pending = self._pending.setdefault(user.id, {})
+        entry = pending.get(resume_id)
+        if entry is not None:
+            entry.user = user
+            _merge_updates(entry.updates, updates)
+            return True
+        # the first update of the window is written through, so a missing resume is reported
+        entry = pending[resume_id] = PendingUpdate(user=user)
+        async with entry.lock:
+            written = await user.edit_resume(resume_id, updates)
+        if not written:
+            self._discard(user.id, resume_id, entry)
+            return False
+        entry.timer = asyncio.ensure_future(self._flush_later(user.id, resume_id))
+        return True
+
+    async def flush_user(self, user_id: str) -> None:
+        """Write the pending updates of all the user's resumes, called before reading them
+
+        Parameters:
+        -----------
+        * user_id: str: the id of the user
+        """
+        for resume_id in list(self._pending.get(str(user_id), {})):
+            await self._flush(str(user_id), resume_id)
+
+    async def close(self) -> None:
+        """Write all the pending updates, called on the application shutdown"""
+        for user_id in list(self._pending):
+            await self.flush_user(user_id)
+
+    async def _flush_later(self, user_id: str, resume_id: str) -> None:
+        """Write the pending updates of the resume once the window ends"""
+        await asyncio.sleep(self.delay)
+        await self._flush(user_id, resume_id)
+
+    async def _flush(self, user_id: str, resume_id: str) -> None:
+        """Write the pending updates of the resume, the updates staged meanwhile are kept
+        for the next window"""
+        entry = self._pending.get(user_id, {}).get(resume_id)
+        if entry is None:
+            return
+        async with entry.lock:
+            updates, entry.updates = entry.updates, {}
+            if updates:
+                try:
+                    if not await entry.user.edit_resume(resume_id, updates):  # type: ignore
+                        print(f"The buffered updates of the resume {resume_id} were not written")
+                except Exception as e:
+                    print(e)
+        if entry.updates:
+            if entry.timer is None or entry.timer.done() or entry.timer is asyncio.current_task():
+                entry.timer = asyncio.ensure_future(self._flush_later(user_id, resume_id))
+        elif not entry.lock.locked():
+            self._discard(user_id, resume_id, entry)
+
+    def _discard(self, user_id: str, resume_id: str, entry: PendingUpdate) -> None:
+        """Drop the resume entry and its timer"""
+        pending = self._pending.get(user_id, {})
+        if pending.get(resume_id) is entry:
+            del pending[resume_id]
+            if not pending:
+                del self._pending[user_id]
+        if entry.timer is not None and entry.timer is not asyncio.current_task():
+            entry.timer.cancel()
+
+
+def _merge_updates(pending: dict, updates: dict) -> None:
+    """Merge the updates into the pending ones, the later value of a field wins"""
+    for key, value in updates.items():
+        if key == 'data' and value:
+            pending.setdefault('data', {}).update(value)
+        elif key != 'data':
+            pending[key] = value
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Test the assistant views"""
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app.v1.schema.assistant_response_schemas import ArtifactType
+from app.v1.schema.resume_schemas import ResumeData
+from app.v1.views.assistant import generate_artifacts
+
+
+class TestGenerateArtifacts(unittest.IsolatedAsyncioTestCase):
+    """Test the artifacts bundle stream"""
+
+    @patch('app.v1.views.assistant.AIAssistant')
+    async def test_failure_after_streaming(self, assistant):
+        """Test a failure once the stream started ends it with an error line"""
+        async def artifacts(*args, **kwargs):
+            yield ArtifactType.COVER_LETTER.value, "Dear hiring manager"
+            raise RuntimeError("the model stopped")
+
+        assistant.generate_artifacts = artifacts
+        response = await generate_artifacts(ResumeData(), MagicMock(id="user"), "Engineer", None,
+                                             [ArtifactType.COVER_LETTER, ArtifactType.INTERVIEW_QUESTIONS])
+        lines = [json.loads(line) async for line in response.body_iterator]
+        self.assertEqual(lines, [{"artifact": "cover_letter", "content": "Dear hiring manager"},
+                                 {"error": "The artifacts generation failed"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
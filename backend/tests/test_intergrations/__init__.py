@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+"""The integration tests run on the in-memory storage backend, DB_BACKEND=mongo runs them
+on a MongoDB server. It's set before the models create their database engine"""
+import os
+
+os.environ.setdefault('DB_BACKEND', 'memory')
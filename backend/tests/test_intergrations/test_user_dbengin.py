@@ -2,9 +2,16 @@ import os
 import unittest
 import uuid
 import asyncio
+from unittest.mock import AsyncMock, patch
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 from models.user import User
+from models.resume import Resume
 from models import dbEngine
+from models.indexes import keep_syncing_indexes, report_duplicates, sync_indexes, syncedCollections
+from models.migrate_ids import migrate
+from models.migrate_resumes import migrate_user
+from models.json_patch import JSONPatchConflict
 
 class TestUser(unittest.IsolatedAsyncioTestCase):
     """Integration test for the User model class"""
@@ -26,6 +33,18 @@ class TestUser(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self):
         """Clear the database before each test"""
         await self.testDB.users.delete_many({})
+        await self.testDB.resumes.delete_many({})
+
+    async def asyncTearDown(self):
+        """Restore the default resume storage"""
+        User.resume_storage = 'embedded'
+
+    @staticmethod
+    def make_resume(summary: str = "summary") -> Resume:
+        """Build a minimal resume"""
+        return Resume(templateId="classic", data=Resume._data_from_dict({
+            "title": {"name": "John Doe", "jobTitle": "Engineer", "links": []}, "summary": summary,
+            "projects": [], "experiences": [], "education": [], "skills": [], "languages": []}))
 
     async def test_save(self):
         """Test save method of the user model class"""
@@ -63,10 +82,206 @@ class TestUser(unittest.IsolatedAsyncioTestCase):
             await user.save()
             user.first_name = "Jane"
             await user.update({"first_name": "Jane"})
-            user_from_db = await self.testDB.users.find_one({"_id": user_id})
+            user_from_db = await self.testDB.users.find_one({"_id": str(user_id)})
             self.assertEqual(user_from_db["first_name"], "Jane")  # type: ignore
+            # saving the field already stored succeeds and clears the change
+            self.assertEqual(await user.save(), user.id)
+            self.assertEqual(user.dirty_fields, set())
         except Exception as e:
             self.fail(f"test_update failed with error: {str(e)}")
 
+    async def test_unique_email(self):
+        """Test the unique email index rejects the second registration"""
+        await sync_indexes()
+        user = User(first_name="John", last_name="Doe", email="johndoe@foo.bar", password="password1")
+        self.assertIsNotNone(await user.save())
+        duplicate = User(first_name="Jane", last_name="Doe", email="johndoe@foo.bar", password="password2")
+        with self.assertRaises(DuplicateKeyError):
+            await duplicate.save()
+
+    async def test_duplicate_emails(self):
+        """Test the stored duplicate emails are reported when the unique index can't be created"""
+        await self.testDB.users.drop_indexes()
+        syncedCollections.clear()
+        await self.testDB.users.insert_many([{"_id": str(uuid.uuid4()), "email": "johndoe@foo.bar"} for _ in range(2)])
+        with self.assertRaises(DuplicateKeyError):
+            await sync_indexes()
+        self.assertNotIn("users", syncedCollections)
+        # the report tolerates the lag of a secondary
+        with patch.object(dbEngine, 'collection', wraps=dbEngine.collection) as collection:
+            duplicates = await report_duplicates("users", User.indexes[0])
+        collection.assert_called_once_with("users", "analytics")
+        self.assertEqual([(item["_id"], len(item["ids"])) for item in duplicates],
+                         [({"email": "johndoe@foo.bar"}, 2)])
+        await self.testDB.users.delete_many({})
+        await sync_indexes()
+        self.assertIn("users", syncedCollections)
+
+    async def test_keep_syncing_indexes(self):
+        """Test the indexes sync is retried until it succeeds"""
+        with patch('models.indexes.sync_indexes', AsyncMock(side_effect=[Exception("unreachable"), {}])) as sync:
+            await asyncio.wait_for(keep_syncing_indexes(retry_interval=0.01), 5)
+        self.assertEqual(sync.await_count, 2)
+
+    async def test_find_profile(self):
+        """Test the profile is loaded without the resumes, and the resumes are loaded on demand"""
+        user = User(first_name="John", last_name="Doe", email="johndoe@foo.bar", password="password1")
+        await user.save()
+        resume = self.make_resume()
+        await user.add_resume(resume)
+        profile = await User.find_profile({"_id": user.id})
+        self.assertEqual(profile.email, "johndoe@foo.bar")  # type: ignore
+        self.assertEqual(profile.resumes, [])  # type: ignore
+        self.assertNotIn("resumes", profile.to_dict())  # type: ignore
+        resumes = await profile.load_resumes()  # type: ignore
+        self.assertEqual([item.id for item in resumes], [resume.id])
+
+    async def test_get_resume(self):
+        """Test only the requested resume is fetched"""
+        user = User(first_name="John", last_name="Doe", email="johndoe@foo.bar", password="password1")
+        await user.save()
+        resumes = [self.make_resume(f"summary {i}") for i in range(3)]
+        await user.add_resumes(resumes)
+        profile = await User.find_profile({"_id": user.id})
+        resume = await profile.get_resume(resumes[1].id)  # type: ignore
+        self.assertEqual(resume.data.summary, "summary 1")  # type: ignore
+        self.assertEqual(profile.resumes, [])  # type: ignore
+        self.assertIsNone(await profile.get_resume("unknown"))  # type: ignore
+        with self.assertRaises(ValueError):
+            await profile.remove_resume("unknown")  # type: ignore
+
+    async def test_add_resumes_failure(self):
+        """Test a batch that failed to be written is not kept in the user's resumes"""
+        user = User(first_name="John", last_name="Doe", email="johndoe@foo.bar", password="password1")
+        await user.save()
+        resume = self.make_resume()
+        await user.add_resume(resume)
+        with patch.object(User, 'update_resumes', AsyncMock(return_value=False)):
+            self.assertFalse(await user.add_resumes([self.make_resume(f"summary {i}") for i in range(2)]))
+        self.assertEqual(user.resumes, [resume])
+
+    async def test_list_resumes(self):
+        """Test the resumes summaries are listed page by page, the most recently updated first"""
+        user = User(first_name="John", last_name="Doe", email="johndoe@foo.bar", password="password1")
+        await user.save()
+        resumes = [self.make_resume(f"summary {i}") for i in range(5)]
+        for i, resume in enumerate(resumes):
+            resume.updated_at = f"2024-01-0{i + 1}T00:00:00"
+        await user.add_resumes(resumes)
+        listed, cursor = [], None
+        while True:
+            page, cursor = await user.list_resumes(2, cursor)
+            self.assertLessEqual(len(page), 2)
+            listed += page
+            if cursor is None:
+                break
+        self.assertEqual([summary["_id"] for summary in listed], [resume.id for resume in reversed(resumes)])
+        self.assertEqual(set(listed[0]), {"_id", "templateId", "jobTitle", "created_at", "updated_at"})
+        with self.assertRaises(ValueError):
+            await user.list_resumes(2, "invalid")
+
+    async def test_patch_resume(self):
+        """Test the JSON Patch operations are applied to the stored resume"""
+        user = User(first_name="John", last_name="Doe", email="johndoe@foo.bar", password="password1")
+        await user.save()
+        resume = self.make_resume()
+        await user.add_resume(resume)
+        self.assertTrue(await user.patch_resume(resume.id, [
+            {"op": "add", "path": "/data/skills/-", "value": "Python"},
+            {"op": "add", "path": "/data/skills/0", "value": "Go"},
+            {"op": "replace", "path": "/data/summary", "value": "patched"},
+        ]))
+        user_from_db = await self.testDB.users.find_one({"_id": user.id})
+        self.assertEqual(user_from_db["resumes"][0]["data"]["skills"], ["Go", "Python"])  # type: ignore
+        self.assertEqual(user_from_db["resumes"][0]["data"]["summary"], "patched")  # type: ignore
+        with self.assertRaises(JSONPatchConflict):
+            await user.patch_resume(resume.id, [{"op": "test", "path": "/data/summary", "value": "summary"}])
+        self.assertFalse(await user.patch_resume("unknown", [{"op": "remove", "path": "/data/skills/0"}]))
+        # the optional members are removed as null, the resume is still read back
+        self.assertTrue(await user.patch_resume(resume.id, [{"op": "remove", "path": "/data/achievements"},
+                                                            {"op": "remove", "path": "/data/title/links"}]))
+        user_from_db = await self.testDB.users.find_one({"_id": user.id})
+        self.assertIsNone(user_from_db["resumes"][0]["data"]["achievements"])  # type: ignore
+        self.assertIsNotNone(await user.get_resume(resume.id))
+
+    async def test_patch_null_arrays(self):
+        """Test the elements are added to the null arrays, and only the removed element is pulled"""
+        user = User(first_name="John", last_name="Doe", email="johndoe@foo.bar", password="password1")
+        await user.save()
+        resume = self.make_resume()
+        await user.add_resume(resume)
+        await self.testDB.users.update_one({"_id": user.id}, {"$set": {
+            "resumes.0.data.achievements": None, "resumes.0.data.skills": ["Go", None, "Python"]}})
+        self.assertTrue(await user.patch_resume(resume.id, [
+            {"op": "add", "path": "/data/achievements/-", "value": {"title": "Award", "description": "Best paper"}},
+            {"op": "remove", "path": "/data/skills/0"},
+        ]))
+        user_from_db = await self.testDB.users.find_one({"_id": user.id})
+        self.assertEqual(user_from_db["resumes"][0]["data"]["achievements"],  # type: ignore
+                         [{"title": "Award", "description": "Best paper"}])
+        self.assertEqual(user_from_db["resumes"][0]["data"]["skills"], [None, "Python"])  # type: ignore
+        # the arrays that can't be null are rejected as a conflict
+        await self.testDB.users.update_one({"_id": user.id}, {"$set": {"resumes.0.data.skills": None}})
+        with self.assertRaises(JSONPatchConflict):
+            await user.patch_resume(resume.id, [{"op": "add", "path": "/data/skills/-", "value": "Go"}])
+
+    async def test_collection_storage(self):
+        """Test the resumes are stored in the resumes collection, and the embedded ones are still served"""
+        user = User(first_name="John", last_name="Doe", email="johndoe@foo.bar", password="password1")
+        await user.save()
+        embedded = self.make_resume()
+        await user.add_resume(embedded)
+        User.resume_storage = 'collection'
+        stored = self.make_resume()
+        self.assertTrue(await user.add_resume(stored))
+        self.assertIsNotNone(await self.testDB.resumes.find_one({"_id": stored.id, "user_id": user.id}))
+
+        profile = await User.find_profile({"_id": user.id})
+        resumes = await profile.load_resumes()  # type: ignore
+        self.assertEqual({item.id for item in resumes}, {embedded.id, stored.id})
+        self.assertTrue(await profile.edit_resume(embedded.id, {"data": {"summary": "edited"}}))  # type: ignore
+        self.assertTrue(await profile.edit_resume(stored.id, {"data": {"summary": "edited"}}))  # type: ignore
+        self.assertTrue(await profile.remove_resume(embedded.id))  # type: ignore
+        self.assertTrue(await profile.remove_resume(stored.id))  # type: ignore
+        profile = await User.find_profile({"_id": user.id})
+        self.assertEqual(await profile.load_resumes(), [])  # type: ignore
+
+    async def test_migrate_resumes(self):
+        """Test the migration moves the embedded resumes to the resumes collection"""
+        user = User(first_name="John", last_name="Doe", email="johndoe@foo.bar", password="password1")
+        await user.save()
+        resumes = [self.make_resume(f"summary {i}") for i in range(5)]
+        await user.add_resumes(resumes)
+        await migrate_user(user.id, batch_size=2)
+        user_from_db = await self.testDB.users.find_one({"_id": user.id})
+        self.assertEqual(user_from_db["resumes"], [])  # type: ignore
+        self.assertEqual(await self.testDB.resumes.count_documents({"user_id": user.id}), 5)
+        User.resume_storage = 'collection'
+        profile = await User.find_profile({"_id": user.id})
+        loaded = await profile.load_resumes()  # type: ignore
+        self.assertEqual(sorted(item.id for item in loaded), sorted(item.id for item in resumes))
+
+    async def test_migrate_ids(self):
+        """Test the migration converts the string ids to binary UUIDs, and the string ids still
+        find the documents"""
+        user = User(first_name="John", last_name="Doe", email="johndoe@foo.bar", password="password1")
+        await user.save()
+        resumes = [self.make_resume(f"summary {i}") for i in range(3)]
+        await user.add_resumes(resumes)
+        await self.testDB.resumes.insert_one({**resumes[0].to_dict(), "_id": str(uuid.uuid4()), "user_id": user.id})
+        self.assertEqual(await migrate(batch_size=2), {"users": 1, "resumes": 1})
+        self.assertEqual(await migrate(batch_size=2), {"users": 0, "resumes": 0})
+        stored = await self.testDB.users.find_one({"_id": uuid.UUID(user.id)})
+        self.assertIsInstance(stored["resumes"][0]["_id"], uuid.UUID)  # type: ignore
+        self.assertEqual(await self.testDB.resumes.count_documents({"user_id": uuid.UUID(user.id)}), 1)
+        with patch('models.base.ID_STORAGE', 'binary'):
+            profile = await User.get_profile(user.id)
+            self.assertEqual(profile.id, user.id)  # type: ignore
+            self.assertEqual((await profile.get_resume(resumes[1].id)).id, resumes[1].id)  # type: ignore
+            self.assertTrue(await profile.edit_resume(resumes[1].id, {"templateId": "modern"}))  # type: ignore
+            page, _ = await profile.list_resumes(2)  # type: ignore
+            self.assertIsInstance(page[0]["_id"], str)
+            self.assertIsNone(await profile.get_resume("not-a-uuid"))  # type: ignore
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Test the Base model changes tracking"""
+import unittest
+from dataclasses import fields
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+from uuid import UUID
+
+from models.resume import Resume
+from models.user import User
+
+
+class TestBaseDirtyTracking(unittest.IsolatedAsyncioTestCase):
+    """Test the dirty fields tracking of the Base model"""
+
+    def setUp(self):
+        """Set up a user as it is loaded from the database"""
+        self.user = User(first_name="John", last_name="Doe", email="john@doe.com", password="password1")
+        self.user.mark_persisted()
+
+    def test_new_model_not_tracked(self):
+        """Test the changes of a model not yet stored are not tracked"""
+        user = User(first_name="John", last_name="Doe", email="john@doe.com", password="password1")
+        user.first_name = "Jane"
+        self.assertEqual(user.dirty_fields, set())
+
+    def test_tracks_changed_fields(self):
+        """Test only the changed fields are dirty"""
+        self.user.first_name = "Jane"
+        self.user.last_name = "Doe"  # unchanged
+        self.user.password = "password2"
+        self.user.resumes = []  # untracked
+        self.assertEqual(self.user.dirty_fields, {"first_name", "password"})
+
+    @patch('models.base.dbEngine')
+    async def test_save_changed_fields(self, mock_db_engine):
+        """Test save sets only the changed fields of an existing document"""
+        mock_db_engine.update = AsyncMock(return_value=True)
+        self.user.first_name = "Jane"
+        self.assertEqual(await self.user.save(), self.user.id)
+        mock_db_engine.update.assert_awaited_once_with("users", self.user.id, {"first_name": "Jane"}, None)
+        mock_db_engine.save.assert_not_called()
+        self.assertEqual(self.user.dirty_fields, set())
+
+    @patch('models.base.dbEngine')
+    async def test_save_serializes_changed_fields(self, mock_db_engine):
+        """Test save serializes only the changed fields, in their stored form"""
+        mock_db_engine.update = AsyncMock(return_value=True)
+        self.user.password = "password2"
+        with patch.object(User, 'to_dict', side_effect=AssertionError("the whole user is serialized")):
+            self.assertEqual(await self.user.save(), self.user.id)
+        changes = mock_db_engine.update.await_args.args[2]
+        self.assertEqual(list(changes), ["password"])
+        self.assertTrue(self.user.check_password("password2"))
+        self.assertEqual(changes["password"], self.user.to_dict()["password"])
+        self.assertEqual(self.user.dirty_fields, set())
+
+    @patch('models.base.dbEngine')
+    async def test_save_no_changes(self, mock_db_engine):
+        """Test save skips the database round trip when nothing changed"""
+        mock_db_engine.update = AsyncMock()
+        self.assertEqual(await self.user.save(), self.user.id)
+        mock_db_engine.update.assert_not_awaited()
+
+    @patch('models.base.dbEngine')
+    async def test_save_new_document(self, mock_db_engine):
+        """Test save inserts a new document and starts tracking its changes"""
+        user = User(first_name="John", last_name="Doe", email="john@doe.com", password="password1")
+        mock_db_engine.save = AsyncMock(return_value=user.id)
+        self.assertEqual(await user.save(), user.id)
+        mock_db_engine.save.assert_awaited_once_with("users", user.to_dict(), "durable")
+        user.is_active = True
+        self.assertEqual(user.dirty_fields, {"is_active"})
+
+    @patch('models.base.dbEngine')
+    async def test_save_failed_keeps_changes(self, mock_db_engine):
+        """Test the changes are kept dirty when the update failed"""
+        mock_db_engine.update = AsyncMock(return_value=False)
+        self.user.email = "jane@doe.com"
+        self.assertIsNone(await self.user.save())
+        self.assertEqual(self.user.dirty_fields, {"email"})
+
+    def test_listing_policy(self):
+        """Test the resumes listings are read from the primary, they follow the owner's writes"""
+        self.assertIsNone(User._policy('list_resumes'))
+
+    def test_stored_id(self):
+        """Test the ids are converted to the configured storage form"""
+        self.assertEqual(User.stored_id(self.user._id), self.user.id)
+        with patch('models.base.ID_STORAGE', 'binary'):
+            self.assertEqual(User.stored_id(self.user.id), UUID(self.user.id))
+            self.assertEqual(User.stored_id("not-a-uuid"), "not-a-uuid")
+            self.assertEqual(self.user.to_dict()["_id"], UUID(self.user.id))
+            # the setting is shared by all the models
+            self.assertEqual(Resume.stored_id(self.user.id), UUID(self.user.id))
+
+    def test_slotted_fields(self):
+        """Test the models have no attributes dict, and the timestamps are formatted when assigned"""
+        self.assertFalse(hasattr(self.user, "__dict__"))
+        self.assertFalse({"_persisted", "_dirty"} & {item.name for item in fields(User)})
+        self.user.updated_at = datetime(2024, 1, 2, 3, 4, 5)
+        self.assertEqual(self.user.updated_at, "2024-01-02T03:04:05")
+        self.user.updated_at = "2024-01-02T03:04:05"
+        self.assertEqual(self.user.dirty_fields, {"updated_at"})
+        self.user.id = "00000000-0000-0000-0000-000000000001"
+        self.assertEqual(self.user._id, UUID(int=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Test the resumes fields compression"""
+import unittest
+from unittest.mock import patch
+
+from bson import BSON, Binary
+
+from models import json_patch
+from models.compression import SUBTYPE, pack, unpack
+from models.resume import Resume
+
+
+class TestCompression(unittest.TestCase):
+    """Test the pack and unpack functions"""
+
+    def setUp(self):
+        self.long_text = "Led the search infrastructure team. " * 40
+        self.data = {
+            "summary": self.long_text,
+            "title": {"name": "John Doe", "jobTitle": "Engineer", "links": []},
+            "experiences": [{"companyName": "Google", "summary": self.long_text}, {"summary": "short"}],
+            "skills": [self.long_text],
+        }
+
+    def test_round_trip(self):
+        """Test only the long free text fields are compressed, and expanded back"""
+        packed = pack(self.data, codec='zlib')
+        self.assertIsInstance(packed["summary"], Binary)
+        self.assertEqual(packed["summary"].subtype, SUBTYPE)
+        self.assertIsInstance(packed["experiences"][0]["summary"], Binary)
+        self.assertEqual(packed["experiences"][1]["summary"], "short")
+        self.assertEqual(packed["skills"], [self.long_text])
+        self.assertLess(len(BSON.encode(packed)), len(BSON.encode(self.data)) // 2)
+        self.assertEqual(unpack(BSON.decode(BSON.encode(packed))), self.data)
+
+    def test_disabled(self):
+        """Test nothing is compressed without a codec, and the plain fields are read as is"""
+        self.assertIs(pack(self.data, codec=''), self.data)
+        self.assertEqual(unpack(self.data), self.data)
+
+    def test_deterministic(self):
+        """Test the same text is compressed the same, so the patch `test` operations match"""
+        self.assertEqual(pack(self.long_text, "summary", codec='zlib'), pack(self.long_text, "summary", codec='zlib'))
+
+    def test_resume_document(self):
+        """Test the stored resume document is read back by `Resume.from_dict`"""
+        resume = Resume(templateId="classic", data=Resume._data_from_dict({
+            "title": {"name": "John Doe", "jobTitle": "Engineer", "links": []}, "summary": self.long_text,
+            "projects": [], "experiences": [], "education": [], "skills": [], "languages": []}))
+        document = resume.to_dict()
+        document["data"] = pack(document["data"], codec='zlib')
+        self.assertEqual(Resume.from_dict(document).to_dict(), resume.to_dict())
+
+    def test_patch_values(self):
+        """Test the patch values are stored like the resume documents"""
+        with patch('models.compression.CODEC', 'zlib'):
+            steps = json_patch.translate([{"op": "test", "path": "/data/summary", "value": self.long_text},
+                                          {"op": "replace", "path": "/data/summary", "value": "short"}])
+        # the test matches the resumes stored with the compression on or off
+        forms = steps[0].conditions["data.summary"]["$in"]
+        self.assertEqual(forms[:2], [self.long_text, pack(self.long_text, "summary", codec='zlib')])
+        self.assertTrue(all(unpack(form) == self.long_text for form in forms))
+        self.assertEqual(steps[0].update["$set"]["data.summary"], "short")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Test the translation of the JSON Patch operations into MongoDB updates"""
+import unittest
+
+from models.json_patch import JSONPatchError, translate
+
+
+class TestTranslate(unittest.TestCase):
+    """Test the translate function"""
+
+    def test_replace_array_element_member(self):
+        """Test replacing one member of one array element sets only its path"""
+        steps = translate([{'op': 'replace', 'path': '/data/experiences/1/summary', 'value': 'Led the team'}])
+        self.assertEqual(len(steps), 1)
+        self.assertEqual(steps[0].update, {'$set': {'data.experiences.1.summary': 'Led the team'}})
+        self.assertEqual(steps[0].conditions, {'data.experiences.1.summary': {'$exists': True}})
+
+    def test_add_array_element(self):
+        """Test adding to an array pushes at the index, or appends for `-`"""
+        steps = translate([
+            {'op': 'add', 'path': '/data/skills/-', 'value': 'Go'},
+            {'op': 'add', 'path': '/data/projects/0', 'value': {'title': 'Resumai', 'description': 'AI resumes'}},
+        ])
+        self.assertEqual(steps[0].update, {'$push': {
+            'data.skills': {'$each': ['Go']},
+            'data.projects': {'$each': [{'title': 'Resumai', 'description': 'AI resumes'}], '$position': 0},
+        }})
+
+    def test_remove_array_element(self):
+        """Test removing an array element sets it to a marker then pulls the marker out"""
+        steps = translate([{'op': 'remove', 'path': '/data/skills/2'}])
+        marker = steps[0].update['$set']['data.skills.2']
+        self.assertTrue(marker.startswith('removed:'))
+        self.assertEqual(steps[1].update, {'$pull': {'data.skills': marker}})
+        self.assertNotEqual(translate([{'op': 'remove', 'path': '/data/skills/2'}])[1].update, steps[1].update)
+
+    def test_remove_member(self):
+        """Test removing an optional member stores null, the required members can't be removed
+        or replaced with null"""
+        steps = translate([{'op': 'remove', 'path': '/data/achievements'}])
+        self.assertEqual(steps[0].update, {'$set': {'data.achievements': None}})
+        self.assertEqual(steps[0].conditions, {'data.achievements': {'$exists': True}})
+        for field in ('title', 'summary', 'projects', 'experiences', 'education', 'skills', 'languages'):
+            for operation in ({'op': 'remove', 'path': f'/data/{field}'},
+                              {'op': 'replace', 'path': f'/data/{field}', 'value': None},
+                              {'op': 'add', 'path': f'/data/{field}', 'value': None}):
+                with self.assertRaises(JSONPatchError, msg=operation):
+                    translate([operation])
+        for path in ('/data', '/templateId', '/data/title/name', '/data/experiences/0/roleTitle'):
+            with self.assertRaises(JSONPatchError, msg=path):
+                translate([{'op': 'remove', 'path': path}])
+
+    def test_add_to_nullable_array(self):
+        """Test the nullable arrays are set to an empty array if null before the first push"""
+        steps = translate([
+            {'op': 'test', 'path': '/templateId', 'value': 'classic'},
+            {'op': 'add', 'path': '/data/achievements/-', 'value': {'title': 'Award', 'description': 'Best paper'}},
+            {'op': 'add', 'path': '/data/achievements/-', 'value': {'title': 'Prize', 'description': 'First place'}},
+        ])
+        self.assertEqual([(step.conditions, step.update, step.optional) for step in steps[:1]], [(
+            {'templateId': 'classic', 'data.achievements': None}, {'$set': {'data.achievements': []}}, True)])
+        # the array is initialised once
+        self.assertEqual([step.optional for step in steps], [True, False, False])
+        self.assertEqual(len(translate([{'op': 'add', 'path': '/data/skills/-', 'value': 'Go'}])), 1)
+
+    def test_conflicting_paths_split(self):
+        """Test the operations on related paths are applied in separate steps"""
+        steps = translate([
+            {'op': 'add', 'path': '/data/skills/0', 'value': 'Go'},
+            {'op': 'replace', 'path': '/data/skills/1', 'value': 'Python'},
+            {'op': 'replace', 'path': '/templateId', 'value': 'modern'},
+        ])
+        self.assertEqual(len(steps), 2)
+        self.assertEqual(steps[1].update, {'$set': {'data.skills.1': 'Python', 'templateId': 'modern'}})
+
+    def test_test_operation(self):
+        """Test the test operations become conditions of the following updates"""
+        steps = translate([
+            {'op': 'test', 'path': '/data/summary', 'value': 'old'},
+            {'op': 'replace', 'path': '/data/summary', 'value': 'new'},
+        ])
+        self.assertEqual(len(steps), 1)
+        self.assertEqual(steps[0].conditions, {'data.summary': 'old'})
+        self.assertEqual(steps[0].update, {'$set': {'data.summary': 'new'}})
+
+    def test_values_stored_format(self):
+        """Test the values are validated and converted like the stored resumes"""
+        steps = translate([{'op': 'replace', 'path': '/data/experiences/0/startingDate', 'value': '2023-03-01'}])
+        self.assertEqual(steps[0].update, {'$set': {'data.experiences.0.startingDate': '2023-03-01'}})
+
+    def test_invalid_operations(self):
+        """Test the invalid and unsupported operations are rejected"""
+        for operation in (
+            {'op': 'move', 'path': '/data/skills/0', 'from': '/data/skills/1'},
+            {'op': 'add', 'path': '/data/unknown', 'value': 1},
+            {'op': 'add', 'path': '/data/$where', 'value': 1},
+            {'op': 'replace', 'path': '/data/skills/0', 'value': 3},
+            {'op': 'replace', 'path': '/data/skills/0'},
+            {'op': 'remove', 'path': '/data/skills/-'},
+            {'op': 'add', 'path': 'data/skills/-', 'value': 'Go'},
+        ):
+            with self.assertRaises(JSONPatchError, msg=operation):
+                translate([operation])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Test the resumes built from the validated requests"""
+import unittest
+
+from app.v1.schema.resume_schemas import ResumeCreate, ResumeUpdate
+from models.resume import Resume
+from models.serializer import serialize
+
+
+class TestResumeFromRequest(unittest.TestCase):
+    """Test the Resume create and update requests paths"""
+
+    def setUp(self):
+        self.fields = {
+            "title": {"name": "John Doe", "jobTitle": "Engineer", "links": [{"type": "GitHub", "linkUrl": "gh"}]},
+            "summary": "summary",
+            "projects": [{"title": "Search", "description": "A search engine"}],
+            "experiences": [{"companyName": "Google", "roleTitle": "SWE", "location": "Cairo", "summary": "led",
+                             "startingDate": "2020-01-02T00:00:00"}],
+            "education": [{"schoolName": "MIT", "degreeTitle": "BSc", "location": "Cambridge",
+                           "startingDate": "2012-09-01T00:00:00"}],
+            "skills": ["Python"],
+            "languages": [{"name": "Arabic", "proficient": "native"}],
+        }
+
+    def test_from_request(self):
+        """Test the created resume reuses the validated sections, and is stored like the rebuilt one"""
+        request = ResumeCreate.model_validate({"templateId": "classic", **self.fields})
+        resume = Resume.from_request(request)
+        self.assertIs(resume.data.experiences[0], request.experiences[0])
+        rebuilt = Resume(templateId="classic", data=Resume._data_from_dict(
+            {key: value for key, value in request.model_dump().items() if key != "templateId"}))
+        expected = {**rebuilt.to_dict(), "_id": resume.id, "created_at": resume.created_at,
+                    "updated_at": resume.updated_at}
+        self.assertEqual(resume.to_dict(), expected)
+
+    def test_updates_from_request(self):
+        """Test only the set data fields are updated, in their stored form"""
+        request = ResumeUpdate.model_validate({"templateId": "modern", "data": {
+            "summary": "edited", "experiences": self.fields["experiences"]}})
+        self.assertEqual(Resume.updates_from_request(request), {
+            "templateId": "modern",
+            "data": {"summary": "edited", "experiences": [{
+                "companyName": "Google", "roleTitle": "SWE", "location": "Cairo", "summary": "led",
+                "startingDate": "2020-01-02", "endingDate": "present"}]},
+        })
+        self.assertEqual(Resume.updates_from_request(ResumeUpdate()), {})
+        # the updated data is stored like the serialized resume data
+        request = ResumeUpdate.model_validate({"data": self.fields})
+        self.assertEqual(Resume.updates_from_request(request)["data"], {
+            key: serialize(value) for key, value in dict(request.data).items() if value is not None})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Test the resume data serializer"""
+import unittest
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+
+from bson import Binary
+
+from models.compression import pack
+from models.resume import LanguageProficiencyLevel, Resume
+from models.serializer import serialize
+
+
+class TestSerializer(unittest.TestCase):
+    """Test the serialize function"""
+
+    def setUp(self):
+        self.data = Resume._data_from_dict({
+            "title": {"name": "John Doe", "jobTitle": "Engineer", "links": [{"type": "GitHub", "linkUrl": "gh"}]},
+            "summary": "Led the search infrastructure team. " * 40,
+            "projects": [{"title": "Search", "description": "A search engine"}],
+            "experiences": [{"companyName": "Google", "roleTitle": "SWE", "location": "Cairo", "summary": None,
+                             "startingDate": datetime(2020, 1, 2), "endingDate": "present"}],
+            "education": [], "skills": ["Python"], "languages": [{"name": "Arabic", "proficient": "native"}],
+        })
+
+    def test_resume_data(self):
+        """Test the resume data is converted to its stored document"""
+        document = serialize(self.data)
+        self.assertEqual(document["title"], {"name": "John Doe", "jobTitle": "Engineer",
+                                             "links": [{"type": "GitHub", "linkUrl": "gh"}]})
+        self.assertEqual(document["experiences"][0]["startingDate"], "2020-01-02")
+        self.assertEqual(document["experiences"][0]["summary"], None)
+        self.assertEqual(document["achievements"], None)
+        self.assertEqual(list(document), ["title", "summary", "projects", "experiences", "education",
+                                          "achievements", "certificates", "skills", "languages"])
+
+    def test_converted_values(self):
+        """Test the enums, the UUIDs and the nested dicts values"""
+        value = {"level": LanguageProficiencyLevel.NATIVE, "id": UUID(int=1), "items": [{"at": datetime(2024, 1, 1)}]}
+        self.assertEqual(serialize(value), {"level": "native", "id": "00000000-0000-0000-0000-000000000001",
+                                            "items": [{"at": "2024-01-01"}]})
+
+    def test_unknown_type(self):
+        """Test a value with no stored form raises TypeError, instead of being stored as null"""
+        with self.assertRaises(TypeError):
+            serialize({"value": object()})
+
+    def test_compressed(self):
+        """Test the long free text fields are compressed in the same pass, like `pack` does"""
+        document = serialize(self.data, "zlib")
+        self.assertIsInstance(document["summary"], Binary)
+        self.assertEqual(document, pack(serialize(self.data), codec="zlib"))
+
+    def test_dataclass(self):
+        """Test a plain dataclass is converted in its fields order"""
+        @dataclass
+        class Period:
+            start: datetime
+            end: str = "present"
+        self.assertEqual(serialize([Period(datetime(2024, 5, 6))]), [{"start": "2024-05-06", "end": "present"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Test the users profiles cache"""
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from models.user_cache import UserCache
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+    """Test the UserCache class"""
+
+    def setUp(self):
+        self.cache = UserCache(maxsize=10, ttl=60, channel='')
+        self.loads = 0
+
+    async def load(self, delay: float = 0.01) -> dict:
+        """Load a user document slowly"""
+        self.loads += 1
+        await asyncio.sleep(delay)
+        return {'_id': '1', 'first_name': f'John {self.loads}'}
+
+    async def test_single_flight(self):
+        """Test the concurrent loads of the same user share one read"""
+        documents = await asyncio.gather(*(self.cache.get('1', self.load) for _ in range(10)))
+        self.assertEqual(self.loads, 1)
+        self.assertTrue(all(document is documents[0] for document in documents))
+        await self.cache.get('1', self.load)
+        self.assertEqual(self.loads, 1)
+
+    async def test_invalidate(self):
+        """Test the written users are loaded again"""
+        await self.cache.get('1', self.load)
+        await self.cache.invalidate('1')
+        document = await self.cache.get('1', self.load)
+        self.assertEqual(document['first_name'], 'John 2')
+
+    async def test_invalidate_during_load(self):
+        """Test a document loaded before an invalidation is not cached"""
+        loading = asyncio.ensure_future(self.cache.get('1', self.load))
+        await asyncio.sleep(0)
+        await self.cache.invalidate('1')
+        await loading
+        await self.cache.get('1', self.load)
+        self.assertEqual(self.loads, 2)
+
+    async def test_missing_and_failed_loads(self):
+        """Test the missing users and the failed loads are not cached"""
+        self.assertIsNone(await self.cache.get('2', AsyncMock(return_value=None)))
+        with self.assertRaises(RuntimeError):
+            await self.cache.get('2', AsyncMock(side_effect=RuntimeError()))
+        self.assertEqual(await self.cache.get('2', AsyncMock(return_value={'_id': '2'})), {'_id': '2'})
+
+    async def test_disabled(self):
+        """Test every get loads the user when the ttl is 0"""
+        cache = UserCache(ttl=0, channel='')
+        await cache.get('1', self.load)
+        await cache.get('1', self.load)
+        self.assertEqual(self.loads, 2)
+
+    async def test_publish_invalidation(self):
+        """Test the invalidations are published to the channel"""
+        cache = UserCache(ttl=60, channel='invalidations')
+        cache._db_engine = MagicMock()
+        cache._db_engine.db.__getitem__.return_value.insert_one = AsyncMock()
+        await cache.invalidate('1')
+        message = cache._db_engine.db.__getitem__.return_value.insert_one.call_args.args[0]
+        self.assertEqual(message['user_id'], '1')
+        await cache.invalidate('1', publish=False)
+        cache._db_engine.db.__getitem__.return_value.insert_one.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
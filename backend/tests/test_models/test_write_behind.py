@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Test the resumes write behind buffer"""
+import asyncio
+import os
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from models.write_behind import ResumeWriteBuffer
+
+
+class FakeUser:
+    """A user whose resume edits are recorded"""
+    def __init__(self, id: str = "user", result: bool = True):
+        self.id = id
+        self.edit_resume = AsyncMock(return_value=result)
+
+
+class TestResumeWriteBuffer(unittest.IsolatedAsyncioTestCase):
+    """Test the ResumeWriteBuffer class"""
+
+    async def test_coalesce_updates(self):
+        """Test the updates staged during the window are merged into one write"""
+        buffer = ResumeWriteBuffer(delay=0.05)
+        user = FakeUser()
+        self.assertTrue(await buffer.stage(user, "1", {"data": {"summary": "a"}, "updated_at": "t1"}))
+        for i in range(10):
+            self.assertTrue(await buffer.stage(user, "1", {"data": {"skills": [str(i)]}, "updated_at": f"t{i + 2}"}))
+        self.assertTrue(await buffer.stage(user, "1", {"data": {"summary": "b"}, "templateId": "classic"}))
+        self.assertEqual(user.edit_resume.await_count, 1)
+        await asyncio.sleep(0.1)
+        self.assertEqual(user.edit_resume.await_count, 2)
+        user.edit_resume.assert_awaited_with(
+            "1", {"data": {"skills": ["9"], "summary": "b"}, "updated_at": "t11", "templateId": "classic"})
+
+    async def test_missing_resume(self):
+        """Test the first update of a missing resume is reported"""
+        buffer = ResumeWriteBuffer(delay=0.05)
+        user = FakeUser(result=False)
+        self.assertFalse(await buffer.stage(user, "1", {"data": {"summary": "a"}}))
+        self.assertFalse(await buffer.stage(user, "1", {"data": {"summary": "a"}}))
+        self.assertEqual(user.edit_resume.await_count, 2)
+
+    async def test_flush_user(self):
+        """Test the user's pending updates are written before reading them"""
+        buffer = ResumeWriteBuffer(delay=10)
+        user, other = FakeUser(), FakeUser("other")
+        await buffer.stage(user, "1", {"data": {"summary": "a"}})
+        await buffer.stage(user, "1", {"data": {"summary": "b"}})
+        await buffer.stage(other, "2", {"data": {"summary": "a"}})
+        await buffer.stage(other, "2", {"data": {"summary": "b"}})
+        await buffer.flush_user("user")
+        user.edit_resume.assert_awaited_with("1", {"data": {"summary": "b"}})
+        self.assertEqual(other.edit_resume.await_count, 1)
+        await buffer.close()
+        other.edit_resume.assert_awaited_with("2", {"data": {"summary": "b"}})
+        # nothing is pending, the next update is written through again
+        await buffer.stage(user, "1", {"data": {"summary": "c"}})
+        self.assertEqual(user.edit_resume.await_count, 3)
+        await buffer.close()
+
+    async def test_write_through(self):
+        """Test every update is written when the window is 0"""
+        buffer = ResumeWriteBuffer(delay=0)
+        user = FakeUser()
+        for _ in range(3):
+            await buffer.stage(user, "1", {"data": {"summary": "a"}})
+        self.assertEqual(user.edit_resume.await_count, 3)
+
+    async def test_several_workers(self):
+        """Test the updates are written through when the application runs several workers"""
+        buffer = ResumeWriteBuffer(delay=10, workers=2)
+        user = FakeUser()
+        for _ in range(2):
+            await buffer.stage(user, "1", {"data": {"summary": "a"}})
+        self.assertEqual(user.edit_resume.await_count, 2)
+        with patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            self.assertEqual(ResumeWriteBuffer(delay=10).delay, 0)
+        self.assertEqual(ResumeWriteBuffer(delay=10, workers=1).delay, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
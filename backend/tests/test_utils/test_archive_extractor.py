@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+import unittest
+import zipfile
+from utils.archive_extractor import ArchiveExtractionError, extract_resume, list_resumes
+
+
+class TestArchiveExtractor(unittest.TestCase):
+    """Test the resumes archive extractor utility"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "resumes.zip")
+        with zipfile.ZipFile(self.path, "w") as archive:
+            archive.writestr("resumes/john.json", json.dumps({"summary": "A software engineer"}))
+            archive.writestr("resumes/list.json", json.dumps([1, 2]))
+            archive.writestr("resumes/broken.pdf", b"not a pdf")
+            archive.writestr("__MACOSX/resumes/._john.json", b"")
+            archive.writestr("notes.txt", b"notes")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_list_resumes(self):
+        self.assertEqual(list_resumes(self.path), ["resumes/john.json", "resumes/list.json", "resumes/broken.pdf"])
+        with self.assertRaises(ArchiveExtractionError):
+            list_resumes(self.path, max_files=2)
+
+    def test_list_resumes_invalid_archive(self):
+        with open(self.path, "wb") as file:
+            file.write(b"not a zip")
+        with self.assertRaises(ArchiveExtractionError):
+            list_resumes(self.path)
+
+    def test_extract_resume(self):
+        self.assertEqual(extract_resume(self.path, "resumes/john.json"), {"summary": "A software engineer"})
+        with self.assertRaises(ArchiveExtractionError):
+            extract_resume(self.path, "resumes/list.json")
+        with self.assertRaises(ArchiveExtractionError):
+            extract_resume(self.path, "resumes/broken.pdf")
+        with self.assertRaises(ArchiveExtractionError):
+            extract_resume(self.path, "resumes/john.json", max_bytes=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
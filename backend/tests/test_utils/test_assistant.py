@@ -2,7 +2,9 @@ import json
 import unittest
 from unittest.mock import AsyncMock, patch, MagicMock
 from utils.assistant import Assistant
+from utils.usage_ledger import UsageLedger
 from google.generativeai import GenerativeModel
+from app.v1.schema.resume_schemas import ResumeData
 
 
 class TestAssistant(unittest.IsolatedAsyncioTestCase):
@@ -105,6 +107,71 @@ class TestAssistant(unittest.IsolatedAsyncioTestCase):
 
         self.assertIsInstance(result, dict)
 
+    @patch('utils.assistant.genai.GenerativeModel')
+    async def test_generate_artifacts(self, mock_generative_model):
+        """Test generate_artifacts streams the artifacts in order and caches each of them."""
+        chunks = ['{"cover_letter": "Dear hiring', ' manager", "interview_qu',
+                  'estions": ["Why us?"], "enhanced_resume": {"resume_data": {}, ',
+                  '"scores": {"acceptance_percentage": 90, "insights": []}}}']
+
+        async def stream():
+            for chunk in chunks:
+                yield MagicMock(text=chunk)
+
+        mock_chat = MagicMock()
+        mock_chat.send_message_async = AsyncMock(return_value=stream())
+        mock_model = MagicMock()
+        mock_model.start_chat.return_value = mock_chat
+        mock_generative_model.return_value = mock_model
+        self.assistant = Assistant()
+        resume_data = ResumeData(summary="A software engineer")
+
+        result = [item async for item in self.assistant.generate_artifacts(resume_data, "Job description")]
+
+        self.assertEqual([name for name, _ in result], ['enhanced_resume', 'cover_letter', 'interview_questions'])
+        self.assertEqual(result[1][1], "Dear hiring manager")
+        self.assertEqual(result[2][1], ["Why us?"])
+        mock_chat.send_message_async.assert_called_once()
+
+        # the single artifact requests are served from the cache
+        enhanced = await self.assistant.enhance_resume(resume_data, "Job description")
+        self.assertEqual(enhanced['scores']['acceptance_percentage'], 90)
+        cover_letter = [item async for item in self.assistant.generate_artifacts(
+            resume_data, "Job description", ['cover_letter'])]
+        self.assertEqual(cover_letter, [('cover_letter', "Dear hiring manager")])
+        mock_chat.send_message_async.assert_called_once()
+
+    @patch('utils.assistant.genai.GenerativeModel')
+    async def test_generate_artifacts_usage(self, mock_generative_model):
+        """Test the bundle call usage is recorded, it's carried by the chunk after the json object."""
+        async def stream():
+            yield MagicMock(text='{"cover_letter": "Dear hiring manager"}')
+            yield MagicMock(text='', usage_metadata=MagicMock(prompt_token_count=10, candidates_token_count=5))
+
+        mock_chat = MagicMock()
+        mock_chat.send_message_async = AsyncMock(side_effect=lambda *args, **kwargs: stream())
+        mock_generative_model.return_value.start_chat.return_value = mock_chat
+        ledger = UsageLedger()
+        assistant = Assistant(usage_ledger=ledger)
+
+        result = [item async for item in assistant.generate_artifacts(
+            ResumeData(summary="A software engineer"), "Job description", ['cover_letter'], user_id='1')]
+        self.assertEqual(result, [('cover_letter', "Dear hiring manager")])
+        self.assertEqual(ledger.usage('1')['calls'], 1)
+        self.assertEqual(ledger.usage('1')['total_tokens'], 15)
+
+        # the usage is recorded when the consumer leaves the stream early too
+        artifacts = assistant.generate_artifacts(ResumeData(summary="Another"), "", ['cover_letter'], user_id='2')
+        await anext(artifacts)
+        await artifacts.aclose()
+        self.assertEqual(ledger.usage('2')['calls'], 1)
+
+    async def test_generate_artifacts_unknown(self):
+        """Test generate_artifacts rejects the unknown artifacts."""
+        with self.assertRaises(ValueError):
+            async for _ in self.assistant.generate_artifacts(ResumeData(), "", ['poem']):
+                pass
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,42 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from utils.cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    """Test the TTLCache utility"""
+
+    def test_get_set(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertIn("a", cache)
+
+    def test_lru_eviction(self):
+        on_evict = MagicMock()
+        cache = TTLCache(maxsize=2, ttl=10, on_evict=on_evict)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertNotIn("b", cache)
+        self.assertEqual(len(cache), 2)
+        on_evict.assert_called_once_with("b", 2)
+
+    @patch('utils.cache.monotonic')
+    def test_expiry(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        cache = TTLCache(ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=30)
+        mock_monotonic.return_value = 111.0
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+        mock_monotonic.return_value = 200.0
+        self.assertEqual(cache.purge(), 1)
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
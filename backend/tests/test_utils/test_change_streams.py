@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Test the change streams consumer against the local change streams stand-in"""
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+
+from pymongo.errors import OperationFailure
+
+from utils.change_streams import ChangeStreamConsumer, LocalChangeSource, LocalTokenStore
+
+
+class TestChangeStreamConsumer(unittest.IsolatedAsyncioTestCase):
+    """Test the ChangeStreamConsumer class"""
+
+    def setUp(self):
+        self.source = LocalChangeSource()
+        self.tokens = LocalTokenStore()
+        self.events = []
+        self.consumer = self.make_consumer()
+
+    def make_consumer(self) -> ChangeStreamConsumer:
+        consumer = ChangeStreamConsumer(self.source, self.tokens, enabled=True, name='test', token_interval=0)
+        consumer.register('users', self.events.append)
+        return consumer
+
+    async def asyncTearDown(self):
+        await self.consumer.stop()
+
+    async def settle(self):
+        """Let the consumer tasks handle the emitted events"""
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    async def test_dispatch(self):
+        """Test the events are handled by the handlers of their collection and operation"""
+        deleted = []
+        self.consumer.register('users', deleted.append, operations=('delete',))
+        self.consumer.start()
+        await self.settle()
+        self.source.emit('users', 'update', '1', update_description={'updatedFields': {'first_name': 'John'}})
+        self.source.emit('users', 'delete', '2')
+        self.source.emit('resumes', 'insert', '3', full_document={'_id': '3'})
+        await self.settle()
+        self.assertEqual([event['documentKey']['_id'] for event in self.events], ['1', '2'])
+        self.assertEqual([event['documentKey']['_id'] for event in deleted], ['2'])
+
+    async def test_failed_handler(self):
+        """Test a failed handler doesn't stop the other handlers nor the stream"""
+        self.consumer._handlers['users'].insert(0, (MagicMock(side_effect=RuntimeError()), None))
+        self.consumer.start()
+        await self.settle()
+        self.source.emit('users', 'update', '1')
+        self.source.emit('users', 'update', '2')
+        await self.settle()
+        self.assertEqual(len(self.events), 2)
+
+    async def test_resume_after_restart(self):
+        """Test a restarted consumer handles the events emitted while it was stopped"""
+        self.consumer.start()
+        await self.settle()
+        self.source.emit('users', 'update', '1')
+        await self.settle()
+        await self.consumer.stop()
+        self.assertEqual(self.tokens.tokens['test:users'], self.events[-1]['_id'])
+        self.source.emit('users', 'update', '2')
+        self.consumer = self.make_consumer()
+        self.consumer.start()
+        await self.settle()
+        self.assertEqual([event['documentKey']['_id'] for event in self.events], ['1', '2'])
+
+    async def test_history_lost(self):
+        """Test a lost stream history resets the handlers state and continues from now"""
+        source = MagicMock(wraps=self.source)
+        source.watch.side_effect = [OperationFailure('history lost', code=286), self.source.watch('users')]
+        self.consumer.source = source
+        self.tokens.tokens['test:users'] = {'_data': 'expired'}
+        reset = MagicMock()
+        self.consumer.on_reset(reset)
+        self.consumer.start()
+        await asyncio.sleep(1.1)
+        reset.assert_called_once()
+        self.assertIsNone(source.watch.call_args.kwargs['resume_after'])
+
+    async def test_disabled(self):
+        """Test a disabled consumer doesn't watch the collections"""
+        consumer = ChangeStreamConsumer(self.source, self.tokens, enabled=False)
+        consumer.register('users', self.events.append)
+        consumer.start()
+        self.source.emit('users', 'update', '1')
+        await self.settle()
+        self.assertEqual(self.events, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,141 +1,215 @@
 import os
+from unittest import TestCase
 from unittest.async_case import IsolatedAsyncioTestCase
-from unittest.mock import MagicMock
-from pymongo import MongoClient
+from unittest.mock import AsyncMock, MagicMock, patch
+from pymongo import DeleteOne, InsertOne, UpdateOne
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from utils.db_engine import DBEngine
+from utils.db_engine import DUPLICATE_KEY, DBEngine, _batches, available_compressors, sized_write
+from utils.memory_backend import MemoryClient
 
 
 class TestDBEngine(IsolatedAsyncioTestCase):
-    """Test the DBEngine class
+    """Test the DBEngine class, on the in-memory storage backend
     """
-    @classmethod
-    def setUpClass(cls):
-        """Set up the test class
+    def setUp(self):
+        """Set up an engine with its own empty storage
         """
-        cls.db_host = os.getenv('DB_HOST', 'localhost')
-        cls.db_port = int(os.getenv('DB_PORT', 27017))
-        cls.test_client = MongoClient(host=cls.db_host, port=cls.db_port)
-        cls.test_db = cls.test_client['test_db']
-
-    @classmethod
-    def tearDownClass(cls):
-        """Tear down the test class
-        """
-        cls.test_client.close()
-
-    def tearDown(self):
-        """Clean the database after each test
-        """
-        self.test_db.drop_collection('test')
+        self.dbEngine = DBEngine(backend='memory')
+        self.test_db = self.dbEngine.db
 
     def test_init(self):
         """Test the __init__ method
         """
-        dbEngine = DBEngine()
-        self.assertIsNotNone(dbEngine)
-        self.assertIsInstance(dbEngine.client, AsyncIOMotorClient)
-        self.assertIsInstance(dbEngine.db, AsyncIOMotorDatabase)
-        self.assertEqual(dbEngine.db.name, 'test_db')
-        self.assertEqual(dbEngine.client.HOST, self.db_host)
-        self.assertEqual(dbEngine.client.PORT, self.db_port)
-        dbEngine.client.close()
+        self.assertIsInstance(self.dbEngine.client, MemoryClient)
+        self.assertEqual(self.dbEngine.db.name, 'test_db')
 
     async def test_save(self):
         """Test the save method, normal case
         """
-        dbEngine = DBEngine()
         data = {"_id": "1", "name": "test"}
-        id = await dbEngine.save("test", data)
-        db_result = self.test_db['test'].find_one({"_id": id})
+        id = await self.dbEngine.save("test", data)
+        db_result = await self.test_db['test'].find_one({"_id": id})
         self.assertIsNotNone(db_result)
         self.assertEqual(db_result['name'], "test")  # type: ignore
-        dbEngine.client.close()
 
     async def test_save_exception(self):
         """Test the save method, exception case
         """
-        dbEngine = DBEngine()
-        dbEngine.db = MagicMock()
-        dbEngine.db.__getitem__.side_effect = Exception()
+        self.dbEngine.db = MagicMock()
+        self.dbEngine.db.__getitem__.side_effect = Exception()
         data = {"_id": "2", "name": "test"}
-        id = await dbEngine.save("test", data)
+        id = await self.dbEngine.save("test", data)
         self.assertIsNone(id)
-        db_result = self.test_db['test'].find_one({"_id": "2"})
+        db_result = await self.test_db['test'].find_one({"_id": "2"})
         self.assertIsNone(db_result)
-        dbEngine.client.close()
 
     async def test_delete(self):
         """Test the delete method, normal case
         """
-        dbEngine = DBEngine()
         data = {"_id": "3", "name": "test"}
-        self.test_db['test'].insert_one(data)
-        result = await dbEngine.delete("test", "3")
+        await self.test_db['test'].insert_one(data)
+        result = await self.dbEngine.delete("test", "3")
         self.assertTrue(result)
-        db_result = self.test_db['test'].find_one({"_id": "3"})
+        db_result = await self.test_db['test'].find_one({"_id": "3"})
         self.assertIsNone(db_result)
-        dbEngine.client.close()
 
     async def test_delete_exception(self):
         """Test the delete method, exception case
         """
-        dbEngine = DBEngine()
-        dbEngine.db = MagicMock()
-        dbEngine.db.__getitem__.side_effect = Exception()
-        result = await dbEngine.delete("test", "4")
+        self.dbEngine.db = MagicMock()
+        self.dbEngine.db.__getitem__.side_effect = Exception()
+        result = await self.dbEngine.delete("test", "4")
         self.assertFalse(result)
-        dbEngine.client.close()
 
     async def test_update(self):
         """Test the update method, normal case
         """
-        self.test_db['test'].insert_one({"_id": "5", "name": "test"})
-        dbEngine = DBEngine()
+        await self.test_db['test'].insert_one({"_id": "5", "name": "test"})
         data = {"name": "updated"}
-        result = await dbEngine.update("test", "5", data)
+        result = await self.dbEngine.update("test", "5", data)
         self.assertTrue(result)
-        db_result = self.test_db['test'].find_one({"_id": "5"})
+        db_result = await self.test_db['test'].find_one({"_id": "5"})
         self.assertEqual(db_result['name'], "updated")  # type: ignore
-        dbEngine.client.close()
+        # the found document is updated, even when it already holds the data
+        self.assertTrue(await self.dbEngine.update("test", "5", data))
+        self.assertFalse(await self.dbEngine.update("test", "unknown", data))
 
     async def test_update_exception(self):
         """Test the update method, exception case
         """
-        dbEngine = DBEngine()
-        dbEngine.db = MagicMock()
-        dbEngine.db.__getitem__.side_effect = Exception()
+        self.dbEngine.db = MagicMock()
+        self.dbEngine.db.__getitem__.side_effect = Exception()
         data = {"name": "updated"}
-        result = await dbEngine.update("test", "6", data)
+        result = await self.dbEngine.update("test", "6", data)
         self.assertFalse(result)
-        dbEngine.client.close()
 
     async def test_find_one(self):
         """Test the find_one method, normal case
         """
-        self.test_db['test'].insert_one({"_id": "7", "name": "test"})
-        dbEngine = DBEngine()
+        await self.test_db['test'].insert_one({"_id": "7", "name": "test"})
         query = {"_id": "7"}
-        result = await dbEngine.find_one("test", query)
+        result = await self.dbEngine.find_one("test", query)
         self.assertEqual(result['name'], "test")  # type: ignore
-        dbEngine.client.close()
 
     async def test_find_one_exception(self):
         """Test the find_one method, exception case
         """
-        dbEngine = DBEngine()
-        dbEngine.db = MagicMock()
-        dbEngine.db.__getitem__.side_effect = Exception()
+        self.dbEngine.db = MagicMock()
+        self.dbEngine.db.__getitem__.side_effect = Exception()
         query = {"_id": "8"}
-        result = await dbEngine.find_one("test", query)
+        result = await self.dbEngine.find_one("test", query)
         self.assertIsNone(result)
-        dbEngine.client.close()
 
     async def test_find_one_not_found(self):
         """Test the find_one method, not found case
         """
-        dbEngine = DBEngine()
         query = {"_id": "9"}
-        result = await dbEngine.find_one("test", query)
+        result = await self.dbEngine.find_one("test", query)
         self.assertIsNone(result)
-        dbEngine.client.close()
+
+    async def test_connect(self):
+        """Test the connect method, warms up the connections
+        """
+        self.assertTrue(await self.dbEngine.connect(warmup=3))
+        self.assertTrue(await self.dbEngine.ping())
+        await self.test_db['test'].insert_one({"_id": "10"})
+        self.dbEngine.close()
+        # a closed engine reconnects, the stored data is kept like on a server
+        self.assertTrue(await self.dbEngine.connect())
+        self.assertIsNotNone(await self.dbEngine.find_one("test", {"_id": "10"}))
+        self.dbEngine.close()
+
+    async def test_connect_unreachable(self):
+        """Test the connect method, unreachable database case
+        """
+        self.dbEngine.client = MagicMock()
+        self.dbEngine.client.admin.command = AsyncMock(side_effect=Exception())
+        self.assertFalse(await self.dbEngine.connect())
+        self.assertFalse(await self.dbEngine.ping())
+
+    async def test_bulk_write(self):
+        """Test the bulk_write method, the operations are batched and the errors reported per operation
+        """
+        operations = [sized_write(InsertOne, {"_id": str(i)}) for i in range(10)] + [sized_write(InsertOne, {"_id": "3"})]
+        operations += [sized_write(UpdateOne, {"_id": "4"}, {"$set": {"value": 4}}), sized_write(DeleteOne, {"_id": "5"})]
+        result = await self.dbEngine.bulk_write("test", operations, batch_size=4)
+        self.assertEqual(result.batches, 4)
+        self.assertEqual(result.inserted, 10)
+        self.assertEqual((result.modified, result.deleted), (1, 1))
+        self.assertEqual(result.failed, {10})
+        self.assertEqual(result.errors[0]['code'], DUPLICATE_KEY)
+        self.assertEqual(await self.test_db['test'].count_documents({}), 9)
+
+    async def test_insert_many(self):
+        """Test the insert_many method, an ordered insert stops on the first error
+        """
+        documents = [{"_id": "1"}, {"_id": "1"}, {"_id": "2"}]
+        result = await self.dbEngine.insert_many("test", documents, ordered=True, batch_size=1)
+        self.assertEqual((result.inserted, result.failed, result.batches), (1, {1}, 2))
+        self.assertEqual(await self.test_db['test'].count_documents({}), 1)
+
+
+class TestDBEngineOptions(TestCase):
+    """Test the DBEngine client options, policies and batching helpers, the motor client
+    connects lazily so no server is needed
+    """
+    def test_init_mongo(self):
+        """Test the __init__ method, mongo backend
+        """
+        dbEngine = DBEngine(backend='mongo')
+        self.assertIsInstance(dbEngine.client, AsyncIOMotorClient)
+        self.assertIsInstance(dbEngine.db, AsyncIOMotorDatabase)
+        self.assertEqual(dbEngine.db.name, 'test_db')
+        self.assertEqual(dbEngine.client.HOST, os.getenv('DB_HOST', 'localhost'))
+        self.assertEqual(dbEngine.client.PORT, int(os.getenv('DB_PORT', 27017)))
+        dbEngine.close()
+        with self.assertRaises(ValueError):
+            DBEngine(backend='sqlite')
+
+    @patch.dict(os.environ, {'DB_MAX_POOL_SIZE': '20', 'DB_MIN_POOL_SIZE': '5', 'DB_COMPRESSORS': 'zlib'})
+    def test_client_options(self):
+        """Test the connection pool options are read from the env variables
+        """
+        dbEngine = DBEngine(backend='mongo')
+        options = dbEngine.client.options
+        self.assertEqual(options.pool_options.max_pool_size, 20)
+        self.assertEqual(options.pool_options.min_pool_size, 5)
+        self.assertEqual(DBEngine.client_options()['compressors'], 'zlib')
+        dbEngine.close()
+
+    @patch('utils.db_engine.importlib.util.find_spec', side_effect=lambda name: None if name == 'snappy' else name)
+    def test_available_compressors(self, _):
+        """Test the compressors whose package is missing are skipped
+        """
+        self.assertEqual(available_compressors('zstd, snappy,zlib,lz4'), ['zstd', 'zlib'])
+        self.assertEqual(available_compressors(''), [])
+
+    def test_batches(self):
+        """Test the operations are split by count and by BSON size
+        """
+        operations = [sized_write(InsertOne, {"value": "x" * 100}) for _ in range(10)]
+        self.assertEqual([(offset, len(batch)) for offset, batch in _batches(operations, 4, 10**6)],
+                         [(0, 4), (4, 4), (8, 2)])
+        self.assertEqual([len(batch) for _, batch in _batches(operations, 100, 300)], [2] * 5)
+        self.assertIsInstance(next(_batches(operations, 4, 10**6))[1][0], InsertOne)
+        # the operations of unknown size are rejected
+        operations = operations[:2] + [InsertOne({"value": "x"})] + operations[2:4]
+        with self.assertRaises(TypeError):
+            list(_batches(operations, 100, 10**6))
+
+    def test_policies(self):
+        """Test the collections are configured with the policies read preference and write concern
+        """
+        dbEngine = DBEngine(backend='mongo')
+        analytics = dbEngine.collection("test", "analytics")
+        self.assertEqual(analytics.read_preference.mongos_mode, "secondaryPreferred")
+        self.assertEqual(analytics.read_preference.max_staleness, 90)
+        self.assertIs(dbEngine.collection("test", "analytics"), analytics)
+        self.assertEqual(dbEngine.collection("test", "durable").write_concern.document, {"w": "majority"})
+        self.assertEqual(dbEngine.collection("test", "fast").write_concern.document, {"w": 1})
+        self.assertEqual(dbEngine.collection("test").read_preference.mongos_mode, "primary")
+        with self.assertRaises(ValueError):
+            dbEngine.collection("test", "unknown")
+        with self.assertRaises(ValueError):
+            dbEngine.collection("test", "listing")
+        dbEngine.close()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Test the in-memory storage backend"""
+import time
+import unittest
+from uuid import uuid4
+
+from pymongo import ASCENDING, DeleteOne, IndexModel, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from utils.db_engine import DBEngine
+from utils.memory_backend import MemoryClient
+
+
+class TestMemoryBackend(unittest.IsolatedAsyncioTestCase):
+    """Test the MemoryClient collections"""
+
+    async def asyncSetUp(self):
+        self.collection = MemoryClient()['test_db']['users']
+        await self.collection.insert_one({
+            '_id': '1', 'email': 'john@doe.com', 'age': 30, 'skills': ['python', 'go'],
+            'resumes': [{'_id': 'a', 'data': {'summary': 'first'}}, {'_id': 'b', 'data': {'summary': 'second'}}],
+        })
+        await self.collection.insert_one({'_id': '2', 'email': 'jane@doe.com', 'age': 25, 'skills': [], 'resumes': []})
+
+    async def find_ids(self, query: dict) -> list:
+        return [document['_id'] for document in await self.collection.find(query).to_list(None)]
+
+    async def test_queries(self):
+        """Test the query operators and the paths through the arrays"""
+        self.assertEqual(await self.find_ids({'skills': 'go'}), ['1'])
+        self.assertEqual(await self.find_ids({'resumes._id': 'b'}), ['1'])
+        self.assertEqual(await self.find_ids({'age': {'$gte': 25, '$lt': 30}}), ['2'])
+        self.assertEqual(await self.find_ids({'_id': {'$in': ['2', '3']}}), ['2'])
+        self.assertEqual(await self.find_ids({'resumes.0': {'$exists': True}}), ['1'])
+        self.assertEqual(await self.find_ids({'$or': [{'age': 25}, {'email': 'john@doe.com'}]}), ['1', '2'])
+        self.assertEqual(await self.find_ids({'resumes': {'$elemMatch': {'_id': 'a', 'data.summary': 'first'}}}),
+                         ['1'])
+        self.assertEqual(await self.find_ids({'_id': {'$type': 'string'}, 'missing': None}), ['1', '2'])
+        self.assertEqual(await self.collection.count_documents({}, limit=1), 1)
+
+    async def test_sort_and_projection(self):
+        """Test the cursors sort and limit, and the projections"""
+        found = await self.collection.find({}, {'email': 1}).sort('age', ASCENDING).limit(1).to_list(None)
+        self.assertEqual(found, [{'_id': '2', 'email': 'jane@doe.com'}])
+        document = await self.collection.find_one({'_id': '1'}, {'resumes': 0, 'skills': 0})
+        self.assertEqual(set(document), {'_id', 'email', 'age'})  # type: ignore
+        document = await self.collection.find_one(
+            {'_id': '1'}, {'_id': 0, 'resumes': {'$elemMatch': {'_id': 'b'}}})
+        self.assertEqual(document, {'resumes': [{'_id': 'b', 'data': {'summary': 'second'}}]})
+        document = await self.collection.find_one({'_id': '1'}, {'resumes': {'$slice': 1}})
+        self.assertEqual([resume['_id'] for resume in document['resumes']], ['a'])  # type: ignore
+        document = await self.collection.find_one({'_id': '1'}, {'summary': '$resumes.data.summary'})
+        self.assertEqual(document, {'_id': '1', 'summary': 'first'})
+
+    async def test_updates(self):
+        """Test the update operators, the positional operator and the upserts"""
+        result = await self.collection.update_one(
+            {'_id': '1', 'resumes._id': 'b'}, {'$set': {'resumes.$.data.summary': 'edited'}, '$inc': {'age': 1}})
+        self.assertEqual((result.matched_count, result.modified_count), (1, 1))
+        await self.collection.update_one({'_id': '1'}, {'$push': {'skills': {'$each': ['c'], '$position': 0}}})
+        await self.collection.update_one({'_id': '1'}, {'$pull': {'resumes': {'_id': 'a'}}})
+        document = await self.collection.find_one({'_id': '1'})
+        self.assertEqual(document['resumes'], [{'_id': 'b', 'data': {'summary': 'edited'}}])  # type: ignore
+        self.assertEqual((document['age'], document['skills']), (31, ['c', 'python', 'go']))  # type: ignore
+        result = await self.collection.update_one(
+            {'_id': '3'}, {'$inc': {'age': 1}, '$setOnInsert': {'email': 'new@doe.com'}}, upsert=True)
+        self.assertEqual(result.upserted_id, '3')
+        self.assertEqual(await self.collection.find_one({'_id': '3'}),
+                         {'_id': '3', 'age': 1, 'email': 'new@doe.com'})
+        with self.assertRaises(OperationFailure):
+            await self.collection.update_one({'_id': '1'}, {'$set': {'resumes.$.data': {}}})
+        # the positional operator is matched once, before the update unsets the queried member
+        await self.collection.update_one({'_id': '1', 'resumes.data.summary': 'edited'},
+                                         {'$unset': {'resumes.$.data.summary': ''}, '$set': {'resumes.$.x': 1}})
+        document = await self.collection.find_one({'_id': '1'})
+        self.assertEqual(document['resumes'], [{'_id': 'b', 'data': {}, 'x': 1}])  # type: ignore
+
+    async def test_unique_index_and_bulk_write(self):
+        """Test the unique indexes and the per operation bulk write errors"""
+        await self.collection.create_indexes([IndexModel([('email', ASCENDING)], unique=True, name='email_unique')])
+        with self.assertRaises(DuplicateKeyError):
+            await self.collection.insert_one({'email': 'john@doe.com'})
+        with self.assertRaises(BulkWriteError) as raised:
+            await self.collection.bulk_write([
+                InsertOne({'_id': '1'}), UpdateOne({'_id': '2'}, {'$set': {'age': 26}}), DeleteOne({'_id': '9'}),
+            ], ordered=False)
+        details = raised.exception.details
+        self.assertEqual([(error['index'], error['code']) for error in details['writeErrors']], [(0, 11000)])
+        self.assertEqual(details['nModified'], 1)
+
+    async def test_aggregate(self):
+        """Test the resumes summaries pipeline"""
+        pipeline = [
+            {'$match': {'_id': '1'}},
+            {'$unwind': '$resumes'},
+            {'$project': {'_id': '$resumes._id', 'summary': '$resumes.data.summary',
+                          'kind': {'$cond': [{'$eq': [{'$type': '$resumes._id'}, 'string']}, 'text', 'binary']}}},
+            {'$sort': {'_id': -1}},
+            {'$limit': 1},
+        ]
+        self.assertEqual(await self.collection.aggregate(pipeline).to_list(None),
+                         [{'_id': 'b', 'summary': 'second', 'kind': 'text'}])
+
+    async def test_binary_ids(self):
+        """Test the UUID ids sort and compare like the binary ids"""
+        ids = sorted([uuid4() for _ in range(3)], key=str)
+        for user_id in reversed(ids):
+            await self.collection.insert_one({'_id': user_id})
+        self.assertEqual(await self.find_ids({'_id': {'$type': 'binData', '$gt': ids[0]}}), ids[2:0:-1])
+        found = await self.collection.find({'_id': {'$type': 'binData'}}).sort('_id', ASCENDING).to_list(None)
+        self.assertEqual([document['_id'] for document in found], ids)
+
+    async def test_latency(self):
+        """Test every operation waits for the injected latency"""
+        collection = MemoryClient(latency=0.02)['test_db']['users']
+        start = time.perf_counter()
+        await collection.insert_one({'_id': '1'})
+        await collection.find_one({'_id': '1'})
+        self.assertGreaterEqual(time.perf_counter() - start, 0.04)
+        self.assertEqual(MemoryClient(jitter=1, seed=7)._random.random(), MemoryClient(jitter=1, seed=7)._random.random())
+
+    async def test_db_engine(self):
+        """Test the DBEngine runs on the memory backend, and keeps the data when reconnected"""
+        engine = DBEngine(backend='memory')
+        self.assertTrue(await engine.connect())
+        await engine.save('users', {'_id': '1', 'email': 'john@doe.com'})
+        engine.close()
+        self.assertTrue(await engine.connect())
+        self.assertEqual(await engine.find_one('users', {'_id': '1'}, policy='analytics'),
+                         {'_id': '1', 'email': 'john@doe.com'})
+        written = await engine.insert_many('users', [{'_id': '1'}, {'_id': '2'}])
+        self.assertEqual((written.inserted, written.failed), (1, {0}))
+        with self.assertRaises(ValueError):
+            DBEngine(backend='sqlite')
+
+
+if __name__ == '__main__':
+    unittest.main()
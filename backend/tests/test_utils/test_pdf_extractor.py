@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from pypdf.errors import PdfStreamError
+from utils.pdf_extractor import PDFExtractionError, extract_resume_draft, segment_resume
+
+try:
+    from reportlab.pdfgen import canvas
+except ImportError:  # pragma: no cover
+    canvas = None
+
+
+RESUME_TEXT = """John Doe
+Software Engineer
+linkedin.com/in/johndoe | github.com/johndoe
+Summary
+A software engineer with 5 years of experience.
+Experience
+Staff Software Engineer at talabat, Egypt
+Mar 2023 - Present
+• Lead major projects
+• Mentor senior engineers
+Software Architect - Vyral Bytes
+Sep 2019 - Oct 2021
+Led the backend team
+Education
+Bachelor of Science, MIT, Cambridge MA
+2012 - 2016
+Projects
+• Resumai: AI resume builder
+Skills
+Python, JavaScript | MongoDB
+Languages
+English (Native), Arabic - Proficient"""
+# the sample resume split over two pages
+PAGES = [RESUME_TEXT[:RESUME_TEXT.index("Education")], RESUME_TEXT[RESUME_TEXT.index("Education"):]]
+
+
+class TestPDFExtractor(unittest.TestCase):
+    """Test the resume PDF extractor utility"""
+
+    def test_segment_resume(self):
+        draft = segment_resume(PAGES)
+        self.assertEqual(draft['title']['name'], "John Doe")
+        self.assertEqual(draft['title']['jobTitle'], "Software Engineer")
+        self.assertEqual([link['type'] for link in draft['title']['links']], ["linkedIn", "GitHub"])
+        self.assertEqual(draft['summary'], "A software engineer with 5 years of experience.")
+        self.assertEqual(len(draft['experiences']), 2)
+        self.assertEqual(draft['experiences'][0]['roleTitle'], "Staff Software Engineer")
+        self.assertEqual(draft['experiences'][0]['companyName'], "talabat")
+        self.assertEqual(draft['experiences'][0]['startingDate'], datetime(2023, 3, 1))
+        self.assertEqual(draft['experiences'][0]['endingDate'], "present")
+        self.assertEqual(draft['experiences'][0]['summary'], "Lead major projects\nMentor senior engineers")
+        self.assertEqual(draft['experiences'][1]['companyName'], "Vyral Bytes")
+        self.assertEqual(draft['projects'], [{'title': "Resumai", 'description': "AI resume builder"}])
+        self.assertEqual(draft['skills'], ["Python", "JavaScript", "MongoDB"])
+        self.assertEqual(draft['languages'][1], {'name': "Arabic", 'proficient': "proficient"})
+
+    def test_segment_empty(self):
+        self.assertEqual(segment_resume([""]), {})
+
+    @unittest.skipIf(canvas is None, "reportlab is required to build the sample PDF")
+    def test_extract_resume_draft(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "resume.pdf")
+            pdf = canvas.Canvas(path)
+            for page in PAGES:
+                y = 800
+                for line in page.splitlines():
+                    pdf.drawString(50, y, line)
+                    y -= 18
+                pdf.showPage()
+            pdf.save()
+
+            draft = extract_resume_draft(path)
+            self.assertEqual(draft['title']['name'], "John Doe")
+            self.assertEqual(len(draft['experiences']), 2)
+            # large files are memory-mapped
+            with patch('utils.pdf_extractor.MMAP_THRESHOLD', 0):
+                self.assertEqual(extract_resume_draft(path), draft)
+            with self.assertRaises(PDFExtractionError):
+                extract_resume_draft(path, max_pages=1)
+            with self.assertRaises(PDFExtractionError):
+                extract_resume_draft(path, max_bytes=10)
+
+    def test_extract_invalid_pdf(self):
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as file:
+            file.write(b"not a pdf")
+            file.flush()
+            with self.assertRaises(PDFExtractionError):
+                extract_resume_draft(file.name)
+
+    def test_extract_malformed_pdf(self):
+        """Test the parser failures other than PdfReadError are reported as invalid PDFs"""
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as file:
+            file.write(b"%PDF-1.4 truncated")
+            file.flush()
+            for error in (PdfStreamError("Stream has ended unexpectedly"), KeyError("/Root"), ValueError()):
+                with patch('utils.pdf_extractor.PdfReader', side_effect=error):
+                    with self.assertRaises(PDFExtractionError):
+                        extract_resume_draft(file.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from utils.pdf_extractor import extract_resume_draft
+from utils.pdf_renderer import ClassicTemplate, RenderCache, render_key, render_resume_pdf
+
+
+class TestPDFRenderer(unittest.TestCase):
+    """Test the resume PDF renderer utility"""
+
+    def setUp(self):
+        self.data = {
+            "title": {
+                "name": "John Doe",
+                "jobTitle": "Software Engineer",
+                "links": [{"type": "GitHub", "linkUrl": "https://www.github.com/johndoe"}],
+            },
+            "summary": "A software engineer with 5 years of experience & more",
+            "experiences": [{
+                "companyName": "Google",
+                "roleTitle": "Software Engineer",
+                "startingDate": "2016-01-01",
+                "endingDate": "present",
+                "location": "Mountain View, CA",
+                "summary": "Worked on the search engine team\nMentored the interns",
+            }],
+            "education": [],
+            "projects": [{"title": "Resumai", "description": "AI resume builder"}],
+            "skills": ["Python", "MongoDB"],
+            "languages": [{"name": "English", "proficient": "native"}],
+        }
+
+    def test_render_resume_pdf(self):
+        document = render_resume_pdf("unknown-template", self.data)
+        self.assertTrue(document.startswith(b"%PDF"))
+        self.assertEqual(render_resume_pdf("classic", self.data), document)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "resume.pdf")
+            with open(path, "wb") as file:
+                file.write(document)
+            draft = extract_resume_draft(path)
+        self.assertEqual(draft['title']['name'], "John Doe")
+        self.assertEqual(draft['skills'], ["Python", "MongoDB"])
+
+    def test_render_key(self):
+        key = render_key("classic", self.data)
+        self.assertEqual(render_key("classic", dict(reversed(list(self.data.items())))), key)
+        self.assertNotEqual(render_key("classic", {**self.data, "summary": "changed"}), key)
+        ClassicTemplate.version += 1
+        try:
+            self.assertNotEqual(render_key("classic", self.data), key)
+        finally:
+            ClassicTemplate.version -= 1
+
+    def test_render_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = RenderCache(os.path.join(directory, "renders"), max_entries=2, prune_interval=1)
+            self.assertIsNone(cache.get("a"))
+            path = cache.set("a", b"%PDF-a")
+            self.assertEqual(cache.get("a"), b"%PDF-a")
+            os.utime(path, (0, 0))
+            cache.set("b", b"%PDF-b")
+            cache.set("c", b"%PDF-c")
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("c"), b"%PDF-c")
+
+    def test_render_cache_prune_interval(self):
+        """Test the directory is only pruned once every prune_interval stored documents"""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = RenderCache(directory, max_entries=1, prune_interval=3)
+            cache.set("a", b"%PDF-a")
+            cache.set("b", b"%PDF-b")
+            self.assertEqual(cache.get("a"), b"%PDF-a")
+            cache.set("c", b"%PDF-c")
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
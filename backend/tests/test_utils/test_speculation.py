@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.v1.schema.resume_schemas import ResumeData
+from utils.speculation import Speculator
+
+
+class TestSpeculator(unittest.IsolatedAsyncioTestCase):
+    """Test the Speculator utility"""
+
+    def setUp(self):
+        self.assistant = MagicMock()
+        self.assistant.enhance_resume = AsyncMock(return_value={"resume_data": {}})
+        self.speculator = Speculator(self.assistant, maxsize=2, ttl=60)
+        self.resume = ResumeData(summary="A software engineer")
+        patcher = patch('utils.speculation.JobCrawler')
+        self.mock_crawler = patcher.start()
+        self.mock_crawler.return_value.get_description.return_value = "Job description"
+        self.addCleanup(patcher.stop)
+
+    async def test_attach_same_resume(self):
+        handle = self.speculator.start("1", "https://www.linkedin.com/jobs/view/1", self.resume)
+        description, enhanced = await self.speculator.attach(handle, "1", self.resume)
+        self.assertEqual(description, "Job description")
+        self.assertEqual(enhanced, {"resume_data": {}})
+        self.assistant.enhance_resume.assert_awaited_once_with(self.resume, "Job description", user_id="1")
+
+    async def test_attach_changed_resume(self):
+        handle = self.speculator.start("1", "https://www.linkedin.com/jobs/view/1", self.resume)
+        description, enhanced = await self.speculator.attach(handle, "1", ResumeData(summary="Changed"))
+        self.assertEqual(description, "Job description")
+        self.assertIsNone(enhanced)
+
+    async def test_attach_other_user(self):
+        handle = self.speculator.start("1", "https://www.linkedin.com/jobs/view/1")
+        with self.assertRaises(KeyError):
+            await self.speculator.attach(handle, "2", self.resume)
+
+    async def test_bounded(self):
+        handles = [self.speculator.start("1", f"https://www.linkedin.com/jobs/view/{i}", self.resume)
+                   for i in range(3)]
+        with self.assertRaises(KeyError):
+            await self.speculator.attach(handles[0], "1", self.resume)
+        self.speculator.clear()
+        with self.assertRaises(KeyError):
+            await self.speculator.attach(handles[2], "1", self.resume)
+        await asyncio.sleep(0)
+
+    async def test_evicted_while_attached(self):
+        """Test an eviction does not cancel the work a request is waiting for"""
+        release = asyncio.Event()
+
+        async def enhance(*args, **kwargs):
+            await release.wait()
+            return {"resume_data": {}}
+
+        self.assistant.enhance_resume = AsyncMock(side_effect=enhance)
+        handle = self.speculator.start("1", "https://www.linkedin.com/jobs/view/1", self.resume)
+        attached = asyncio.create_task(self.speculator.attach(handle, "1", self.resume))
+        while not self.assistant.enhance_resume.await_count:
+            await asyncio.sleep(0.01)
+        for i in range(2, 4):
+            self.speculator.start("1", f"https://www.linkedin.com/jobs/view/{i}")
+        release.set()
+        self.assertEqual(await attached, ("Job description", {"resume_data": {}}))
+        self.speculator.clear()
+
+    async def test_cancelled_enhancement(self):
+        """Test a cancelled enhancement lets the request enhance the resume itself"""
+        handle = self.speculator.start("1", "https://www.linkedin.com/jobs/view/1", self.resume)
+        self.speculator._speculations.get(handle).enhancement.cancel()
+        self.assertEqual(await self.speculator.attach(handle, "1", self.resume), ("Job description", None))
+
+
+if __name__ == '__main__':
+    unittest.main()
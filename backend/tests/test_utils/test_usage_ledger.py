@@ -0,0 +1,128 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+from pymongo.errors import BulkWriteError
+from utils.db_engine import DBEngine
+from utils.usage_ledger import UsageLedger, _today
+
+
+class TestUsageLedger(unittest.IsolatedAsyncioTestCase):
+    """Test the UsageLedger utility"""
+
+    def setUp(self):
+        self.ledger = UsageLedger(flush_interval=60)
+        self.ledger.prompt_token_price = 1_000_000
+        self.collection = MagicMock()
+        self.collection.bulk_write = AsyncMock()
+        self.collection.bulk_write.return_value.bulk_api_result = {'nUpserted': 2}
+        self.collection.find.return_value.to_list = AsyncMock(return_value=[])
+        self.collection.with_options.return_value = self.collection
+        self.ledger._db_engine = DBEngine()
+        self.ledger._db_engine.db = MagicMock()
+        self.ledger._db_engine.db.__getitem__.return_value = self.collection
+
+    def test_record_and_usage(self):
+        self.ledger.record("1", prompt_tokens=10, completion_tokens=5, latency=0.25)
+        self.ledger.record("1", prompt_tokens=1)
+        usage = self.ledger.usage("1")
+        self.assertEqual(usage['calls'], 2)
+        self.assertEqual(usage['total_tokens'], 16)
+        self.assertEqual(usage['latency_ms'], 250)
+        self.assertEqual(usage['cost'], 11)
+        self.assertEqual(self.ledger.usage("2")['calls'], 0)
+
+    def test_within_quota(self):
+        self.assertTrue(self.ledger.within_quota("1"))
+        self.ledger.daily_token_quota = 10
+        self.ledger.record("1", prompt_tokens=10)
+        self.assertFalse(self.ledger.within_quota("1"))
+
+    async def test_flush(self):
+        self.ledger.record("1", prompt_tokens=10)
+        self.ledger.record("2", prompt_tokens=3)
+        self.collection.find.return_value.to_list.return_value = [
+            {'_id': f'1:{_today()}', 'user_id': '1', 'day': _today(), 'calls': 4, 'total_tokens': 40},
+        ]
+        written = await self.ledger.flush()
+        self.assertEqual(written, 2)
+        operations = self.collection.bulk_write.call_args.args[0]
+        self.assertEqual(len(operations), 2)
+        self.assertEqual(operations[0]._doc['$inc']['prompt_tokens'], 10)
+        # the rollups record the flush id, the same id is skipped if it's written again
+        flush_id = operations[0]._filter['flushes']['$ne']
+        self.assertEqual(operations[0]._doc['$push']['flushes']['$each'], [flush_id])
+        self.assertFalse(self.collection.bulk_write.call_args.kwargs['ordered'])
+        # the totals are refreshed from the database without reading it again
+        self.assertEqual(self.ledger.usage("1")['total_tokens'], 40)
+        self.assertEqual(await self.ledger.flush(), 0)
+        self.collection.bulk_write.assert_called_once()
+
+    async def test_flush_failure_keeps_counters(self):
+        self.collection.bulk_write.side_effect = Exception()
+        self.ledger.record("1", prompt_tokens=10)
+        self.assertEqual(await self.ledger.flush(), 0)
+        self.assertEqual(self.ledger.usage("1")['prompt_tokens'], 10)
+        self.assertTrue(self.ledger._unconfirmed)
+
+    async def test_flush_partial_failure(self):
+        self.collection.bulk_write.side_effect = BulkWriteError({
+            'nUpserted': 1, 'writeErrors': [{'index': 1, 'code': 1, 'errmsg': 'failed'}]})
+        self.collection.find.return_value.to_list.return_value = [
+            {'_id': f'1:{_today()}', 'user_id': '1', 'day': _today(), 'prompt_tokens': 10},
+        ]
+        self.ledger.record("1", prompt_tokens=10)
+        self.ledger.record("2", prompt_tokens=3)
+        self.assertEqual(await self.ledger.flush(), 1)
+        # only the failed counters are kept for the next flush
+        self.assertEqual([list(pending) for pending in self.ledger._unconfirmed.values()], [[("2", _today())]])
+        self.assertEqual(self.ledger.usage("2")['prompt_tokens'], 3)
+        self.assertEqual(self.ledger.usage("1")['prompt_tokens'], 10)
+
+    async def test_stop_during_flush(self):
+        """Test the counters of a flush cancelled by stop are retried by the final flush with the
+        same flush id, so the server skips them if the cancelled write was applied"""
+        started = asyncio.Event()
+
+        async def slow_write(*args, **kwargs):
+            started.set()
+            await asyncio.sleep(60)
+
+        self.collection.bulk_write.side_effect = slow_write
+        self.ledger.record("1", prompt_tokens=10)
+        task = asyncio.create_task(self.ledger.flush())
+        await started.wait()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(self.ledger.usage("1")['prompt_tokens'], 10)
+        cancelled = self.collection.bulk_write.call_args.args[0][0]
+        self.collection.bulk_write.side_effect = None
+        self.assertEqual(await self.ledger.flush(), 1)
+        retried = self.collection.bulk_write.call_args.args[0][0]
+        self.assertEqual(retried._doc['$inc']['prompt_tokens'], 10)
+        self.assertEqual(retried._filter, cancelled._filter)
+        self.assertEqual(self.ledger._unconfirmed, {})
+
+    async def test_retry_of_applied_flush(self):
+        """Test a flush cancelled after the server applied it is not counted twice by the retry"""
+        engine = DBEngine(backend='memory')
+        self.ledger._db_engine = MagicMock(db=engine.db)
+
+        async def applied_then_cancelled(*args, **kwargs):
+            await engine.bulk_write(*args, **kwargs)
+            raise asyncio.CancelledError()
+
+        self.ledger._db_engine.bulk_write = AsyncMock(side_effect=applied_then_cancelled)
+        self.ledger.record("1", prompt_tokens=10)
+        with self.assertRaises(asyncio.CancelledError):
+            await self.ledger.flush()
+        self.ledger._db_engine.bulk_write.side_effect = engine.bulk_write
+        self.ledger.record("1", prompt_tokens=5)
+        await self.ledger.flush()
+        document = await engine.db['usage'].find_one({'_id': f'1:{_today()}'})
+        self.assertEqual(document['prompt_tokens'], 15)  # type: ignore
+        self.assertEqual(self.ledger.usage("1")['prompt_tokens'], 15)
+        self.assertEqual(self.ledger._unconfirmed, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,12 @@
 """Initialize the utils module"""
 from .assistant import Assistant
 from .job_crawler import JobCrawler
+from .pdf_renderer import RenderCache
+from .speculation import Speculator
+from .usage_ledger import UsageLedger
 
-AIAssistant = Assistant()
-jobCrawler = JobCrawler()
\ No newline at end of file
+usageLedger = UsageLedger()
+AIAssistant = Assistant(usage_ledger=usageLedger)
+jobCrawler = JobCrawler()
+renderCache = RenderCache()
+speculator = Speculator(AIAssistant)
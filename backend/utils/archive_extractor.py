@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""A utility helper to extract the resumes of a ZIP archive, each archive member is
+either a resume PDF or a JSON resume"""
+import io
+import json
+import os
+import zipfile
+
+from utils.pdf_extractor import MAX_PDF_BYTES, MAX_PDF_PAGES, PDFExtractionError, iter_pages, segment_resume
+
+
+# the maximum size of the uploaded archive and the maximum number of resumes in it
+MAX_ARCHIVE_BYTES = int(os.getenv('ZIP_MAX_BYTES', 100 * 1024 * 1024))
+MAX_ARCHIVE_FILES = int(os.getenv('ZIP_MAX_FILES', 500))
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.json')
+
+
+class ArchiveExtractionError(ValueError):
+    """Raised when the archive or one of its members can't be extracted"""
+
+
+def list_resumes(path: str, max_files: int = MAX_ARCHIVE_FILES) -> list[str]:
+    """List the resume files of the archive, the directories, the hidden files and the
+    unsupported files are skipped
+
+    Parameters:
+    -----------
+    * path: str: the path of the ZIP archive
+    * max_files: int: the maximum number of resumes allowed in the archive
+
+    Returns: list[str]: the archive members names
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            names = [
+                info.filename for info in archive.infolist()
+                if not info.is_dir()
+                and not any(part.startswith(('.', '__MACOSX')) for part in info.filename.split('/'))
+                and info.filename.lower().endswith(SUPPORTED_EXTENSIONS)
+            ]
+    except zipfile.BadZipFile:
+        raise ArchiveExtractionError("Invalid ZIP file")
+    if len(names) > max_files:
+        raise ArchiveExtractionError(f"The archive has more than {max_files} resumes")
+    return names
+
+
+def extract_resume(path: str, name: str, max_bytes: int = MAX_PDF_BYTES, max_pages: int = MAX_PDF_PAGES) -> dict:
+    """Extract one resume of the archive, this is meant to run in the worker process pool
+
+    Parameters:
+    -----------
+    * path: str: the path of the ZIP archive
+    * name: str: the archive member name
+    * max_bytes: int: the maximum uncompressed size of the member
+    * max_pages: int: the maximum number of pages of a PDF member
+
+    Returns: dict: the resume draft for the PDF members, or the JSON resume document
+    """
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(name)
+        if info.file_size > max_bytes:
+            raise ArchiveExtractionError(f"The file is larger than {max_bytes} bytes")
+        with archive.open(info) as member:
+            # the declared size is not trusted, at most max_bytes are read
+            content = member.read(max_bytes + 1)
+    if len(content) > max_bytes:
+        raise ArchiveExtractionError(f"The file is larger than {max_bytes} bytes")
+
+    if name.lower().endswith('.json'):
+        try:
+            document = json.loads(content)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ArchiveExtractionError("Invalid JSON file")
+        if not isinstance(document, dict):
+            raise ArchiveExtractionError("The JSON file is not a resume object")
+        return document
+    try:
+        return segment_resume(iter_pages(io.BytesIO(content), max_pages))
+    except PDFExtractionError as e:
+        raise ArchiveExtractionError(str(e))
@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 """The GenAI Assistant module that holds the Cluade Assistant class."""
 import asyncio
+from hashlib import sha256
 from time import time
 import os
 import json
+from typing import AsyncIterator, Iterable
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+from utils.cache import TTLCache
+
 
 load_dotenv()
 
@@ -14,10 +18,24 @@ genai.configure(
     api_key=os.getenv('GENAI_API_KEY'),
 )
 
+# the artifacts supported by `Assistant.generate_artifacts` with their prompt description
+ARTIFACTS = {
+    'enhanced_resume': 'the resume improved to match the job description, in the same format you use '
+                       'when asked to improve a resume',
+    'cover_letter': 'a string holding a cover letter tailored for the job description',
+    'interview_questions': 'a list of strings holding the most likely interview questions for the job',
+}
+
+
 class Assistant:
     """The GenAI Assistant class that interacts with the GenAI API."""
-    def __init__(self):
-        """Initialize the Assistant class with the system instruction and the model."""
+    def __init__(self, usage_ledger=None):
+        """Initialize the Assistant class with the system instruction and the model.
+
+        Parameters:
+        -----------
+        usage_ledger: UsageLedger | None, the ledger that records the tokens and latency of each call
+        """
         self.system_instruction = os.getenv('PROMPT_SYSTEM_INSTRUCTION')
         self._config = {
             "temperature": 0.6,
@@ -30,8 +48,14 @@ class Assistant:
             generation_config=self._config,  # type: ignore
             system_instruction=self.system_instruction
             )
-        
-    async def enhance_resume(self, resume_data: dict, job_description: str = '') -> dict:
+        # generated artifacts cached by (artifact, resume, job description)
+        self._artifacts_cache = TTLCache(
+            maxsize=int(os.getenv('ASSISTANT_CACHE_SIZE', 512)),
+            ttl=float(os.getenv('ASSISTANT_CACHE_TTL', 3600))
+        )
+        self.usage_ledger = usage_ledger
+
+    async def enhance_resume(self, resume_data: dict, job_description: str = '', user_id: str | None = None) -> dict:
         """Use the generative AI API to enhance the resume represented
             by the resume_data dictionary
 
@@ -39,6 +63,7 @@ class Assistant:
             -----------
             resume_data: dict, a dictionary in the form of field:value pairs represent the resume data
             job_description: str, the job description to match the resume with
+            user_id: str | None, the id of the user to record the call usage for
 
             Returns:
             ---------
@@ -48,7 +73,122 @@ class Assistant:
             # raise TypeError('resume_data is not in dictionary format')
         #resume_json_data = json.dumps(resume_data)
         resume_json_data = resume_data.model_dump_json(exclude_defaults=True, exclude_none=True, exclude_unset=True)
-        chat = self.model.start_chat(
+        cache_key = self._artifact_key('enhanced_resume', resume_json_data, job_description)
+        cached = self._artifacts_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        chat = self._start_chat(resume_json_data)
+        started = time()
+        result = await chat.send_message_async(
+            f"Improve the provided resume to match the job description: <job_description>{job_description}</job_description>"
+            )
+        self._record_usage(user_id, result, started)
+        try:
+            enhanced_resume = json.loads(str(result.text))
+        except json.JSONDecodeError as e:
+            raise ValueError('Error parsing the response from the API')
+        self._artifacts_cache.set(cache_key, enhanced_resume)
+        return enhanced_resume
+
+    async def generate_artifacts(self, resume_data, job_description: str = '',
+                                 artifacts: Iterable[str] = ARTIFACTS,
+                                 user_id: str | None = None) -> AsyncIterator[tuple[str, object]]:
+        """Generate several artifacts for the same resume and job description in one
+            round trip, the artifacts are yielded in the requested order as soon as
+            each one of them is fully received from the API
+
+            Parameters:
+            -----------
+            resume_data: ResumeData, the resume data to generate the artifacts for
+            job_description: str, the job description to tailor the artifacts for
+            artifacts: Iterable[str], the artifacts names, a subset of `ARTIFACTS`
+            user_id: str | None, the id of the user to record the call usage for
+
+            Yields:
+            -------
+            (artifact, content): tuple[str, object], the artifact name and its content,
+            the `enhanced_resume` content is in the same format of `enhance_resume` result
+        """
+        artifacts = list(dict.fromkeys(artifacts))
+        unknown = [artifact for artifact in artifacts if artifact not in ARTIFACTS]
+        if unknown:
+            raise ValueError(f'Unknown artifacts: {", ".join(unknown)}')
+
+        resume_json_data = resume_data.model_dump_json(exclude_defaults=True, exclude_none=True, exclude_unset=True)
+        keys = {artifact: self._artifact_key(artifact, resume_json_data, job_description)
+                for artifact in artifacts}
+        ready = {artifact: self._artifacts_cache.get(key) for artifact, key in keys.items()}
+        missing = [artifact for artifact in artifacts if ready[artifact] is None]
+
+        text = received = None
+        if missing:
+            chat = self._start_chat(resume_json_data)
+            started = time()
+            response = await chat.send_message_async(
+                self._artifacts_prompt(missing, job_description), stream=True
+                )
+            text = self._stream_text(response, user_id, started)
+            received = _iter_json_members(text)
+
+        try:
+            for artifact in artifacts:
+                # consume the stream until the next artifact in order is complete
+                while ready[artifact] is None:
+                    try:
+                        name, content = await anext(received)  # type: ignore
+                    except StopAsyncIteration:
+                        raise ValueError('Error parsing the response from the API')
+                    if name in keys and ready[name] is None:
+                        ready[name] = content
+                        self._artifacts_cache.set(keys[name], content)
+                yield artifact, ready[artifact]
+            if text is not None:
+                # the usage metadata is carried by the last chunk, after the parsed object
+                async for _ in text:
+                    pass
+        finally:
+            if text is not None:
+                # records the usage of the received chunks if the stream was left early
+                await text.aclose()
+
+    async def _stream_text(self, response, user_id: str | None, started: float) -> AsyncIterator[str]:
+        """Yield the text of the streamed response chunks, and record the call usage once
+        the stream is over or closed, the usage metadata is carried by the last chunk"""
+        chunk = None
+        try:
+            async for chunk in response:
+                yield chunk.text
+        finally:
+            self._record_usage(user_id, chunk, started)
+
+    def _record_usage(self, user_id: str | None, result, started: float) -> None:
+        """Record the tokens and the latency of the call in the usage ledger
+
+        Parameters:
+        -----------
+        user_id: str | None, the id of the user that made the call, nothing is recorded if None
+        result: GenerateContentResponse, the API response holding the usage metadata
+        started: float, the time the call started at
+        """
+        if not self.usage_ledger or not user_id:
+            return
+        metadata = getattr(result, 'usage_metadata', None)
+        self.usage_ledger.record(
+            user_id,
+            prompt_tokens=getattr(metadata, 'prompt_token_count', 0) or 0,
+            completion_tokens=getattr(metadata, 'candidates_token_count', 0) or 0,
+            latency=time() - started
+        )
+
+    def _start_chat(self, resume_json_data: str):
+        """Start a new chat session seeded with the resume
+
+        Parameters:
+        -----------
+        resume_json_data: str, the resume data serialized as json
+        """
+        return self.model.start_chat(
             history=[
                 {
                     'role': 'user',
@@ -58,14 +198,71 @@ class Assistant:
                 }
             ]
         )
-        result = await chat.send_message_async(
-            f"Improve the provided resume to match the job description: <job_description>{job_description}</job_description>"
-            )
-        try:
-            return json.loads(str(result.text))
-        except json.JSONDecodeError as e:
-            raise ValueError('Error parsing the response from the API')
-    
+
+    @staticmethod
+    def _artifacts_prompt(artifacts: list[str], job_description: str) -> str:
+        """Build the prompt that requests all the artifacts in one json object"""
+        members = ', '.join(f'"{artifact}": {ARTIFACTS[artifact]}' for artifact in artifacts)
+        return (
+            "For the provided resume and the job description: "
+            f"<job_description>{job_description}</job_description> "
+            "respond with a single JSON object with exactly these keys in this order: "
+            f"{members}"
+        )
+
+    @staticmethod
+    def _artifact_key(artifact: str, resume_json_data: str, job_description: str) -> str:
+        """Build the cache key of an artifact generated for the resume and the job description"""
+        digest = sha256()
+        for part in (artifact, resume_json_data, job_description.strip()):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+
+async def _iter_json_members(chunks: AsyncIterator[str]) -> AsyncIterator[tuple[str, object]]:
+    """Incrementally parse the members of a streamed top level json object, each
+    (key, value) pair is yielded as soon as its value is complete
+
+    Parameters:
+    -----------
+    chunks: AsyncIterator[str], the json text chunks as received from the API
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    key = None
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            # skip the separators between the tokens
+            while position < len(buffer) and buffer[position] in ' \t\r\n,:':
+                position += 1
+            if position >= len(buffer):
+                break
+            if not started:
+                if buffer[position] != '{':
+                    raise ValueError('Error parsing the response from the API')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == '}':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # wait for the rest of the token
+            if end == len(buffer) and not isinstance(value, (str, list, dict)):
+                break  # a number or a literal may continue in the next chunk
+            position = end
+            if key is None:
+                key = value
+            else:
+                yield key, value  # type: ignore
+                key = None
+        # drop the consumed part of the buffer
+        buffer, position = buffer[position:], 0
 
 if __name__ == '__main__':
     assistant = Assistant()
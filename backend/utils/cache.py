@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""A small in-process cache helper with LRU eviction and per-entry expiry"""
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """A bounded in-memory cache, entries are evicted when they expire or when
+    the cache is full (least recently used first)
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0,
+                 on_evict: Callable[[Hashable, Any], None] | None = None) -> None:
+        """Construct the cache object
+
+        Parameters:
+        -----------
+        * maxsize: int: the maximum number of entries kept in the cache
+        * ttl: float: the time to live of each entry in seconds
+        * on_evict: callable | None: called with (key, value) when an entry is
+                    dropped because it expired or the cache is full
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._on_evict = on_evict
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get the value stored under key, or default if missing or expired
+
+        Parameters:
+        -----------
+        * key: Hashable: the entry key
+        * default: Any: the value returned on a cache miss, defaults to None
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= monotonic():
+            self._evict(key)
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Store value under key, evicting the oldest entries if the cache is full
+
+        Parameters:
+        -----------
+        * key: Hashable: the entry key
+        * value: Any: the value to store
+        * ttl: float | None: override the cache ttl for this entry
+        """
+        self._data[key] = (monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._evict(next(iter(self._data)))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove the entry stored under key and return its value, without
+        calling the eviction callback
+        """
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self, evict: bool = False) -> None:
+        """Drop all the entries
+
+        Parameters:
+        -----------
+        * evict: bool: call the eviction callback for each dropped entry, defaults to False
+        """
+        if evict:
+            for key in list(self._data):
+                self._evict(key)
+        self._data.clear()
+
+    def purge(self) -> int:
+        """Evict all the expired entries
+
+        Returns: int: the number of evicted entries
+        """
+        now = monotonic()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+        for key in expired:
+            self._evict(key)
+        return len(expired)
+
+    def _evict(self, key: Hashable) -> None:
+        """Drop the entry and notify the eviction callback"""
+        _, value = self._data.pop(key)
+        if self._on_evict:
+            self._on_evict(key, value)
+
+
+_MISSING = object()
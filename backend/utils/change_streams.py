@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""A utility to consume the database change streams, the change events are fanned out to the
+registered handlers, like the caches invalidators and the derived data maintenance, and the
+resume tokens are persisted so a restarted consumer continues where it stopped"""
+import asyncio
+import os
+from collections import defaultdict
+from itertools import count
+from time import monotonic
+from typing import Any, Awaitable, Callable
+
+from pymongo.errors import OperationFailure
+
+# the errors of a resume token that is no longer in the oplog
+HISTORY_LOST_CODES = (280, 286)
+
+ChangeHandler = Callable[[dict], Awaitable[Any] | Any]
+
+
+class MotorChangeSource:
+    """The change streams of the database collections, requires a replica set"""
+    def __init__(self, db_engine) -> None:
+        self.db_engine = db_engine
+
+    def watch(self, collection: str, resume_after: dict | None = None):
+        """Open the change stream of the collection, after the resume token if provided"""
+        return self.db_engine.db[collection].watch(resume_after=resume_after)
+
+
+class MongoTokenStore:
+    """Persist the resume tokens in a database collection, one document per stream"""
+    def __init__(self, db_engine, collection: str = 'change_stream_tokens') -> None:
+        self.db_engine = db_engine
+        self.collection = collection
+
+    async def load(self, key: str) -> dict | None:
+        """Load the resume token of the stream"""
+        document = await self.db_engine.find_one(self.collection, {'_id': key})
+        return (document or {}).get('token')
+
+    async def save(self, key: str, token: dict | None) -> None:
+        """Save the resume token of the stream"""
+        await self.db_engine.db[self.collection].update_one({'_id': key}, {'$set': {'token': token}}, upsert=True)
+
+
+class ChangeStreamConsumer:
+    """Watch the collections with registered handlers, and call the handlers of each change
+    event. The handlers may see an event again after a restart, so they must be idempotent
+    """
+    def __init__(self, source, token_store, enabled: bool | None = None, name: str | None = None,
+                 token_interval: float | None = None) -> None:
+        """Construct the consumer object
+
+        Parameters:
+        -----------
+        * source: the change streams source, MotorChangeSource or LocalChangeSource
+        * token_store: the resume tokens store, MongoTokenStore or LocalTokenStore
+        * enabled: bool | None: watch the collections on start, defaults to the CHANGE_STREAMS
+                   env variable, the change streams require a replica set or a sharded cluster
+        * name: str | None: the consumer name the tokens are stored under, defaults
+                to the CHANGE_STREAMS_CONSUMER env variable or `api`
+        * token_interval: float | None: the seconds between the tokens writes, defaults
+                          to the CHANGE_STREAMS_TOKEN_INTERVAL env variable or 5 seconds
+        """
+        self.source = source
+        self.token_store = token_store
+        self.enabled = enabled if enabled is not None else os.getenv('CHANGE_STREAMS', '').lower() in ('1', 'true')
+        self.name = name or os.getenv('CHANGE_STREAMS_CONSUMER', 'api')
+        self.token_interval = token_interval if token_interval is not None else float(
+            os.getenv('CHANGE_STREAMS_TOKEN_INTERVAL', 5))
+        self._handlers: dict[str, list[tuple[ChangeHandler, tuple[str, ...] | None]]] = defaultdict(list)
+        self._reset_handlers: list[Callable[[], Any]] = []
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._tokens: dict[str, dict | None] = {}
+
+    def register(self, collection: str, handler: ChangeHandler, operations: tuple[str, ...] | None = None) -> None:
+        """Register a handler of the collection change events
+
+        Parameters:
+        -----------
+        * collection: str: the watched collection
+        * handler: Callable: called (or awaited) with each change event
+        * operations: tuple | None: the handled operation types, like `('update', 'delete')`,
+                      defaults to all of them
+        """
+        self._handlers[collection].append((handler, operations))
+
+    def on_reset(self, handler: Callable[[], Any]) -> None:
+        """Register a handler called when events may have been missed, the stream history
+        was lost or the stream failed, the handler drops the state the events maintain"""
+        self._reset_handlers.append(handler)
+
+    def start(self) -> None:
+        """Start watching the collections with registered handlers, if enabled"""
+        if not self.enabled:
+            return
+        for collection in self._handlers:
+            task = self._tasks.get(collection)
+            if task is None or task.done():
+                self._tasks[collection] = asyncio.ensure_future(self._watch(collection))
+
+    async def stop(self) -> None:
+        """Stop watching, and persist the last resume tokens"""
+        tasks, self._tasks = self._tasks, {}
+        for task in tasks.values():
+            task.cancel()
+        for collection, task in tasks.items():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            await self._save_token(collection)
+
+    async def dispatch(self, collection: str, event: dict) -> None:
+        """Call the collection handlers of the event, a failed handler doesn't stop the others
+
+        Parameters:
+        -----------
+        * collection: str: the collection of the event
+        * event: dict: the change event
+        """
+        for handler, operations in self._handlers.get(collection, ()):
+            if operations is not None and event.get('operationType') not in operations:
+                continue
+            try:
+                result = handler(event)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(e)
+
+    async def _watch(self, collection: str) -> None:
+        """Consume the collection change stream, reopening it after the failures"""
+        key = f'{self.name}:{collection}'
+        try:
+            self._tokens[collection] = await self.token_store.load(key)
+        except Exception as e:
+            print(e)
+            self._tokens[collection] = None
+        while True:
+            try:
+                saved_at = monotonic()
+                async with self.source.watch(collection, resume_after=self._tokens[collection]) as stream:
+                    async for event in stream:
+                        await self.dispatch(collection, event)
+                        self._tokens[collection] = event['_id']
+                        if monotonic() - saved_at >= self.token_interval:
+                            await self._save_token(collection)
+                            saved_at = monotonic()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                print(e)
+                if e.code in HISTORY_LOST_CODES:
+                    # the token is too old, continue from now
+                    self._tokens[collection] = None
+                await self._reset()
+            except Exception as e:
+                print(e)
+                await self._reset()
+            await asyncio.sleep(1)
+
+    async def _reset(self) -> None:
+        """Call the reset handlers"""
+        for handler in self._reset_handlers:
+            try:
+                result = handler()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(e)
+
+    async def _save_token(self, collection: str) -> None:
+        """Persist the last resume token of the collection stream"""
+        if collection not in self._tokens:
+            return
+        try:
+            await self.token_store.save(f'{self.name}:{collection}', self._tokens[collection])
+        except Exception as e:
+            print(e)
+
+
+class LocalChangeSource:
+    """An in-process stand-in of the replica set change streams for the tests, the events
+    are emitted explicitly and replayed after a resume token like the oplog does
+    """
+    def __init__(self) -> None:
+        self._events: dict[str, list[dict]] = defaultdict(list)
+        self._streams: dict[str, list[asyncio.Queue]] = defaultdict(list)
+        self._counter = count(1)
+
+    def emit(self, collection: str, operation_type: str, document_key: Any,
+             full_document: dict | None = None, update_description: dict | None = None) -> dict:
+        """Emit a change event of the collection to the open streams
+
+        Returns: dict: the emitted event
+        """
+        event = {
+            '_id': {'_data': f'{next(self._counter):016d}'},
+            'operationType': operation_type,
+            'ns': {'coll': collection},
+            'documentKey': {'_id': document_key},
+        }
+        if full_document is not None:
+            event['fullDocument'] = full_document
+        if update_description is not None:
+            event['updateDescription'] = update_description
+        self._events[collection].append(event)
+        for queue in self._streams[collection]:
+            queue.put_nowait(event)
+        return event
+
+    def watch(self, collection: str, resume_after: dict | None = None) -> '_LocalStream':
+        """Open the change stream of the collection, after the resume token if provided"""
+        queue: asyncio.Queue = asyncio.Queue()
+        if resume_after is not None:
+            for event in self._events[collection]:
+                if event['_id']['_data'] > resume_after['_data']:
+                    queue.put_nowait(event)
+        return _LocalStream(self._streams[collection], queue)
+
+
+class _LocalStream:
+    """A local change stream, an async iterator over the emitted events"""
+    def __init__(self, streams: list[asyncio.Queue], queue: asyncio.Queue) -> None:
+        self._streams = streams
+        self._queue = queue
+
+    async def __aenter__(self) -> '_LocalStream':
+        self._streams.append(self._queue)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._streams.remove(self._queue)
+
+    def __aiter__(self) -> '_LocalStream':
+        return self
+
+    async def __anext__(self) -> dict:
+        return await self._queue.get()
+
+
+class LocalTokenStore:
+    """An in-memory resume tokens store for the tests"""
+    def __init__(self) -> None:
+        self.tokens: dict[str, dict | None] = {}
+
+    async def load(self, key: str) -> dict | None:
+        return self.tokens.get(key)
+
+    async def save(self, key: str, token: dict | None) -> None:
+        self.tokens[key] = token
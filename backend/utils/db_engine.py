@@ -1,18 +1,301 @@
 """An abstarct class for mongo database engine"""
+import asyncio
+import importlib.util
+from dataclasses import dataclass, field
 from os import environ
-from typing import Any
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from typing import Any, Iterable
+import bson
+from bson.binary import UuidRepresentation
+from bson.codec_options import CodecOptions
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import IndexModel, InsertOne, WriteConcern
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+from utils.memory_backend import MemoryClient
+
+
+# the duplicate key error code
+DUPLICATE_KEY = 11000
+# encode the documents like the client does
+CODEC_OPTIONS = CodecOptions(uuid_representation=UuidRepresentation.STANDARD)
+
+
+@dataclass(frozen=True)
+class DBPolicy:
+    """The read preference and the write concern of a class of operations
+
+    Parameters:
+    -----------
+    * read: str, the read preference mode, like `primary` or `secondaryPreferred`
+    * max_staleness: int, the maximum replication lag in seconds of the secondaries
+                     read from, at least 90, -1 for no limit
+    * write: int | str | None, the `w` write concern, like 1 or `majority`, None for the client default
+    """
+    read: str = 'primary'
+    max_staleness: int = -1
+    write: int | str | None = None
+
+    def options(self) -> dict:
+        """The collection options of the policy"""
+        options: dict[str, Any] = {
+            'read_preference': make_read_preference(read_pref_mode_from_name(self.read), None, self.max_staleness)
+        }
+        if self.write is not None:
+            options['write_concern'] = WriteConcern(w=self.write)
+        return options
+
+
+@dataclass(frozen=True)
+class SizedWrite:
+    """A pymongo write operation with the BSON size of the arguments it was built from,
+    built by `sized_write`
+
+    Parameters:
+    -----------
+    * operation: Any, the pymongo write operation, like InsertOne, UpdateOne or DeleteOne
+    * size: int, the estimated BSON size of the operation
+    """
+    operation: Any
+    size: int
+
+
+def sized_write(kind: type, *args, **kwargs) -> SizedWrite:
+    """Build the pymongo write operation and estimate its size from its filter, document
+    and update arguments, so `DBEngine.bulk_write` can batch it by size
+
+    Parameters:
+    -----------
+    * kind: type: the pymongo write operation class, like InsertOne or UpdateOne
+    * args, kwargs: the arguments of the operation
+
+    Returns: SizedWrite: the operation with its size
+    """
+    size = 0
+    for argument in (*args, *kwargs.values()):
+        if isinstance(argument, dict):
+            size += len(bson.encode(argument, codec_options=CODEC_OPTIONS))
+        elif isinstance(argument, list):  # the update pipelines and the array filters
+            size += sum(len(bson.encode(item, codec_options=CODEC_OPTIONS)) for item in argument)
+    return SizedWrite(kind(*args, **kwargs), size)
+
+
+@dataclass
+class BulkResult:
+    """The result of a bulk write, the errors refer to the operations by their index in
+    the submitted operations
+
+    Parameters:
+    -----------
+    * inserted: int, the number of the inserted documents
+    * matched: int, the number of the documents matched by the updates and the replacements
+    * modified: int, the number of the modified documents
+    * deleted: int, the number of the deleted documents
+    * upserted: int, the number of the upserted documents
+    * errors: list[dict], the failed operations with their `index`, error `code` and `message`
+    * batches: int, the number of the round trips
+    """
+    inserted: int = 0
+    matched: int = 0
+    modified: int = 0
+    deleted: int = 0
+    upserted: int = 0
+    errors: list[dict] = field(default_factory=list)
+    batches: int = 0
+
+    @property
+    def ok(self) -> bool:
+        """True if all the operations succeeded"""
+        return not self.errors
+
+    @property
+    def failed(self) -> set[int]:
+        """The indexes of the failed operations"""
+        return {error['index'] for error in self.errors}
+
+    def add(self, details: dict, offset: int) -> None:
+        """Add the counters and the errors of one batch, as reported by the server"""
+        self.inserted += details.get('nInserted', 0)
+        self.matched += details.get('nMatched', 0)
+        self.modified += details.get('nModified', 0)
+        self.deleted += details.get('nRemoved', 0)
+        self.upserted += details.get('nUpserted', 0)
+        self.errors += [{'index': error['index'] + offset, 'code': error.get('code'), 'message': error.get('errmsg')}
+                        for error in details.get('writeErrors', [])]
 
 
 class DBEngine:
     """MongoDB engine class, responsible for handling all database operations"""
-    def __init__(self):
-        """Initialize the database engine, and construct the client and database objects
+    def __init__(self, backend: str | None = None):
+        """Initialize the database engine, and construct the client and database objects,
+        the client connects lazily, `connect` is called on the application startup to
+        establish and warm up the connections
+
+        Parameters:
+        -----------
+
+        * backend: str | None: the storage backend, `mongo` or `memory` for the in process
+                   storage of the tests and the benchmarks, defaults to the DB_BACKEND env
+                   variable or `mongo`, see `utils.memory_backend`
         """
-        self.client: AsyncIOMotorClient = AsyncIOMotorClient(environ.get('DB_HOST', 'localhost'), int(environ.get('DB_PORT', 27017)))
-        self.db: AsyncIOMotorDatabase = self.client[environ.get("DB_NAME", 'test_db')]  # type: ignore
-    
-    async def save(self, collection: str, data: dict) -> str | None:
+        self.backend = backend or environ.get('DB_BACKEND', 'mongo')
+        if self.backend not in ('mongo', 'memory'):
+            raise ValueError(f"Unknown database backend: {self.backend}")
+        self.client: AsyncIOMotorClient
+        self.db: AsyncIOMotorDatabase
+        self.policies = self.default_policies()
+        self._memory: MemoryClient | None = None
+        self._open()
+
+    def _open(self) -> None:
+        """Construct the client and the database objects"""
+        if self.backend == 'memory':
+            # the in memory data outlives the closed clients, like a database server
+            if self._memory is None:
+                self._memory = MemoryClient(
+                    latency=float(environ.get('DB_MEMORY_LATENCY_MS', 0)) / 1000,
+                    jitter=float(environ.get('DB_MEMORY_JITTER_MS', 0)) / 1000,
+                    seed=int(environ.get('DB_MEMORY_SEED', 0)),
+                )
+            self.client = self._memory  # type: ignore
+        else:
+            self.client = AsyncIOMotorClient(
+                environ.get('DB_HOST', 'localhost'), int(environ.get('DB_PORT', 27017)), **self.client_options()
+            )
+        self.db = self.client[environ.get("DB_NAME", 'test_db')]  # type: ignore
+        self._collections: dict[tuple[str, str], AsyncIOMotorCollection] = {}
+        self._closed = False
+
+    @staticmethod
+    def client_options() -> dict:
+        """Build the client connection pool, timeouts and compression options from the env variables
+
+        * DB_MAX_POOL_SIZE: the maximum connections per server, defaults to 100
+        * DB_MIN_POOL_SIZE: the connections kept open per server, defaults to 0
+        * DB_MAX_IDLE_TIME_MS: close the connections idle for longer, defaults to no limit
+        * DB_WAIT_QUEUE_TIMEOUT_MS: the maximum wait for a free connection, defaults to no limit
+        * DB_CONNECT_TIMEOUT_MS: the connection establishment timeout, defaults to 10000
+        * DB_SOCKET_TIMEOUT_MS: the operations network timeout, defaults to no limit
+        * DB_SERVER_SELECTION_TIMEOUT_MS: the server selection timeout, defaults to 10000
+        * DB_COMPRESSORS: comma separated wire compressors in the order of preference, like
+          `zstd,snappy,zlib`, the ones whose package is not installed are skipped, defaults to none
+        * DB_ZLIB_COMPRESSION_LEVEL: the zlib wire compression level, -1 to 9, defaults to -1
+
+        The UUID objects are encoded as the standard binary subtype 4, see `models.base.ID_STORAGE`
+
+        Returns: dict: the client keyword options
+        """
+        options: dict[str, Any] = {
+            'uuidRepresentation': 'standard',
+            'maxPoolSize': int(environ.get('DB_MAX_POOL_SIZE', 100)),
+            'minPoolSize': int(environ.get('DB_MIN_POOL_SIZE', 0)),
+            'connectTimeoutMS': int(environ.get('DB_CONNECT_TIMEOUT_MS', 10000)),
+            'serverSelectionTimeoutMS': int(environ.get('DB_SERVER_SELECTION_TIMEOUT_MS', 10000)),
+        }
+        for option, variable in (('maxIdleTimeMS', 'DB_MAX_IDLE_TIME_MS'),
+                                 ('waitQueueTimeoutMS', 'DB_WAIT_QUEUE_TIMEOUT_MS'),
+                                 ('socketTimeoutMS', 'DB_SOCKET_TIMEOUT_MS')):
+            if environ.get(variable):
+                options[option] = int(environ[variable])
+        compressors = available_compressors(environ.get('DB_COMPRESSORS', ''))
+        if compressors:
+            options['compressors'] = ','.join(compressors)
+            if 'zlib' in compressors and environ.get('DB_ZLIB_COMPRESSION_LEVEL'):
+                options['zlibCompressionLevel'] = int(environ['DB_ZLIB_COMPRESSION_LEVEL'])
+        return options
+
+    @staticmethod
+    def default_policies() -> dict[str, DBPolicy]:
+        """Build the named operations policies, the reads that tolerate a bounded staleness are
+        served by the secondaries when there are any, so the read capacity scales with the replicas
+
+        * primary: the client defaults, the reads see the latest writes
+        * analytics: the statistics and the diagnostics, like the duplicates reports, secondary preferred reads
+        * durable: the writes that must survive a failover, like the users creation, majority writes
+        * fast: the frequent and replaceable writes, like the autosaves and the usage counters, w:1 writes
+
+        * DB_MAX_STALENESS_SECONDS: the maximum staleness of the secondary reads, defaults to 90
+
+        Returns: dict[str, DBPolicy]: the policies by their names
+        """
+        max_staleness = int(environ.get('DB_MAX_STALENESS_SECONDS', 90))
+        return {
+            'primary': DBPolicy(),
+            'analytics': DBPolicy(read='secondaryPreferred', max_staleness=max_staleness),
+            'durable': DBPolicy(write='majority'),
+            'fast': DBPolicy(write=1),
+        }
+
+    def collection(self, name: str, policy: str | None = None) -> AsyncIOMotorCollection:
+        """Get the collection with the read preference and the write concern of the policy
+
+        Parameters:
+        -----------
+
+        * name: str: the collection name
+        * policy: str | None: the policy name, defaults to the client defaults
+
+        Returns: AsyncIOMotorCollection: the collection object
+        Raises: ValueError if the policy is not defined
+        """
+        if policy is None or policy == 'primary':
+            return self.db[name]
+        collection = self._collections.get((name, policy))
+        if collection is None:
+            if policy not in self.policies:
+                raise ValueError(f"Unknown database policy: {policy}")
+            collection = self._collections[(name, policy)] = self.db[name].with_options(
+                **self.policies[policy].options()
+            )
+        return collection
+
+    async def connect(self, warmup: int | None = None) -> bool:
+        """Connect to the database and open the warm up connections, so the first requests
+        don't pay for the server selection and the connections setup
+
+        Parameters:
+        -----------
+
+        * warmup: int | None: the number of connections to open, defaults to the
+                  DB_WARMUP_CONNECTIONS env variable or the minimum pool size
+
+        Returns: bool: True if the database is reachable, False otherwise
+        """
+        if self._closed:
+            self._open()
+        if not await self.ping():
+            return False
+        warmup = warmup if warmup is not None else int(
+            environ.get('DB_WARMUP_CONNECTIONS', environ.get('DB_MIN_POOL_SIZE', 0)))
+        # concurrent commands check out distinct connections from the pool
+        results = await asyncio.gather(*(self.ping() for _ in range(warmup)))
+        return all(results)
+
+    async def ping(self, timeout: float | None = None) -> bool:
+        """Check the database health
+
+        Parameters:
+        -----------
+
+        * timeout: float | None: the seconds to wait for the answer, defaults
+                   to the DB_PING_TIMEOUT env variable or 2 seconds
+
+        Returns: bool: True if the database answered the ping, False otherwise
+        """
+        timeout = timeout or float(environ.get('DB_PING_TIMEOUT', 2))
+        try:
+            await asyncio.wait_for(self.client.admin.command('ping'), timeout)
+        except Exception as e:
+            print(e)
+            return False
+        return True
+
+    def close(self) -> None:
+        """Close the client and all its connections, `connect` opens a new client"""
+        if not self._closed:
+            self.client.close()
+            self._closed = True
+
+    async def save(self, collection: str, data: dict, policy: str | None = None) -> str | None:
         """Save data to the database
 
         Parameters:
@@ -20,15 +303,21 @@ class DBEngine:
 
         * collection: str: the collection to save the data in
         * data: dict: the dictionary representation of the data to save
+        * policy: str | None: the operation policy name, see `default_policies`
+
+        Raises: DuplicateKeyError if the data violates a unique index
         """
         try:
-            await self.db[collection].insert_one(data)
+            await self.collection(collection, policy).insert_one(data)
+        except DuplicateKeyError:
+            # the unique indexes violations are left to the caller
+            raise
         except Exception as e:
             print(e)
             return None
         return str(data['_id'])
     
-    async def delete(self, collection: str, _id: str) -> bool:
+    async def delete(self, collection: str, _id: str, policy: str | None = None) -> bool:
         """Delete data from the database
 
         Parameters:
@@ -36,15 +325,16 @@ class DBEngine:
 
         * collection: str: the collection to delete the data from
         * _id: str: the id of the data to delete
+        * policy: str | None: the operation policy name, see `default_policies`
         """
         try:
-            await self.db[collection].delete_one({"_id": _id})
+            await self.collection(collection, policy).delete_one({"_id": _id})
         except Exception as e:
             print(e)
             return False
         return True
 
-    async def update(self, collection: str, _id: str, data: dict) -> bool:
+    async def update(self, collection: str, _id: str, data: dict, policy: str | None = None) -> bool:
         """Update data in the database
 
         Parameters:
@@ -53,15 +343,19 @@ class DBEngine:
         * collection: str: the collection to update the data in
         * _id: str: the id of the data to update
         * data: dict: the dictionary representation of the data to update
+        * policy: str | None: the operation policy name, see `default_policies`
+
+        Returns: bool: True if the document was found, even if the data was already set
         """
         try:
-            result = await self.db[collection].update_one({"_id": _id}, {"$set": data})
+            result = await self.collection(collection, policy).update_one({"_id": _id}, {"$set": data})
         except Exception as e:
             print(e)
             return False
-        return result.modified_count > 0
+        return result.matched_count > 0
     
-    async def find_one(self, collection: str, query: dict) -> dict | None:
+    async def find_one(self, collection: str, query: dict, projection: dict | None = None,
+                       policy: str | None = None) -> dict | None:
         """Find one document in the database
 
         Parameters:
@@ -69,14 +363,138 @@ class DBEngine:
 
         * collection: str: the collection to search on
         * query: dict: the query to search for
+        * projection: dict | None: the fields to include or exclude, defaults to the whole document
+        * policy: str | None: the operation policy name, see `default_policies`
         """
         try:
-            return await self.db[collection].find_one(query)
+            return await self.collection(collection, policy).find_one(query, projection)
         except Exception as e:
             print(e)
             return None
 
 
+    async def bulk_write(self, collection: str, operations: Iterable, ordered: bool = False,
+                         batch_size: int | None = None, max_batch_bytes: int | None = None,
+                         policy: str | None = None) -> BulkResult:
+        """Write the operations in batches, each batch is one round trip. The unordered batches
+        are all attempted, an ordered write stops at the first failed operation
+
+        Parameters:
+        -----------
+
+        * collection: str: the collection to write to
+        * operations: Iterable: the write operations built by `sized_write`
+        * ordered: bool: apply the operations in order and stop on the first error, defaults to False
+        * batch_size: int | None: the maximum operations per batch, defaults to the
+                      DB_BULK_BATCH_SIZE env variable or 1000
+        * max_batch_bytes: int | None: the maximum BSON size of a batch, defaults to the
+                           DB_BULK_MAX_BYTES env variable or 16MB
+        * policy: str | None: the operation policy name, see `default_policies`
+
+        Returns: BulkResult: the counters and the per operation errors
+        Raises: TypeError if an operation is not built by `sized_write`
+        """
+        batch_size = batch_size or int(environ.get('DB_BULK_BATCH_SIZE', 1000))
+        max_batch_bytes = max_batch_bytes or int(environ.get('DB_BULK_MAX_BYTES', 16 * 1024 * 1024))
+        result = BulkResult()
+        for offset, batch in _batches(operations, batch_size, max_batch_bytes):
+            result.batches += 1
+            try:
+                bulk = await self.collection(collection, policy).bulk_write(batch, ordered=ordered)
+                result.add(bulk.bulk_api_result, offset)
+            except BulkWriteError as e:
+                result.add(e.details, offset)
+            except Exception as e:
+                print(e)
+                result.errors += [{'index': offset + index, 'code': None, 'message': str(e)}
+                                  for index in range(len(batch))]
+            if ordered and result.errors:
+                break
+        return result
+
+    async def insert_many(self, collection: str, documents: Iterable[dict], ordered: bool = False,
+                          batch_size: int | None = None, policy: str | None = None) -> BulkResult:
+        """Insert the documents in batches, see `bulk_write`
+
+        Parameters:
+        -----------
+
+        * collection: str: the collection to insert the documents in
+        * documents: Iterable[dict]: the documents to insert
+        * ordered: bool: insert the documents in order and stop on the first error, defaults to False
+        * batch_size: int | None: the maximum documents per batch
+        * policy: str | None: the operation policy name, see `default_policies`
+
+        Returns: BulkResult: the counters and the per document errors
+        """
+        return await self.bulk_write(collection, (sized_write(InsertOne, document) for document in documents),
+                                     ordered=ordered, batch_size=batch_size, policy=policy)
+
+    async def ensure_indexes(self, collection: str, indexes: list[IndexModel]) -> list[str]:
+        """Create the missing indexes of the collection, the existing ones are left as is
+
+        Parameters:
+        -----------
+
+        * collection: str: the collection to index
+        * indexes: list[IndexModel]: the indexes declared for the collection
+
+        Returns: list[str]: the names of the indexes
+        """
+        if not indexes:
+            return []
+        return await self.db[collection].create_indexes(indexes)
+
+
+# the packages the wire compressors depend on, zlib is part of the standard library
+COMPRESSOR_PACKAGES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+
+
+def available_compressors(compressors: str) -> list[str]:
+    """Filter the wire compressors whose package is installed, the server uses the first
+    one it supports, and the messages are not compressed if none is left
+
+    Parameters:
+    -----------
+
+    * compressors: str: comma separated compressors, like `zstd,snappy,zlib`
+
+    Returns: list[str]: the available compressors, in the same order
+    """
+    available = []
+    for compressor in filter(None, (name.strip() for name in compressors.split(','))):
+        if compressor not in COMPRESSOR_PACKAGES:
+            print(f"Unknown database compressor: {compressor}")
+        elif importlib.util.find_spec(COMPRESSOR_PACKAGES[compressor]) is None:
+            print(f"The {COMPRESSOR_PACKAGES[compressor]} package is not installed, {compressor} is not used")
+        else:
+            available.append(compressor)
+    return available
+
+
+def _batches(operations: Iterable, batch_size: int, max_batch_bytes: int):
+    """Split the operations into the batches of at most batch_size operations and
+    max_batch_bytes bytes, an operation larger than max_batch_bytes is sent alone
+
+    Yields: (offset, batch): the index of the batch first operation, and the batch pymongo operations
+    Raises: TypeError for an operation not built by `sized_write`, pymongo keeps the
+            arguments of its operations private so their size can't be estimated
+    """
+    batch: list = []
+    batch_bytes = offset = 0
+    for operation in operations:
+        if not isinstance(operation, SizedWrite):
+            raise TypeError(f"The bulk write operations are built by sized_write, got {type(operation).__name__}")
+        operation, size = operation.operation, operation.size
+        if batch and (len(batch) >= batch_size or batch_bytes + size > max_batch_bytes):
+            yield offset, batch
+            offset += len(batch)
+            batch, batch_bytes = [], 0
+        batch.append(operation)
+        batch_bytes += size
+    if batch:
+        yield offset, batch
+
 
 async def main():
     """Test the DBEngine class
@@ -0,0 +1,782 @@
+#!/usr/bin/env python3
+"""An in-memory storage backend of the DBEngine, it implements in process the subset of the
+motor client API the models use, so the tests, the benchmarks and the load tests of the API
+run with no database server (DB_BACKEND=memory)
+
+The storage interface, the operations both backends provide:
+
+* client: `client[name]`, `client.admin.command('ping')`, `client.close()`
+* database: `db[name]`, `db.create_collection(name, **options)`
+* collection: `insert_one`, `insert_many`, `find_one`, `find` (`sort`, `skip`, `limit`,
+  `batch_size`, `to_list` and async iteration), `update_one`, `update_many`, `replace_one`,
+  `delete_one`, `delete_many`, `count_documents`, `bulk_write`, `aggregate`, `create_indexes`,
+  `drop_indexes`, `with_options`
+* queries: the equality and the dotted paths through the arrays, `$eq`, `$ne`, `$gt`, `$gte`,
+  `$lt`, `$lte`, `$in`, `$nin`, `$exists`, `$type`, `$elemMatch`, `$or`, `$and`, `$nor`
+* updates: `$set` and `$unset` with the positional `$` operator, `$inc`, `$push` with `$each`,
+  `$position` and `$slice`, `$pull`, `$setOnInsert`, the replacements and the upserts
+* projections: the inclusions and the exclusions, `$slice`, `$elemMatch`, and the field path
+  expressions
+* aggregations: `$match`, `$unwind`, `$project`, `$sort`, `$skip`, `$limit` and `$group` with
+  the `$sum` and `$push` accumulators, with the `$cond`, `$eq`, `$type` and `$dateToString`
+  expressions
+
+The change streams are not supported, like on a standalone server
+"""
+import asyncio
+import copy
+import random
+from datetime import datetime
+from typing import Any, Iterable
+from uuid import UUID
+
+from bson import Binary, ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure, WriteError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+# the BSON types comparison order
+_TYPE_ORDER = {'null': 1, 'number': 2, 'string': 3, 'object': 4, 'array': 5, 'binData': 6,
+               'objectId': 7, 'bool': 8, 'date': 9}
+
+
+class MemoryClient:
+    """The in-memory client, the databases are kept while the process runs, even when closed"""
+    def __init__(self, latency: float = 0, jitter: float = 0, seed: int = 0) -> None:
+        """Construct the client object
+
+        Parameters:
+        -----------
+        * latency: float: the seconds every operation waits, to mimic the network round trips
+        * jitter: float: the maximum seconds added to the latency, drawn from a seeded
+                  generator so the runs are reproducible
+        * seed: int: the seed of the jitter generator
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._databases: dict[str, MemoryDatabase] = {}
+        self.admin = _Admin(self)
+
+    def __getitem__(self, name: str) -> 'MemoryDatabase':
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self, name)
+        return self._databases[name]
+
+    def close(self) -> None:
+        """Nothing to release, the data is kept"""
+
+    async def delay(self) -> None:
+        """Wait for the injected latency of one operation"""
+        seconds = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        # yield to the event loop like a network round trip, even with no latency
+        await asyncio.sleep(seconds)
+
+
+class _Admin:
+    """The admin database of the client, answers the ping command"""
+    def __init__(self, client: MemoryClient) -> None:
+        self._client = client
+
+    async def command(self, name: str, *args, **kwargs) -> dict:
+        await self._client.delay()
+        if name != 'ping':
+            raise OperationFailure(f"Unsupported command: {name}")
+        return {'ok': 1.0}
+
+
+class MemoryDatabase:
+    """An in-memory database, a set of named collections"""
+    def __init__(self, client: MemoryClient, name: str) -> None:
+        self.client = client
+        self.name = name
+        self._collections: dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> 'MemoryCollection':
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> 'MemoryCollection':
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    async def create_collection(self, name: str, **options) -> 'MemoryCollection':
+        """Create the collection, raises CollectionInvalid if it exists"""
+        await self.client.delay()
+        if name in self._collections:
+            raise CollectionInvalid(f"collection {name} already exists")
+        return self[name]
+
+
+class MemoryCollection:
+    """An in-memory collection, the documents are copied in and out so the callers never
+    share them with the storage"""
+    def __init__(self, database: MemoryDatabase, name: str) -> None:
+        self.database = database
+        self.name = name
+        self._documents: dict[Any, dict] = {}
+        # the unique indexes names mapped to their keys
+        self._unique: dict[str, list[str]] = {}
+
+    def with_options(self, **options) -> 'MemoryCollection':
+        """The read preferences and the write concerns don't apply in memory"""
+        return self
+
+    async def create_indexes(self, indexes: list) -> list[str]:
+        """Record the unique indexes, the others are only named"""
+        await self.database.client.delay()
+        names = []
+        for index in indexes:
+            document = index.document
+            name = document.get('name') or '_'.join(f'{key}_{order}' for key, order in document['key'].items())
+            if document.get('unique'):
+                keys = list(document['key'])
+                seen = set()
+                for stored in self._documents.values():
+                    values = [_first(stored, key) for key in keys]
+                    if all(value is _MISSING for value in values):
+                        continue
+                    value = _hashable(values)
+                    if value in seen:
+                        raise DuplicateKeyError(
+                            f"E11000 duplicate key error collection: {self.name} index: {name}", 11000
+                        )
+                    seen.add(value)
+                self._unique[name] = keys
+            names.append(name)
+        return names
+
+    async def drop_indexes(self) -> None:
+        """Drop the recorded indexes"""
+        await self.database.client.delay()
+        self._unique.clear()
+
+    async def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        await self.database.client.delay()
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True, **kwargs) -> InsertManyResult:
+        result = await self.bulk_write([InsertOne(document) for document in documents], ordered=ordered)
+        return InsertManyResult([], result.acknowledged)
+
+    async def find_one(self, filter: dict | None = None, projection: dict | None = None, **kwargs) -> dict | None:
+        await self.database.client.delay()
+        for document in self._documents.values():
+            if match(document, filter or {}):
+                return project(document, projection, filter or {})
+        return None
+
+    def find(self, filter: dict | None = None, projection: dict | None = None, **kwargs) -> 'MemoryCursor':
+        return MemoryCursor(self, filter or {}, projection)
+
+    async def count_documents(self, filter: dict, limit: int = 0, **kwargs) -> int:
+        await self.database.client.delay()
+        count = sum(1 for document in self._documents.values() if match(document, filter))
+        return min(count, limit) if limit else count
+
+    async def update_one(self, filter: dict, update: dict | list, upsert: bool = False, **kwargs) -> UpdateResult:
+        await self.database.client.delay()
+        return UpdateResult(self._update(filter, update, upsert, multi=False), True)
+
+    async def update_many(self, filter: dict, update: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        await self.database.client.delay()
+        return UpdateResult(self._update(filter, update, upsert, multi=True), True)
+
+    async def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        await self.database.client.delay()
+        return UpdateResult(self._replace(filter, replacement, upsert), True)
+
+    async def delete_one(self, filter: dict, **kwargs) -> DeleteResult:
+        await self.database.client.delay()
+        return DeleteResult({'n': self._delete(filter, multi=False)}, True)
+
+    async def delete_many(self, filter: dict, **kwargs) -> DeleteResult:
+        await self.database.client.delay()
+        return DeleteResult({'n': self._delete(filter, multi=True)}, True)
+
+    async def bulk_write(self, requests: list, ordered: bool = True, **kwargs) -> BulkWriteResult:
+        """Apply the write operations, raises BulkWriteError with the failed operations"""
+        await self.database.client.delay()
+        details: dict[str, Any] = {'nInserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0,
+                                   'nUpserted': 0, 'upserted': [], 'writeErrors': []}
+        for index, operation in enumerate(requests):
+            try:
+                if isinstance(operation, InsertOne):
+                    self._insert(operation._doc)
+                    details['nInserted'] += 1
+                elif isinstance(operation, (UpdateOne, UpdateMany, ReplaceOne)):
+                    if isinstance(operation, ReplaceOne):
+                        raw = self._replace(operation._filter, operation._doc, bool(operation._upsert))
+                    else:
+                        raw = self._update(operation._filter, operation._doc, bool(operation._upsert),
+                                           multi=isinstance(operation, UpdateMany))
+                    if 'upserted' in raw:
+                        details['nUpserted'] += 1
+                        details['upserted'].append({'index': index, '_id': raw['upserted']})
+                    else:
+                        details['nMatched'] += raw['n']
+                    details['nModified'] += raw['nModified']
+                elif isinstance(operation, (DeleteOne, DeleteMany)):
+                    details['nRemoved'] += self._delete(operation._filter, multi=isinstance(operation, DeleteMany))
+                else:
+                    raise OperationFailure(f"Unsupported write operation: {type(operation).__name__}")
+            except OperationFailure as e:
+                details['writeErrors'].append({'index': index, 'code': e.code, 'errmsg': str(e)})
+                if ordered:
+                    break
+        if details['writeErrors']:
+            raise BulkWriteError(details)
+        return BulkWriteResult(details, True)
+
+    def aggregate(self, pipeline: list[dict], **kwargs) -> 'MemoryCursor':
+        return MemoryCursor(self, pipeline=pipeline)
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    def _insert(self, document: dict) -> Any:
+        """Insert a copy of the document, raises DuplicateKeyError"""
+        document = copy.deepcopy(document)
+        if '_id' not in document:
+            document['_id'] = ObjectId()
+        key = _hashable(document['_id'])
+        if key in self._documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_", 11000)
+        self._check_unique(document)
+        self._documents[key] = document
+        return document['_id']
+
+    def _update(self, filter: dict, update: dict | list, upsert: bool, multi: bool) -> dict:
+        """Update the matching documents, returns the raw result"""
+        if isinstance(update, list):
+            raise OperationFailure("The update pipelines are not supported")
+        matched = modified = 0
+        for key, document in list(self._documents.items()):
+            if not match(document, filter):
+                continue
+            matched += 1
+            updated = apply_update(document, update, filter)
+            if updated != document:
+                self._check_unique(updated, exclude=key)
+                self._documents[key] = updated
+                modified += 1
+            if not multi:
+                break
+        if matched or not upsert:
+            return {'n': matched, 'nModified': modified}
+        document = apply_update(_upsert_seed(filter), update, filter, inserting=True)
+        return {'n': 1, 'nModified': 0, 'upserted': self._insert(document)}
+
+    def _replace(self, filter: dict, replacement: dict, upsert: bool) -> dict:
+        """Replace the first matching document, returns the raw result"""
+        for key, document in self._documents.items():
+            if match(document, filter):
+                replaced = {'_id': document['_id'], **copy.deepcopy(replacement)}
+                if replaced['_id'] != document['_id']:
+                    raise OperationFailure("The _id field cannot be changed", code=66)
+                self._check_unique(replaced, exclude=key)
+                self._documents[key] = replaced
+                return {'n': 1, 'nModified': int(replaced != document)}
+        if not upsert:
+            return {'n': 0, 'nModified': 0}
+        return {'n': 1, 'nModified': 0, 'upserted': self._insert({**_upsert_seed(filter), **replacement})}
+
+    def _delete(self, filter: dict, multi: bool) -> int:
+        """Delete the matching documents, returns their number"""
+        deleted = 0
+        for key, document in list(self._documents.items()):
+            if match(document, filter):
+                del self._documents[key]
+                deleted += 1
+                if not multi:
+                    break
+        return deleted
+
+    def _check_unique(self, document: dict, exclude: Any = _MISSING) -> None:
+        """Raise DuplicateKeyError if the document violates a unique index"""
+        for name, keys in self._unique.items():
+            values = [_first(document, key) for key in keys]
+            if all(value is _MISSING for value in values):
+                continue
+            for key, other in self._documents.items():
+                if key != exclude and key != _hashable(document['_id']) \
+                        and [_first(other, field) for field in keys] == values:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name} index: {name}", 11000
+                    )
+
+
+class MemoryCursor:
+    """The cursor of a find or an aggregation, the documents are computed on the first read"""
+    def __init__(self, collection: MemoryCollection, filter: dict | None = None,
+                 projection: dict | None = None, pipeline: list[dict] | None = None) -> None:
+        self._collection = collection
+        self._filter = filter or {}
+        self._projection = projection
+        self._pipeline = pipeline
+        self._sort: list[tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._results: list[dict] | None = None
+
+    def sort(self, key: str | list, direction: int = 1) -> 'MemoryCursor':
+        self._sort = [(key, direction)] if isinstance(key, str) else list(key)
+        return self
+
+    def skip(self, count: int) -> 'MemoryCursor':
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> 'MemoryCursor':
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> 'MemoryCursor':
+        return self
+
+    async def to_list(self, length: int | None = None) -> list[dict]:
+        results = await self._load()
+        taken = results if not length else results[:length]
+        self._results = results[len(taken):]
+        return taken
+
+    def __aiter__(self) -> 'MemoryCursor':
+        return self
+
+    async def __anext__(self) -> dict:
+        results = await self._load()
+        if not results:
+            raise StopAsyncIteration
+        return results.pop(0)
+
+    async def _load(self) -> list[dict]:
+        if self._results is None:
+            await self._collection.database.client.delay()
+            documents = list(self._collection._documents.values())
+            if self._pipeline is not None:
+                self._results = aggregate(documents, self._pipeline)
+            else:
+                results = [document for document in documents if match(document, self._filter)]
+                results = sort(results, self._sort)[self._skip:]
+                if self._limit:
+                    results = results[:self._limit]
+                self._results = [project(document, self._projection, self._filter) for document in results]
+        return self._results
+
+
+def match(document: dict, query: dict) -> bool:
+    """Check if the document matches the query"""
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(match(document, item) for item in condition):
+                return False
+        elif key == '$and':
+            if not all(match(document, item) for item in condition):
+                return False
+        elif key == '$nor':
+            if any(match(document, item) for item in condition):
+                return False
+        elif not _match_field(_values(document, key), condition):
+            return False
+    return True
+
+
+def _match_field(values: list, condition: Any) -> bool:
+    """Check if one of the path values matches the field condition"""
+    if _is_operators(condition):
+        return all(_match_operator(values, operator, operand) for operator, operand in condition.items())
+    return _match_operator(values, '$eq', condition)
+
+
+def _match_operator(values: list, operator: str, operand: Any) -> bool:
+    """Check the field values against one query operator"""
+    if operator == '$exists':
+        return bool(values) == bool(operand)
+    if operator == '$ne':
+        return not _match_operator(values, '$eq', operand)
+    if operator == '$nin':
+        return not _match_operator(values, '$in', operand)
+    if operator == '$elemMatch':
+        return any(isinstance(value, list) and any(
+            match(item, operand) if isinstance(item, dict) and not _is_operators(operand)
+            else _match_field([item], operand)
+            for item in value) for value in values)
+    # the arrays match by themselves or by their elements
+    candidates = [item for value in values for item in ([value, *value] if isinstance(value, list) else [value])]
+    if operator == '$eq':
+        return any(_equal(value, operand) for value in candidates) or (not values and operand is None)
+    if operator == '$in':
+        return any(_match_operator(values, '$eq', item) for item in operand)
+    if operator == '$type':
+        names = operand if isinstance(operand, list) else [operand]
+        return any(_type_name(value) in names or (_type_name(value) in ('int', 'double', 'long') and 'number' in names)
+                   for value in values)
+    comparisons = {'$gt': lambda order: order > 0, '$gte': lambda order: order >= 0,
+                   '$lt': lambda order: order < 0, '$lte': lambda order: order <= 0}
+    if operator in comparisons:
+        # the comparisons only match the values of the same type
+        return any(_type_rank(value) == _type_rank(operand) and comparisons[operator](_compare(value, operand))
+                   for value in candidates)
+    raise OperationFailure(f"Unsupported query operator: {operator}")
+
+
+def _is_operators(query: Any) -> bool:
+    """Check if the query is a field condition made of operators, not a document query"""
+    return isinstance(query, dict) and bool(query) and all(
+        key.startswith('$') and key not in ('$or', '$and', '$nor') for key in query)
+
+
+def _values(document: Any, path: str) -> list:
+    """The values at the dotted path, the arrays of documents are traversed"""
+    return _lookup(document, path.split('.'))
+
+
+def _lookup(value: Any, parts: list[str]) -> list:
+    if not parts:
+        return [value]
+    key, rest = parts[0], parts[1:]
+    if isinstance(value, dict):
+        return _lookup(value[key], rest) if key in value else []
+    if isinstance(value, list):
+        if key.isdigit():
+            return _lookup(value[int(key)], rest) if int(key) < len(value) else []
+        return [found for item in value if isinstance(item, dict) for found in _lookup(item, parts)]
+    return []
+
+
+def _first(document: dict, path: str) -> Any:
+    values = _values(document, path)
+    return values[0] if values else _MISSING
+
+
+def _type_name(value: Any) -> str:
+    """The BSON type name of the value"""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'double'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, dict):
+        return 'object'
+    if isinstance(value, list):
+        return 'array'
+    if isinstance(value, (bytes, UUID)):
+        return 'binData'
+    if isinstance(value, ObjectId):
+        return 'objectId'
+    if isinstance(value, datetime):
+        return 'date'
+    return 'object'
+
+
+def _type_rank(value: Any) -> int:
+    name = _type_name(value)
+    return _TYPE_ORDER['number' if name in ('int', 'double') else name]
+
+
+def _sort_value(value: Any) -> Any:
+    """The comparable form of the value, within its type"""
+    if isinstance(value, UUID):
+        return value.bytes
+    if isinstance(value, Binary):
+        return bytes(value)
+    if isinstance(value, dict):
+        return [(key, _sort_key(item)) for key, item in value.items()]
+    if isinstance(value, list):
+        return [_sort_key(item) for item in value]
+    if isinstance(value, ObjectId):
+        return value.binary
+    return value
+
+
+def _sort_key(value: Any) -> tuple:
+    return _type_rank(value), _sort_value(value)
+
+
+def _compare(value: Any, other: Any) -> int:
+    left, right = _sort_key(value), _sort_key(other)
+    return (left > right) - (left < right)
+
+
+def _equal(value: Any, other: Any) -> bool:
+    return _type_rank(value) == _type_rank(other) and _sort_value(value) == _sort_value(other)
+
+
+def _hashable(value: Any) -> Any:
+    """The key of the document id in the collection"""
+    if isinstance(value, (dict, list)):
+        return repr(value)
+    return value
+
+
+def sort(documents: list[dict], keys: list[tuple[str, int]]) -> list[dict]:
+    """Sort the documents by the keys, the missing fields sort first"""
+    for key, direction in reversed(keys):
+        documents = sorted(documents, key=lambda document: _sort_key(_sort_field(document, key)),
+                           reverse=direction < 0)
+    return documents
+
+
+def _sort_field(document: dict, key: str) -> Any:
+    value = _first(document, key)
+    return None if value is _MISSING else value
+
+
+def project(document: dict, projection: dict | None, query: dict | None = None) -> dict:
+    """Copy the projected fields of the document"""
+    if not projection:
+        return copy.deepcopy(document)
+    fields = {key: value for key, value in projection.items() if key != '_id'}
+    inclusion = any(_includes(value) for value in fields.values()) or (
+        _includes(projection.get('_id')) and not any(value in (0, False) for value in fields.values()))
+    if inclusion:
+        result: dict = {}
+        if projection.get('_id', 1) in (1, True):
+            result['_id'] = copy.deepcopy(document['_id'])
+        for key, value in projection.items():
+            if key == '_id' and not _is_expression(value):
+                continue
+            if _is_expression(value):
+                found = evaluate(value, document)
+                if found is not _MISSING:
+                    _set_path(result, key.split('.'), found)
+            elif isinstance(value, dict) and '$elemMatch' in value:
+                items = [item for item in document.get(key) or [] if match(item, value['$elemMatch'])]
+                if items:
+                    result[key] = copy.deepcopy(items[:1])
+            elif isinstance(value, dict) and '$slice' in value:
+                continue
+            else:
+                found = _first(document, key)
+                if found is not _MISSING:
+                    _set_path(result, key.split('.'), copy.deepcopy(found))
+    else:
+        result = copy.deepcopy(document)
+        for key, value in projection.items():
+            if value in (0, False):
+                _unset_path(result, key.split('.'))
+    for key, value in projection.items():
+        if isinstance(value, dict) and '$slice' in value and isinstance(document.get(key), list):
+            count = value['$slice']
+            items = document[key][:count] if count >= 0 else document[key][count:]
+            result[key] = copy.deepcopy(items)
+    return result
+
+
+def _includes(value: Any) -> bool:
+    """Check if the projection value includes its field"""
+    return value in (1, True) or _is_expression(value) or (isinstance(value, dict) and '$elemMatch' in value)
+
+
+def _is_expression(value: Any) -> bool:
+    """Check if the projection value is an aggregation expression"""
+    if isinstance(value, str):
+        return True
+    return isinstance(value, dict) and len(value) == 1 and next(iter(value)) not in ('$elemMatch', '$slice')
+
+
+def evaluate(expression: Any, document: dict) -> Any:
+    """Evaluate the aggregation expression against the document"""
+    if isinstance(expression, str) and expression.startswith('$'):
+        return _first(document, expression[1:])
+    if isinstance(expression, dict) and len(expression) == 1:
+        operator, operand = next(iter(expression.items()))
+        if operator == '$cond':
+            if isinstance(operand, dict):
+                operand = [operand['if'], operand['then'], operand['else']]
+            condition = evaluate(operand[0], document)
+            return evaluate(operand[1] if condition not in (_MISSING, None, False, 0) else operand[2], document)
+        if operator == '$eq':
+            left, right = (evaluate(item, document) for item in operand)
+            return (left is _MISSING and right is _MISSING) or (
+                left is not _MISSING and right is not _MISSING and _equal(left, right))
+        if operator == '$type':
+            value = evaluate(operand, document)
+            return 'missing' if value is _MISSING else _type_name(value)
+        if operator == '$dateToString':
+            value = evaluate(operand['date'], document)
+            return value.strftime(operand.get('format', '%Y-%m-%dT%H:%M:%S.%LZ').replace('%L', '000'))
+        if operator.startswith('$'):
+            raise OperationFailure(f"Unsupported expression: {operator}")
+    return expression
+
+
+def aggregate(documents: list[dict], pipeline: list[dict]) -> list[dict]:
+    """Run the aggregation pipeline over the documents"""
+    results = documents
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == '$match':
+            results = [document for document in results if match(document, spec)]
+        elif name == '$unwind':
+            path = (spec['path'] if isinstance(spec, dict) else spec)[1:]
+            unwound = []
+            for document in results:
+                for item in _first(document, path) if isinstance(_first(document, path), list) else []:
+                    copied = copy.deepcopy(document)
+                    _set_path(copied, path.split('.'), item)
+                    unwound.append(copied)
+            results = unwound
+        elif name == '$project':
+            results = [project(document, spec) for document in results]
+        elif name == '$sort':
+            results = sort(results, list(spec.items()))
+        elif name == '$skip':
+            results = results[spec:]
+        elif name == '$limit':
+            results = results[:spec]
+        elif name == '$group':
+            results = _group(results, spec)
+        else:
+            raise OperationFailure(f"Unsupported aggregation stage: {name}")
+    return [copy.deepcopy(document) for document in results]
+
+
+def _group(documents: list[dict], spec: dict) -> list[dict]:
+    """Group the documents by the `_id` expression, with the `$sum` and `$push` accumulators"""
+    groups: dict[Any, dict] = {}
+    for document in documents:
+        # the missing fields are grouped as null
+        if isinstance(spec['_id'], dict):
+            key = {name: _null(evaluate(expression, document)) for name, expression in spec['_id'].items()}
+        else:
+            key = _null(evaluate(spec['_id'], document))
+        group = groups.setdefault(_hashable(key), {'_id': key})
+        for field, accumulator in spec.items():
+            if field == '_id':
+                continue
+            (operator, expression), = accumulator.items()
+            value = evaluate(expression, document)
+            if operator == '$sum':
+                group[field] = group.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+            elif operator == '$push':
+                group.setdefault(field, [])
+                if value is not _MISSING:
+                    group[field].append(value)
+            else:
+                raise OperationFailure(f"Unsupported accumulator: {operator}")
+    return list(groups.values())
+
+
+def _null(value: Any) -> Any:
+    """The missing values are null in the aggregation results"""
+    return None if value is _MISSING else value
+
+
+def apply_update(document: dict, update: dict, query: dict, inserting: bool = False) -> dict:
+    """Apply the update operators to a copy of the document"""
+    updated = copy.deepcopy(document)
+    # the positional `$` indexes by array, matched once in the document before the update like
+    # on a server, so the operators applied first don't change them
+    positions: dict[str, str] = {}
+    for operator, fields in update.items():
+        if operator == '$setOnInsert' and not inserting:
+            continue
+        for path, value in fields.items():
+            parts = path.split('.')
+            if '$' in parts:
+                position = parts.index('$')
+                array_path = '.'.join(parts[:position])
+                if array_path not in positions:
+                    positions[array_path] = _matched_index(document, array_path, query)
+                parts = [*parts[:position], positions[array_path], *parts[position + 1:]]
+            if operator in ('$set', '$setOnInsert'):
+                _set_path(updated, parts, copy.deepcopy(value))
+            elif operator == '$unset':
+                _unset_path(updated, parts)
+            elif operator == '$inc':
+                current = _first(updated, '.'.join(parts))
+                _set_path(updated, parts, (0 if current is _MISSING else current) + value)
+            elif operator == '$push':
+                items = value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+                array = _first(updated, '.'.join(parts))
+                if array is not _MISSING and not isinstance(array, list):
+                    raise WriteError(f"The field '{parts[-1]}' must be an array but is of type "
+                                     f"{_type_name(array)}", code=2)
+                array = [] if array is _MISSING else list(array)
+                position = value.get('$position', len(array)) if isinstance(value, dict) else len(array)
+                array[position:position] = copy.deepcopy(items)
+                if isinstance(value, dict) and '$slice' in value:
+                    count = value['$slice']
+                    array = array[count:] if count < 0 else array[:count]
+                _set_path(updated, parts, array)
+            elif operator == '$pull':
+                array = _first(updated, '.'.join(parts))
+                if isinstance(array, list):
+                    _set_path(updated, parts, [item for item in array if not _pulled(item, value)])
+            else:
+                raise OperationFailure(f"Unsupported update operator: {operator}")
+    return updated
+
+
+def _pulled(item: Any, condition: Any) -> bool:
+    """Check if the array element matches the $pull condition"""
+    if isinstance(condition, dict) and not _is_operators(condition):
+        return isinstance(item, dict) and match(item, condition)
+    if isinstance(condition, dict):
+        return _match_field([item], condition)
+    return _equal(item, condition)
+
+
+def _matched_index(document: dict, array_path: str, query: dict) -> str:
+    """The index of the first element of the array matched by the query, the positional `$`"""
+    array = _first(document, array_path)
+    conditions = {key[len(array_path) + 1:]: value for key, value in query.items()
+                  if key.startswith(f'{array_path}.')}
+    element_match = query.get(array_path, {}).get('$elemMatch') if isinstance(query.get(array_path), dict) else None
+    if not conditions and element_match is None:
+        raise OperationFailure("The positional operator did not find the match needed from the query", code=2)
+    for index, item in enumerate(array if isinstance(array, list) else []):
+        if isinstance(item, dict) and match(item, conditions) and (element_match is None or match(item, element_match)):
+            return str(index)
+    raise OperationFailure("The positional operator did not find the match needed from the query", code=2)
+
+
+def _set_path(document: Any, parts: list[str], value: Any) -> None:
+    for part in parts[:-1]:
+        if isinstance(document, list):
+            document = document[int(part)]
+        else:
+            document = document.setdefault(part, {})
+    if isinstance(document, list):
+        document[int(parts[-1])] = value
+    else:
+        document[parts[-1]] = value
+
+
+def _unset_path(document: Any, parts: list[str]) -> None:
+    for part in parts[:-1]:
+        if isinstance(document, list):
+            if not part.isdigit() or int(part) >= len(document):
+                return
+            document = document[int(part)]
+        elif isinstance(document, dict) and part in document:
+            document = document[part]
+        else:
+            return
+    if isinstance(document, list) and parts[-1].isdigit() and int(parts[-1]) < len(document):
+        document[int(parts[-1])] = None
+    elif isinstance(document, dict):
+        document.pop(parts[-1], None)
+
+
+def _upsert_seed(query: dict) -> dict:
+    """The document an upsert starts from, the equality conditions of the query"""
+    seed: dict = {}
+    for key, condition in query.items():
+        if key.startswith('$'):
+            continue
+        if isinstance(condition, dict) and _is_operators(condition):
+            if '$eq' in condition:
+                _set_path(seed, key.split('.'), copy.deepcopy(condition['$eq']))
+            continue
+        _set_path(seed, key.split('.'), copy.deepcopy(condition))
+    return seed
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""A utility helper to import resumes from PDF files, the text is extracted page by page
+and segmented into the resume sections"""
+import io
+import mmap
+import os
+import re
+import struct
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+
+# the maximum size in bytes and number of pages of an imported PDF
+MAX_PDF_BYTES = int(os.getenv('PDF_MAX_BYTES', 5 * 1024 * 1024))
+MAX_PDF_PAGES = int(os.getenv('PDF_MAX_PAGES', 10))
+# the files bigger than this are memory-mapped instead of read into memory
+MMAP_THRESHOLD = int(os.getenv('PDF_MMAP_THRESHOLD', 1024 * 1024))
+
+# the section headings as they are commonly written, mapped to the resume data fields
+SECTION_HEADINGS = {
+    'summary': ('summary', 'profile', 'professional summary', 'objective', 'career objective', 'about me'),
+    'experiences': ('experience', 'experiences', 'work experience', 'professional experience',
+                    'employment history', 'work history'),
+    'education': ('education', 'academic background'),
+    'projects': ('projects', 'personal projects', 'key projects'),
+    'achievements': ('achievements', 'awards', 'honors', 'accomplishments'),
+    'certificates': ('certificates', 'certifications', 'licenses and certifications',
+                     'licenses & certifications'),
+    'skills': ('skills', 'technical skills', 'core skills', 'key skills'),
+    'languages': ('languages',),
+}
+_HEADINGS = {heading: section for section, headings in SECTION_HEADINGS.items() for heading in headings}
+
+_MONTH = r'(?:[A-Za-z]{3,9}\.?\s+)?'
+_DATE_RANGE = re.compile(
+    rf'(?P<start>{_MONTH}\d{{4}})\s*(?:-|–|—|to)\s*(?P<end>{_MONTH}\d{{4}}|present|current|now)',
+    re.IGNORECASE
+)
+# the bullets, including the glyphs some PDF producers extract the bullets as
+_BULLET = re.compile(r'^\s*(?:[•▪●◦*\-–\x7f\uf0b7]|\d+[.)])\s+')
+_URL = re.compile(r'(?:https?://)?(?:www\.)?[\w.-]+\.[a-z]{2,}/[^\s|,]+', re.IGNORECASE)
+_SEPARATORS = re.compile(r'\s+(?:at|@|\||-|–|—)\s+|,\s+')
+_PROFICIENCY_LEVELS = ('native', 'proficient', 'good working knowledge', 'intermediate', 'beginner', 'fluent')
+
+
+class PDFExtractionError(ValueError):
+    """Raised when the PDF can't be read or exceeds the import limits"""
+
+
+# the errors pypdf raises on the malformed files, besides its own errors
+MALFORMED_PDF_ERRORS = (PyPdfError, ValueError, LookupError, TypeError, AttributeError, AssertionError,
+                        ArithmeticError, RecursionError, struct.error, zlib.error)
+
+
+def iter_pages(stream, max_pages: int = MAX_PDF_PAGES) -> Iterator[str]:
+    """Parse the PDF stream and yield the text of its pages one by one, the pages
+    are only parsed when they are reached
+
+    Parameters:
+    -----------
+    * stream: the binary file-like object (or memory map) holding the PDF
+    * max_pages: int: the maximum number of pages allowed
+
+    Yields: str: the text of each page
+    """
+    try:
+        reader = PdfReader(stream)
+        if len(reader.pages) > max_pages:
+            raise PDFExtractionError(f"The PDF has more than {max_pages} pages")
+        for page in reader.pages:
+            yield page.extract_text() or ''
+    except PDFExtractionError:
+        raise
+    except MALFORMED_PDF_ERRORS as e:
+        raise PDFExtractionError(f"Invalid PDF file: {e}")
+
+
+def extract_resume_draft(path: str, max_bytes: int = MAX_PDF_BYTES, max_pages: int = MAX_PDF_PAGES) -> dict:
+    """Extract the text of the PDF file and segment it into a resume draft, this is the
+    CPU heavy part of the import and it's meant to run in the worker process pool
+
+    Parameters:
+    -----------
+    * path: str: the path of the PDF file
+    * max_bytes: int: the maximum file size allowed
+    * max_pages: int: the maximum number of pages allowed
+
+    Returns: dict: the resume draft with the same fields as the `ResumeData` schema
+    """
+    size = os.path.getsize(path)
+    if size > max_bytes:
+        raise PDFExtractionError(f"The PDF is larger than {max_bytes} bytes")
+    if size == 0:
+        raise PDFExtractionError("The PDF file is empty")
+    with open(path, 'rb') as file:
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return segment_resume(iter_pages(mapped, max_pages))
+        return segment_resume(iter_pages(io.BytesIO(file.read()), max_pages))
+
+
+def segment_resume(pages: Iterable[str]) -> dict:
+    """Split the resume text into its sections and parse each one of them
+
+    Parameters:
+    -----------
+    * pages: Iterable[str]: the text of each page
+
+    Returns: dict: the resume draft, the sections that were not found are omitted
+    """
+    header: list[str] = []
+    sections: dict[str, list[str]] = {}
+    current = header
+    for page in pages:
+        for line in page.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            section = _HEADINGS.get(re.sub(r'[^a-z& ]', '', line.lower()).strip())
+            if section:
+                current = sections.setdefault(section, [])
+            else:
+                current.append(line)
+
+    draft: dict = {}
+    title = _parse_title(header)
+    if title:
+        draft['title'] = title
+    if sections.get('summary'):
+        draft['summary'] = ' '.join(sections['summary'])
+    elif len(header) > 2 and 'title' in draft:
+        # the summary is often written under the name without a heading
+        draft['summary'] = ' '.join(line for line in header[2:] if not _URL.search(line))
+    for section, parse in (('experiences', _parse_experiences), ('education', _parse_education),
+                           ('projects', _parse_titled), ('achievements', _parse_titled),
+                           ('certificates', _parse_titled), ('skills', _parse_skills),
+                           ('languages', _parse_languages)):
+        if sections.get(section):
+            draft[section] = parse(sections[section])
+    return draft
+
+
+def _parse_title(lines: list[str]) -> dict | None:
+    """Parse the name, the job title and the links from the resume header"""
+    texts = [line for line in lines if not _URL.search(line)]
+    if not texts:
+        return None
+    links = []
+    for line in lines:
+        for url in _URL.findall(line):
+            host = url.split('//')[-1].removeprefix('www.').split('.')[0]
+            links.append({'type': {'linkedin': 'linkedIn', 'github': 'GitHub'}.get(host.lower(), host),
+                          'linkUrl': url})
+    return {'name': texts[0], 'jobTitle': texts[1] if len(texts) > 1 else '', 'links': links}
+
+
+def _split_dated_entries(lines: list[str]) -> list[tuple[list[str], re.Match | None, list[str]]]:
+    """Split the section lines into entries around the date range lines
+
+    Returns: list of (header lines, date range match, body lines) per entry
+    """
+    entries: list[tuple[list[str], re.Match | None, list[str]]] = []
+    pending: list[str] = []
+    for line in lines:
+        dates = _DATE_RANGE.search(line)
+        if not dates:
+            pending.append(line)
+            continue
+        header = [text for text in (line[:dates.start()].strip(' ,|-–—'), line[dates.end():].strip(' ,|-–—'))
+                  if text]
+        if not header and pending:
+            # the entry header is the line right before the dates
+            header = [pending.pop()]
+        if entries:
+            entries[-1][2].extend(pending)
+        elif pending:
+            header = pending + header
+        pending = []
+        entries.append((header, dates, []))
+    if entries:
+        entries[-1][2].extend(pending)
+    elif pending:
+        entries.append((pending[:1], None, pending[1:]))
+    return entries
+
+
+def _split_header(header: list[str]) -> tuple[str, str, str]:
+    """Split the entry header into its (first, second, location) parts"""
+    parts = [part.strip() for line in header for part in _SEPARATORS.split(line) if part.strip()]
+    parts += [''] * (3 - len(parts))
+    return parts[0], parts[1], ', '.join(parts[2:]).strip(', ')
+
+
+def _parse_date(text: str) -> datetime | str:
+    """Parse a resume date like `Mar 2023` or `2023`, unparsed text is returned as is"""
+    text = text.strip().rstrip('.')
+    for date_format in ('%b %Y', '%B %Y', '%Y'):
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    if text.lower() in ('present', 'current', 'now'):
+        return 'present'
+    return text
+
+
+def _body(lines: list[str]) -> str:
+    """Join the entry body lines, keeping one line per bullet"""
+    return '\n'.join(_BULLET.sub('', line) for line in lines)
+
+
+def _parse_experiences(lines: list[str]) -> list[dict]:
+    """Parse the experiences section entries"""
+    experiences = []
+    for header, dates, body in _split_dated_entries(lines):
+        role_title, company_name, location = _split_header(header)
+        experiences.append({
+            'companyName': company_name,
+            'roleTitle': role_title,
+            'location': location,
+            'summary': _body(body) or None,
+            'startingDate': _parse_date(dates.group('start')) if dates else None,
+            'endingDate': _parse_date(dates.group('end')) if dates else 'present',
+        })
+    return experiences
+
+
+def _parse_education(lines: list[str]) -> list[dict]:
+    """Parse the education section entries"""
+    education = []
+    for header, dates, body in _split_dated_entries(lines):
+        first, second, location = _split_header(header)
+        # the degree is usually written before the school name
+        degree_title, school_name = (first, second) if second else ('', first)
+        education.append({
+            'schoolName': school_name,
+            'degreeTitle': degree_title,
+            'location': location,
+            'summary': _body(body) or None,
+            'startingDate': _parse_date(dates.group('start')) if dates else None,
+            'endingDate': _parse_date(dates.group('end')) if dates else None,
+        })
+    return education
+
+
+def _parse_titled(lines: list[str]) -> list[dict]:
+    """Parse the sections made of (title, description) entries, each bullet starts an entry"""
+    bulleted = any(_BULLET.match(line) for line in lines)
+    entries: list[dict] = []
+    for line in lines:
+        if entries and bulleted and not _BULLET.match(line):
+            entries[-1]['description'] = f"{entries[-1]['description']} {line}".strip()
+            continue
+        title, _, description = _BULLET.sub('', line).partition(': ')
+        if not description:
+            title, _, description = title.partition(' - ')
+        entries.append({'title': title.strip(), 'description': description.strip()})
+    return entries
+
+
+def _parse_skills(lines: list[str]) -> list[str]:
+    """Parse the skills section, the skills are separated by lines, bullets, commas or pipes"""
+    skills = []
+    for line in lines:
+        for skill in re.split(r'[,|;•·]', _BULLET.sub('', line)):
+            skill = skill.split(':', 1)[-1].strip()
+            if skill and skill not in skills:
+                skills.append(skill)
+    return skills
+
+
+def _parse_languages(lines: list[str]) -> list[dict]:
+    """Parse the languages section, like `English (Native), Arabic - Proficient`"""
+    languages = []
+    for item in (item for line in lines for item in re.split(r'[,|;•]', _BULLET.sub('', line))):
+        item = item.strip()
+        if not item:
+            continue
+        level = next((level for level in _PROFICIENCY_LEVELS if level in item.lower()), '')
+        name = re.split(r'\s*[(:\-–]\s*', item, maxsplit=1)[0].strip()
+        languages.append({'name': name, 'proficient': level})
+    return languages
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""A utility helper to render the resumes as PDF files on the server side, with a
+render cache keyed by the content hash of the rendered resume"""
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+from hashlib import sha256
+from itertools import count
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import ListFlowable, Paragraph, SimpleDocTemplate, Spacer
+
+
+class ClassicTemplate:
+    """The default single column resume template, the version must be bumped on every
+    change of the rendered output so the cached renders are invalidated
+    """
+    version = 1
+
+    def __init__(self) -> None:
+        styles = getSampleStyleSheet()
+        self.name = ParagraphStyle('Name', parent=styles['Title'], fontSize=20, spaceAfter=2)
+        self.job_title = ParagraphStyle('JobTitle', parent=styles['Heading3'], alignment=1, spaceBefore=0)
+        self.links = ParagraphStyle('Links', parent=styles['Normal'], alignment=1, fontSize=9)
+        self.section = ParagraphStyle('Section', parent=styles['Heading2'], fontSize=13, spaceBefore=10,
+                                      spaceAfter=4)
+        self.entry = ParagraphStyle('Entry', parent=styles['Heading4'], spaceBefore=4, spaceAfter=1)
+        self.meta = ParagraphStyle('Meta', parent=styles['Italic'], fontSize=9)
+        self.body = ParagraphStyle('Body', parent=styles['Normal'], leading=13)
+
+    def render(self, data: dict) -> bytes:
+        """Render the resume data as a PDF document
+
+        Parameters:
+        -----------
+        * data: dict: the resume data as stored in the database
+
+        Returns: bytes: the PDF document
+        """
+        buffer = io.BytesIO()
+        # the invariant documents are byte for byte reproducible
+        document = SimpleDocTemplate(buffer, pagesize=A4, invariant=1, title=_text((data.get('title') or {}).get('name')),
+                                     leftMargin=18 * mm, rightMargin=18 * mm, topMargin=15 * mm, bottomMargin=15 * mm)
+        document.build(self.flowables(data))
+        return buffer.getvalue()
+
+    def flowables(self, data: dict) -> list:
+        """Build the document flowables section by section"""
+        flowables: list = []
+        title = data.get('title') or {}
+        flowables.append(Paragraph(_text(title.get('name')), self.name))
+        flowables.append(Paragraph(_text(title.get('jobTitle')), self.job_title))
+        links = ' | '.join(_text(link.get('linkUrl')) for link in title.get('links') or [])
+        if links:
+            flowables.append(Paragraph(links, self.links))
+        if data.get('summary'):
+            flowables += [Paragraph('Summary', self.section), self._paragraphs(data['summary'])]
+        if data.get('experiences'):
+            flowables.append(Paragraph('Experience', self.section))
+            for experience in data['experiences']:
+                flowables.append(Paragraph(
+                    f"{_text(experience.get('roleTitle'))} - {_text(experience.get('companyName'))}", self.entry))
+                flowables.append(Paragraph(_meta(experience.get('location'), experience.get('startingDate'),
+                                                 experience.get('endingDate')), self.meta))
+                if experience.get('summary'):
+                    flowables.append(self._paragraphs(experience['summary']))
+        if data.get('education'):
+            flowables.append(Paragraph('Education', self.section))
+            for education in data['education']:
+                flowables.append(Paragraph(
+                    f"{_text(education.get('degreeTitle'))} - {_text(education.get('schoolName'))}", self.entry))
+                flowables.append(Paragraph(_meta(education.get('location'), education.get('startingDate'),
+                                                 education.get('endingDate')), self.meta))
+                if education.get('summary'):
+                    flowables.append(self._paragraphs(education['summary']))
+        for section, heading in (('projects', 'Projects'), ('achievements', 'Achievements'),
+                                 ('certificates', 'Certificates')):
+            if data.get(section):
+                flowables.append(Paragraph(heading, self.section))
+                flowables.append(self._bullets(
+                    f"<b>{_text(item.get('title'))}</b>: {_text(item.get('description'))}" for item in data[section]))
+        if data.get('skills'):
+            flowables += [Paragraph('Skills', self.section), Paragraph(_text(', '.join(data['skills'])), self.body)]
+        if data.get('languages'):
+            flowables.append(Paragraph('Languages', self.section))
+            flowables.append(Paragraph(', '.join(
+                f"{_text(language.get('name'))} ({_text(language.get('proficient'))})"
+                for language in data['languages']), self.body))
+        flowables.append(Spacer(0, 0))
+        return flowables
+
+    def _paragraphs(self, text: str) -> ListFlowable | Paragraph:
+        """Render a multi line text, the lines are rendered as bullets"""
+        lines = [line for line in str(text).splitlines() if line.strip()]
+        if len(lines) > 1:
+            return self._bullets(_text(line) for line in lines)
+        return Paragraph(_text(text), self.body)
+
+    def _bullets(self, items) -> ListFlowable:
+        """Render the items as a bullet list"""
+        return ListFlowable([Paragraph(item, self.body) for item in items], bulletType='bullet', leftIndent=10)
+
+
+# the server side templates, the resumes with a template id that has no server side
+# counterpart are rendered with the default template
+TEMPLATES = {
+    'classic': ClassicTemplate,
+}
+DEFAULT_TEMPLATE = 'classic'
+
+
+def get_template(template_id: str) -> type[ClassicTemplate]:
+    """Get the server side template of the template id"""
+    return TEMPLATES.get(template_id, TEMPLATES[DEFAULT_TEMPLATE])
+
+
+def render_resume_pdf(template_id: str, data: dict) -> bytes:
+    """Render the resume data with the template, this is meant to run in the worker process pool
+
+    Parameters:
+    -----------
+    * template_id: str: the resume template id
+    * data: dict: the resume data as stored in the database
+
+    Returns: bytes: the PDF document
+    """
+    return get_template(template_id)().render(data)
+
+
+def render_key(template_id: str, data: dict) -> str:
+    """Compute the render cache key, the hash of the template id, the template version
+    and the canonical json of the resume data
+
+    Parameters:
+    -----------
+    * template_id: str: the resume template id
+    * data: dict: the resume data as stored in the database
+
+    Returns: str: the hex digest identifying the rendered document
+    """
+    canonical = json.dumps([template_id, get_template(template_id).version, data],
+                           sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return sha256(canonical.encode()).hexdigest()
+
+
+class RenderCache:
+    """A disk cache of the rendered PDF documents, shared by all the workers of the host.
+    The least recently used documents are removed when there are more than `max_entries`,
+    the methods do blocking file IO and are meant to be run in a thread
+    """
+    def __init__(self, directory: str | None = None, max_entries: int | None = None,
+                 prune_interval: int | None = None) -> None:
+        """Construct the render cache object, the directory is created on the first stored document
+
+        Parameters:
+        -----------
+        * directory: str | None: the cache directory, defaults to the RENDER_CACHE_DIR env
+                     variable or `resumai-renders` in the system temporary directory
+        * max_entries: int | None: the maximum number of cached documents, defaults to the
+                       RENDER_CACHE_MAX_ENTRIES env variable or 1000
+        * prune_interval: int | None: the number of stored documents between two prunes of the
+                          directory, defaults to the RENDER_CACHE_PRUNE_INTERVAL env variable or 50
+        """
+        self.directory = directory or os.getenv('RENDER_CACHE_DIR') or os.path.join(
+            tempfile.gettempdir(), 'resumai-renders')
+        self.max_entries = max_entries or int(os.getenv('RENDER_CACHE_MAX_ENTRIES', 1000))
+        self.prune_interval = prune_interval or int(os.getenv('RENDER_CACHE_PRUNE_INTERVAL', 50))
+        self._stored = count(1)
+
+    def path(self, key: str) -> str:
+        """The path of the cached document of key"""
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key: str) -> bytes | None:
+        """Get the cached document of key, or None if it's not cached. The document is read
+        rather than its path returned, so a prune can't remove it before it's sent"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                os.utime(path)  # mark as recently used
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, document: bytes) -> str:
+        """Store the document under key, and return its path"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as file:
+            file.write(document)
+        # the rename is atomic, the readers never see a partially written document
+        os.replace(file.name, path)
+        # the directory is scanned once every prune_interval documents, not on every render
+        if next(self._stored) % self.prune_interval == 0:
+            self._prune()
+        return path
+
+    def _prune(self) -> None:
+        """Remove the least recently used documents above max_entries"""
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.pdf')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def _text(value) -> str:
+    """Escape the value to be used in a paragraph markup"""
+    return escape(str(value)) if value is not None else ''
+
+
+def _meta(location: str | None, starting_date: str | None, ending_date: str | None) -> str:
+    """Format the location and the dates line of an entry"""
+    dates = ' - '.join(_date(date) for date in (starting_date, ending_date) if date)
+    return ' | '.join(_text(part) for part in (location, dates) if part)
+
+
+def _date(value: str) -> str:
+    """Format the stored `YYYY-MM-DD` dates as `Mon YYYY`"""
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').strftime('%b %Y')
+    except ValueError:
+        return str(value).capitalize()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""A utility to speculatively crawl the job description and enhance the resume in the
+background, before the user asks for the enhancement"""
+import asyncio
+import os
+from dataclasses import dataclass
+from hashlib import sha256
+from uuid import uuid4
+
+from utils.cache import TTLCache
+from utils.job_crawler import JobCrawler
+
+
+@dataclass
+class Speculation:
+    """The background work started for one job url
+
+    Parameters:
+    -----------
+    * user_id: str, the id of the user that started the speculation
+    * description: asyncio.Task, the task crawling the job description
+    * resume_key: str | None, the fingerprint of the resume the enhancement was started for
+    * enhancement: asyncio.Task | None, the task enhancing the resume for the job description
+    * waiters: int, the number of the requests attached to the speculation
+    """
+    user_id: str
+    description: asyncio.Task
+    resume_key: str | None = None
+    enhancement: asyncio.Task | None = None
+    waiters: int = 0
+
+    def cancel(self) -> None:
+        """Cancel the unfinished background tasks, unless a request is waiting for them"""
+        if self.waiters:
+            return
+        for task in (self.description, self.enhancement):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+class Speculator:
+    """Start the job description crawling and the resume enhancement in the background,
+    the work is later attached to by the enhance request through the returned handle.
+    The abandoned speculations expire, and at most `maxsize` of them are kept
+    """
+    def __init__(self, assistant, maxsize: int | None = None, ttl: float | None = None) -> None:
+        """Construct the Speculator object
+
+        Parameters:
+        -----------
+        * assistant: Assistant: the assistant used to enhance the resume
+        * maxsize: int | None: the maximum number of the kept speculations,
+                   defaults to the SPECULATION_MAX_SIZE env variable or 256
+        * ttl: float | None: the seconds a speculation is kept, defaults to
+               the SPECULATION_TTL env variable or 300 seconds
+        """
+        self.assistant = assistant
+        self._speculations = TTLCache(
+            maxsize=maxsize or int(os.getenv('SPECULATION_MAX_SIZE', 256)),
+            ttl=ttl or float(os.getenv('SPECULATION_TTL', 300)),
+            on_evict=lambda _, speculation: speculation.cancel()
+        )
+
+    @property
+    def ttl(self) -> float:
+        """The seconds a speculation is kept"""
+        return self._speculations.ttl
+
+    def start(self, user_id: str, job_url: str, resume=None) -> str:
+        """Start crawling the job description, and enhancing the resume if provided
+
+        Parameters:
+        -----------
+        * user_id: str: the id of the user starting the speculation
+        * job_url: str: the url of the job post
+        * resume: ResumeData | None: the resume to speculatively enhance, defaults to None
+
+        Returns: str: the speculation handle
+        """
+        self._speculations.purge()
+        # the crawler keeps per request state, so each speculation gets its own
+        description = _background(asyncio.to_thread(JobCrawler().get_description, job_url))
+        speculation = Speculation(user_id=str(user_id), description=description)
+        if resume is not None:
+            speculation.resume_key = _resume_key(resume)
+            speculation.enhancement = _background(self._enhance(description, resume, str(user_id)))
+        handle = uuid4().hex
+        self._speculations.set(handle, speculation)
+        return handle
+
+    async def attach(self, handle: str, user_id: str, resume) -> tuple[str, dict | None]:
+        """Attach to the speculation started with handle, and wait for its results
+
+        Parameters:
+        -----------
+        * handle: str: the speculation handle returned by `start`
+        * user_id: str: the id of the user attaching to the speculation
+        * resume: ResumeData: the resume the user asks to enhance
+
+        Returns: (job_description, enhanced_resume): the crawled job description, and the
+                 enhanced resume if it was speculated for the same resume, None otherwise
+        Raises: KeyError if the handle is unknown, expired or started by another user
+        """
+        speculation: Speculation | None = self._speculations.get(handle)
+        if speculation is None or speculation.user_id != str(user_id):
+            raise KeyError(handle)
+        # an evicted speculation is not cancelled while a request is waiting for it
+        speculation.waiters += 1
+        try:
+            job_description = await _result(speculation.description)
+            if job_description is None:
+                raise KeyError(handle)
+            if speculation.enhancement is not None and speculation.resume_key == _resume_key(resume):
+                # None if it was cancelled, then the request enhances the resume itself
+                return job_description, await _result(speculation.enhancement)
+            return job_description, None
+        finally:
+            speculation.waiters -= 1
+
+    def clear(self) -> None:
+        """Cancel and drop all the speculations"""
+        self._speculations.clear(evict=True)
+
+    async def _enhance(self, description: asyncio.Task, resume, user_id: str) -> dict:
+        """Enhance the resume for the job description once it's crawled"""
+        job_description = await asyncio.shield(description)
+        return await self.assistant.enhance_resume(resume, job_description, user_id=user_id)
+
+
+def _background(coroutine) -> asyncio.Task:
+    """Schedule the coroutine as a task whose failure is only reported to the attached request"""
+    task = asyncio.ensure_future(coroutine)
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    return task
+
+
+async def _result(task: asyncio.Task):
+    """Wait for the background task result, None if the task was cancelled"""
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if task.cancelled():
+            return None
+        # the waiting request itself was cancelled
+        raise
+
+
+def _resume_key(resume) -> str:
+    """Fingerprint the resume the same way it is sent to the assistant"""
+    resume_json_data = resume.model_dump_json(exclude_defaults=True, exclude_none=True, exclude_unset=True)
+    return sha256(resume_json_data.encode()).hexdigest()
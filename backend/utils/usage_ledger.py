@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""The AI usage ledger, accumulates the per user AI usage in memory and
+periodically flushes it to the database as daily rollups"""
+import asyncio
+import os
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from pymongo import UpdateOne
+
+from utils.db_engine import sized_write
+
+
+# the counters kept for each user per day
+COUNTERS = ('calls', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'latency_ms', 'cost')
+# the ids of the last flushes applied to each rollup, so a retried write the server already
+# applied is skipped, the retries are made by the next flush
+APPLIED_FLUSHES = 20
+
+
+class UsageLedger:
+    """In-memory accumulator of the AI usage per user, the counters are written to the
+    `usage` collection as `$inc` bulk writes, one document per user per day.
+    All the reads are served from memory, so quota checks never wait for the database
+    """
+    def __init__(self, collection: str = 'usage', flush_interval: float | None = None) -> None:
+        """Construct the ledger object
+
+        Parameters:
+        -----------
+        * collection: str: the collection that holds the daily rollups
+        * flush_interval: float | None: the seconds between two flushes,
+                          defaults to the USAGE_FLUSH_INTERVAL env variable or 10 seconds
+        """
+        self.collection = collection
+        self.flush_interval = flush_interval or float(os.getenv('USAGE_FLUSH_INTERVAL', 10))
+        # the prices are per one million tokens
+        self.prompt_token_price = float(os.getenv('GENAI_PROMPT_TOKEN_PRICE', 0))
+        self.completion_token_price = float(os.getenv('GENAI_COMPLETION_TOKEN_PRICE', 0))
+        self.daily_token_quota = int(os.getenv('AI_DAILY_TOKEN_QUOTA', 0))
+        self._pending: dict[tuple[str, str], dict[str, float]] = {}
+        self._flushed: dict[tuple[str, str], dict[str, float]] = {}
+        # the flushed counters not yet known to be written, by their flush id
+        self._unconfirmed: dict[str, dict[tuple[str, str], dict[str, float]]] = {}
+        self._db_engine = None
+        self._task: asyncio.Task | None = None
+
+    def record(self, user_id: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+               latency: float = 0.0) -> None:
+        """Record one AI call for the user, no database operation is made
+
+        Parameters:
+        -----------
+        * user_id: str: the id of the user that made the call
+        * prompt_tokens: int: the number of the prompt tokens
+        * completion_tokens: int: the number of the generated tokens
+        * latency: float: the call duration in seconds
+        """
+        cost = (prompt_tokens * self.prompt_token_price
+                + completion_tokens * self.completion_token_price) / 1_000_000
+        deltas = {
+            'calls': 1,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'latency_ms': round(latency * 1000),
+            'cost': cost,
+        }
+        self._add(self._pending, (str(user_id), _today()), deltas)
+
+    def usage(self, user_id: str, day: str | None = None) -> dict[str, float]:
+        """Get the user usage counters of the day, from memory
+
+        Parameters:
+        -----------
+        * user_id: str: the id of the user
+        * day: str | None: the day in `YYYY-MM-DD` format, defaults to today (UTC)
+
+        Returns: dict: the counters, the last flushed totals plus the pending ones
+        """
+        key = (str(user_id), day or _today())
+        totals = dict.fromkeys(COUNTERS, 0)
+        for source in (self._flushed, self._pending, *self._unconfirmed.values()):
+            for counter, value in source.get(key, {}).items():
+                totals[counter] += value
+        return totals
+
+    def within_quota(self, user_id: str) -> bool:
+        """Check if the user did not exceed the daily tokens quota, without any database operation
+
+        Parameters:
+        -----------
+        * user_id: str: the id of the user
+
+        Returns: bool: True if the user can make more AI calls today, False otherwise
+        """
+        if not self.daily_token_quota:
+            return True
+        return self.usage(user_id)['total_tokens'] < self.daily_token_quota
+
+    async def flush(self) -> int:
+        """Write the pending counters to the database with one unordered bulk write, and refresh
+        the in-memory totals from the written documents. Each flush has an id recorded in the
+        rollups it increments, the writes that failed, or were cancelled or timed out, are retried
+        by the next flush with the same id, so the server skips the ones it already applied
+
+        Returns: int: the number of the written rollup documents
+        """
+        if self._db_engine is None or not (self._pending or self._unconfirmed):
+            return 0
+        if self._pending:
+            self._unconfirmed[uuid4().hex] = self._pending
+            self._pending = {}
+        collection = self._db_engine.db[self.collection]
+        writes = [(flush_id, key) for flush_id, pending in self._unconfirmed.items() for key in pending]
+        operations = [
+            sized_write(
+                UpdateOne,
+                {'_id': _rollup_id(key), 'flushes': {'$ne': flush_id}},
+                {'$inc': self._unconfirmed[flush_id][key],
+                 '$push': {'flushes': {'$each': [flush_id], '$slice': -APPLIED_FLUSHES}},
+                 '$setOnInsert': {'user_id': key[0], 'day': key[1]}},
+                upsert=True
+            )
+            for flush_id, key in writes
+        ]
+        # a cancelled write leaves the counters unconfirmed
+        result = await self._db_engine.bulk_write(self.collection, operations, policy='fast')
+        written: dict[tuple[str, str], dict[str, float]] = {}
+        for index, (flush_id, key) in enumerate(writes):
+            if index not in result.failed:
+                self._add(written, key, self._confirm(flush_id, key))
+
+        # the totals include the usage recorded by the other workers, and the failed writes found
+        # applied, like a retry of an applied write failing with a duplicate key upsert, are confirmed
+        today = _today()
+        self._flushed = {key: totals for key, totals in self._flushed.items() if key[1] == today}
+        try:
+            documents = await collection.find(
+                {'_id': {'$in': list({_rollup_id(key) for _, key in writes})}}
+            ).to_list(length=None)
+            for document in documents:
+                key = (document['user_id'], document['day'])
+                for flush_id in document.get('flushes', []):
+                    self._confirm(flush_id, key)
+                self._flushed[key] = {counter: document.get(counter, 0) for counter in COUNTERS}
+        except (Exception, asyncio.CancelledError) as e:
+            if not isinstance(e, asyncio.CancelledError):
+                print(e)
+            # the counters are written, count them until the next refresh
+            for key, deltas in written.items():
+                self._add(self._flushed, key, deltas)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        return len(written)
+
+    def start(self, db_engine) -> None:
+        """Start flushing the counters periodically in the background
+
+        Parameters:
+        -----------
+        * db_engine: DBEngine: the database engine to write the counters with
+        """
+        self._db_engine = db_engine
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        """Stop the background flushing and write the remaining counters"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flush_periodically(self) -> None:
+        """Flush the pending counters every `flush_interval` seconds"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _confirm(self, flush_id: str, key: tuple[str, str]) -> dict[str, float]:
+        """Remove the counters of the key written by the flush from the unconfirmed ones
+
+        Returns: dict: the confirmed counters, empty if they were already confirmed
+        """
+        pending = self._unconfirmed.get(flush_id, {})
+        deltas = pending.pop(key, {})
+        if not pending:
+            self._unconfirmed.pop(flush_id, None)
+        return deltas
+
+    @staticmethod
+    def _add(target: dict, key: tuple[str, str], deltas: dict[str, float]) -> None:
+        """Add the deltas to the counters of key in target"""
+        counters = target.setdefault(key, dict.fromkeys(COUNTERS, 0))
+        for counter, value in deltas.items():
+            counters[counter] += value
+
+
+def _rollup_id(key: tuple[str, str]) -> str:
+    """Return the id of the rollup document of the user and day key"""
+    return f'{key[0]}:{key[1]}'
+
+
+def _today() -> str:
+    """Return the current UTC day in `YYYY-MM-DD` format"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""A shared process pool to run the CPU heavy work off the event loop"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def pool_size() -> int:
+    """The number of processes of the shared pool, WORKER_PROCESSES or the number of CPUs"""
+    return int(os.getenv('WORKER_PROCESSES', 0)) or os.cpu_count() or 1
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool, it's created on first use with `pool_size()` processes
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=pool_size())
+    return _pool
+
+
+async def run_in_process(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Run func in the shared process pool and wait for its result without blocking the event loop
+
+    Parameters:
+    -----------
+    * func: Callable: a module level (picklable) function
+    * args, kwargs: the arguments passed to func, they must be picklable
+
+    Returns: Any: the func result
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), partial(func, *args, **kwargs))
+
+
+def shutdown_process_pool() -> None:
+    """Shutdown the shared process pool, cancelling the queued work"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None